@@ -0,0 +1,148 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests into a single model call.
+
+    Callers submit an array of one or more preprocessed images and await
+    the matching rows of the model output. A background task drains the
+    queue, waiting at most ``max_wait_ms`` after the first pending item for
+    more work to arrive, so that up to ``max_batch_size`` images go through
+    the model in one forward pass. ``predict_fn`` is awaited, so the model
+    call itself can run on an executor while the next batch fills up.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._carry: Optional[Tuple[np.ndarray, asyncio.Future]] = None
+        self._buffer: Optional[np.ndarray] = None
+
+    def start(self) -> None:
+        """Start the background batching task on the running event loop."""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching task and fail any requests still queued."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        leftovers = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while not self._queue.empty():
+            leftovers.append(self._queue.get_nowait())
+        for _, future in leftovers:
+            if not future.done():
+                future.set_exception(RuntimeError("Prediction service is shutting down"))
+
+    async def submit(self, images: np.ndarray) -> np.ndarray:
+        """
+        Queue images for prediction and wait for their results.
+
+        Args:
+            images: Array of shape (n, height, width, channels)
+
+        Returns:
+            Model output rows for the submitted images, shape (n, classes)
+        """
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher has not been started")
+
+        # Groups larger than a full batch are split so no forward pass
+        # exceeds max_batch_size.
+        if len(images) > self.max_batch_size:
+            chunks = [
+                images[start:start + self.max_batch_size]
+                for start in range(0, len(images), self.max_batch_size)
+            ]
+            results = await asyncio.gather(*(self.submit(chunk) for chunk in chunks))
+            return np.concatenate(results)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((images, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            first = self._carry if self._carry is not None else await self._queue.get()
+            self._carry = None
+            items = [first]
+            size = len(first[0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+
+                if size + len(item[0]) > self.max_batch_size:
+                    # Doesn't fit; it opens the next batch instead
+                    self._carry = item
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            await self._dispatch(items)
+
+    def _batch_buffer(self, size: int, like: np.ndarray) -> np.ndarray:
+        # Batches are dispatched one at a time, so a single buffer is reused
+        # instead of allocating a new batch array on every forward pass.
+        shape = (self.max_batch_size,) + like.shape[1:]
+        if self._buffer is None or self._buffer.shape != shape or self._buffer.dtype != like.dtype:
+            self._buffer = np.empty(shape, dtype=like.dtype)
+        return self._buffer[:size]
+
+    async def _dispatch(self, items: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        if len(items) == 1:
+            batch = items[0][0]
+        else:
+            arrays = [images for images, _ in items]
+            batch = self._batch_buffer(sum(len(images) for images in arrays), arrays[0])
+            np.concatenate(arrays, out=batch)
+
+        try:
+            predictions = await self._predict_fn(batch)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for images, future in items:
+            count = len(images)
+            # Requests whose client went away are skipped, not failed
+            if not future.done():
+                future.set_result(predictions[offset:offset + count])
+            offset += count
@@ -0,0 +1,58 @@
+"""
+Measure classifier throughput (images/sec) at increasing batch sizes.
+
+Shows how much of the per-call cost is fixed overhead, which is what the
+micro-batcher in main.py amortises. Run from the AI-Model directory:
+
+    python benchmarks/batch_throughput.py --model models/bigDatasetWithDinaNCD_10E.h5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from tensorflow.keras.models import load_model
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def measure(model, batch_size: int, images: int, rng: np.random.Generator) -> dict:
+    batch = rng.random((batch_size, 180, 180, 3), dtype=np.float32)
+    model.predict_on_batch(batch)  # Warm up this input shape
+
+    calls = max(1, images // batch_size)
+    start = time.perf_counter()
+    for _ in range(calls):
+        model.predict_on_batch(batch)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "batch_size": batch_size,
+        "calls": calls,
+        "ms_per_call": round(elapsed / calls * 1000, 2),
+        "images_per_sec": round(calls * batch_size / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/bigDatasetWithDinaNCD_10E.h5")
+    parser.add_argument("--images", type=int, default=256, help="Images to push through at each batch size")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    rng = np.random.default_rng(0)
+    results = [measure(model, batch_size, args.images, rng) for batch_size in BATCH_SIZES]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'batch':>6} {'calls':>6} {'ms/call':>9} {'images/sec':>11}")
+    for row in results:
+        print(f"{row['batch_size']:>6} {row['calls']:>6} {row['ms_per_call']:>9} {row['images_per_sec']:>11}")
+
+
+if __name__ == "__main__":
+    main()
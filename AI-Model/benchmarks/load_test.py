@@ -0,0 +1,214 @@
+"""
+Load test of POST /predict/ at increasing concurrency, with baselines.
+
+The app runs in-process behind httpx's ASGI transport. After the model is
+ready, --images distinct uploads from synthetic.upload_mix (phone photos,
+resized JPEGs, screenshots) are cycled; the prediction cache is off, so
+every upload is decoded and classified. At each --concurrency level, that
+many clients send --requests uploads between them, each client waiting for
+its response before sending the next. Reported per level:
+
+- throughput: completed requests per second
+- p50_ms / p95_ms / p99_ms: request latency as a client sees it
+- peak_rss_mb: largest resident memory of the process, sampled every few
+  milliseconds during the level
+- statuses: HTTP status codes (503 when the pending-image queue is full),
+  and how many uploads got a prediction
+
+--save writes the report as a baseline; --baseline compares against one
+and exits with status 1 when any level's throughput fell, or its p95 or
+peak RSS rose, by more than --tolerance. Baselines record the machine
+they were taken on and the model file, its SHA-256 and the runtime that
+served it: compare on the same ones. Model files are not kept in the
+repository, so a baseline only holds for the model it was taken with;
+after deploying another model, or on another machine, take a new one
+with --save before comparing. Run from the AI-Model directory:
+
+    python benchmarks/load_test.py --save benchmarks/baselines/load_test.json
+    python benchmarks/load_test.py --baseline benchmarks/baselines/load_test.json
+
+and for an exported runtime (see export_model.py):
+
+    python export_model.py --formats tflite-fp16
+    MODEL_PATH=models/bigDatasetWithDinaNCD_10E_fp16.tflite python benchmarks/load_test.py
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from synthetic import upload_mix
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import file_fingerprint  # noqa: E402
+from runtime import infer_runtime  # noqa: E402
+
+# (metric, direction): a regression is the metric moving against direction
+COMPARED_METRICS = (("throughput", 1), ("p95_ms", -1), ("peak_rss_mb", -1))
+
+
+def process_tree_rss_bytes(pid: int) -> int:
+    """Resident memory of a process and all its descendants, from /proc"""
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as statm:
+                total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            with open(f"/proc/{pid}/task/{pid}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            # Exited between listing and reading
+            continue
+    return total
+
+
+class PeakRss:
+    """Samples the process tree's RSS in a thread while in use, keeping the peak"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        pid = os.getpid()
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss_bytes(pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def drive(client: httpx.AsyncClient, images, requests: int, concurrency: int) -> dict:
+    queue = collections.deque(images[i % len(images)] for i in range(requests))
+    latencies = []
+    statuses = collections.Counter()
+
+    async def user():
+        while queue:
+            image = queue.popleft()
+            start = time.perf_counter()
+            response = await client.post("/predict/", files={"file": ("photo", image, "application/octet-stream")})
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200 and "predicted_class" in response.json():
+                statuses["predicted"] += 1
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "statuses": dict(statuses),
+    }
+
+
+async def run(args) -> dict:
+    import main
+
+    images = list(upload_mix(args.images, args.seed))
+    levels = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            while (await client.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.1)
+            # Warm every code path, and every upload size, before timing
+            for image in images:
+                await client.post("/predict/", files={"file": ("photo", image, "application/octet-stream")})
+            for concurrency in args.concurrency:
+                levels.append(await drive(client, images, args.requests, concurrency))
+    return {
+        "benchmark": "AI-Model POST /predict/",
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {
+            "requests": args.requests, "images": args.images, "seed": args.seed,
+            "model": os.path.basename(main.MODEL_PATH), "model_sha256": file_fingerprint(main.MODEL_PATH),
+            "runtime": main.MODEL_RUNTIME or infer_runtime(main.MODEL_PATH), "max_batch_size": main.MAX_BATCH_SIZE,
+        },
+        "levels": levels,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of report against baseline, as messages"""
+    regressions = []
+    if report["settings"].get("model_sha256") != baseline["settings"].get("model_sha256"):
+        print("warning: baseline was taken with another model file; take a new one with --save", file=sys.stderr)
+    elif report["settings"] != baseline["settings"] or report["machine"] != baseline["machine"]:
+        print("warning: baseline was taken with other settings or on another machine", file=sys.stderr)
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        for metric, direction in COMPARED_METRICS:
+            change = (level[metric] - before[metric]) / before[metric]
+            if change * direction < -tolerance:
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {metric} {before[metric]} -> {level[metric]} ({change:+.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=128, help="Uploads at each concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--images", type=int, default=16, help="Distinct images to cycle through")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the report to this baseline file")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    # Identical uploads would be answered from the cache without decoding
+    os.environ["PREDICTION_CACHE"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
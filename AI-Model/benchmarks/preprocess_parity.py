@@ -0,0 +1,90 @@
+"""
+Compare the draft-mode preprocessing path with the original full decode.
+
+Reports per-image decode time for both paths, the size of the frame each
+decoder materialises, the largest pixel difference and, if a model is
+given, the largest difference in class probabilities. Exits non-zero when
+the probability difference exceeds --tolerance. Run from the AI-Model
+directory:
+
+    python benchmarks/preprocess_parity.py --images path/to/photos --model models/bigDatasetWithDinaNCD_10E.h5
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import IMAGE_SIZE, preprocess_image, preprocess_image_reference  # noqa: E402
+from synthetic import image_corpus  # noqa: E402
+
+
+def load_inputs(folder, count):
+    if folder is None:
+        return list(image_corpus(count))
+    names = sorted(
+        name for name in os.listdir(folder)
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )[:count]
+    inputs = []
+    for name in names:
+        with open(os.path.join(folder, name), "rb") as f:
+            inputs.append(f.read())
+    return inputs
+
+
+def decoded_frame_pixels(data: bytes, draft: bool) -> int:
+    img = Image.open(io.BytesIO(data))
+    if draft:
+        img.draft("RGB", IMAGE_SIZE)
+    return img.size[0] * img.size[1]
+
+
+def timed(fn, inputs):
+    start = time.perf_counter()
+    outputs = np.concatenate([fn(io.BytesIO(data)) for data in inputs])
+    return outputs, (time.perf_counter() - start) / len(inputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Folder of JPEG/PNG files (default: synthetic 12 MP photos)")
+    parser.add_argument("--count", type=int, default=32)
+    parser.add_argument("--model", help="Keras model to compare predictions with")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Max allowed probability difference")
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.images, args.count)
+    reference, reference_time = timed(preprocess_image_reference, inputs)
+    fast, fast_time = timed(preprocess_image, inputs)
+
+    full_pixels = np.mean([decoded_frame_pixels(data, draft=False) for data in inputs])
+    draft_pixels = np.mean([decoded_frame_pixels(data, draft=True) for data in inputs])
+
+    print(f"images:               {len(inputs)}")
+    print(f"reference decode:     {reference_time * 1000:.1f} ms/image, {full_pixels / 1e6:.2f} MP frame")
+    print(f"draft decode:         {fast_time * 1000:.1f} ms/image, {draft_pixels / 1e6:.2f} MP frame")
+    print(f"speedup:              {reference_time / fast_time:.1f}x")
+    print(f"max pixel difference: {np.abs(reference - fast).max():.4f}")
+
+    if args.model:
+        from tensorflow.keras.models import load_model
+
+        model = load_model(args.model)
+        reference_probs = np.asarray(model.predict_on_batch(reference))
+        fast_probs = np.asarray(model.predict_on_batch(fast))
+        max_diff = float(np.abs(reference_probs - fast_probs).max())
+        agreement = float(np.mean(reference_probs.argmax(axis=1) == fast_probs.argmax(axis=1)))
+        print(f"max probability diff: {max_diff:.4f}")
+        print(f"top-1 agreement:      {agreement:.1%}")
+        if max_diff > args.tolerance:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Accuracy, latency and memory report for exported classifier runtimes.
+
+The labeled folder must hold one sub-folder per class (cocci, healthy, ncd,
+salmo). Every model is loaded in its own subprocess so load time and peak
+RSS are measured independently. The first model is the reference: the
+others are also scored on how often their top-1 class agrees with it.
+Run from the AI-Model directory:
+
+    python benchmarks/runtime_parity.py --labeled-dir data/labeled \\
+        models/bigDatasetWithDinaNCD_10E.h5 \\
+        models/bigDatasetWithDinaNCD_10E_fp16.tflite \\
+        models/bigDatasetWithDinaNCD_10E_int8.tflite
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+AI_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_MODEL_DIR)
+
+from preprocessing import preprocess_image  # noqa: E402
+from runtime import CLASS_NAMES  # noqa: E402
+
+
+def load_labeled(folder: str, limit: int):
+    images, labels = [], []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(folder, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        names = sorted(n for n in os.listdir(class_dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        for name in names[:limit]:
+            with open(os.path.join(class_dir, name), "rb") as f:
+                images.append(preprocess_image(f)[0])
+            labels.append(label)
+    if not images:
+        raise SystemExit(f"No labeled images under {folder}; expected sub-folders {CLASS_NAMES}")
+    return np.stack(images), np.array(labels)
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(model_path: str, labeled_dir: str, limit: int) -> dict:
+    """Score one model; runs inside its own process."""
+    images, labels = load_labeled(labeled_dir, limit)
+    rss_before = max_rss_mb()
+
+    start = time.perf_counter()
+    from runtime import load_classifier
+
+    model = load_classifier(model_path)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = max_rss_mb()
+
+    model.predict(images[:1])  # Warm up
+    latencies = []
+    for image in images[:min(len(images), 100)]:
+        start = time.perf_counter()
+        model.predict(image[np.newaxis])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    probabilities = np.concatenate([model.predict(images[i:i + 32]) for i in range(0, len(images), 32)])
+    throughput = len(images) / (time.perf_counter() - start)
+    predicted = probabilities.argmax(axis=1)
+
+    per_class = {}
+    for label, class_name in enumerate(CLASS_NAMES):
+        mask = labels == label
+        if mask.any():
+            per_class[class_name] = round(float(np.mean(predicted[mask] == label)), 4)
+
+    return {
+        "model": model_path,
+        "file_mb": round(os.path.getsize(model_path) / 1e6, 2),
+        "images": int(len(images)),
+        "accuracy": round(float(np.mean(predicted == labels)), 4),
+        "per_class_accuracy": per_class,
+        "load_seconds": round(load_seconds, 3),
+        "model_rss_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(max_rss_mb(), 1),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "throughput_batch32": round(throughput, 1),
+        "predicted": predicted.tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("models", nargs="+", help="Model files; the first is the reference")
+    parser.add_argument("--labeled-dir", required=True)
+    parser.add_argument("--limit", type=int, default=250, help="Images per class")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.labeled_dir, args.limit)))
+        return
+
+    reports = []
+    for model_path in args.models:
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", model_path, "--labeled-dir", args.labeled_dir,
+             "--limit", str(args.limit), model_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = np.array(reports[0]["predicted"])
+    for report in reports:
+        report["agreement_with_reference"] = round(float(np.mean(np.array(report.pop("predicted")) == reference)), 4)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'model':<48} {'MB':>6} {'acc':>6} {'agree':>6} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'img/s':>7}")
+    for r in reports:
+        print(
+            f"{os.path.basename(r['model']):<48} {r['file_mb']:>6} {r['accuracy']:>6} {r['agreement_with_reference']:>6} "
+            f"{r['load_seconds']:>7} {r['model_rss_mb']:>7} {r['latency_ms_p50']:>7} {r['latency_ms_p95']:>7} "
+            f"{r['throughput_batch32']:>7}"
+        )
+        print("    per class: " + ", ".join(f"{name}={acc}" for name, acc in r["per_class_accuracy"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure AI-Model cold start: import time, time to healthy, time to ready
+and the latency of the first and second prediction.
+
+Each scenario starts a fresh uvicorn process. Extra environment variables
+can be given per run, e.g. to compare against no warm-up:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --env WARMUP_BATCH_SIZES=
+    python benchmarks/startup.py --env MODEL_PATH=models/bigDatasetWithDinaNCD_10E_int8.tflite
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+from synthetic import image_corpus
+
+AI_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_seconds(env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=AI_MODEL_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def wait_for(url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def predict_seconds(base_url: str, image: bytes) -> float:
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/predict/", files={"file": ("photo.jpg", image, "image/jpeg")})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the server")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update(item.split("=", 1) for item in args.env)
+    image = next(image_corpus(1))
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    results = {"import_seconds": round(import_seconds(env), 3)}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=AI_MODEL_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        results["healthy_seconds"] = round(wait_for(f"{base_url}/healthz", started, args.timeout), 3)
+        results["ready_seconds"] = round(wait_for(f"{base_url}/readyz", started, args.timeout), 3)
+        results["first_request_ms"] = round(predict_seconds(base_url, image) * 1000, 1)
+        results["second_request_ms"] = round(predict_seconds(base_url, image) * 1000, 1)
+        results["server_timings"] = requests.get(f"{base_url}/readyz").json().get("timings")
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Seeded synthetic photos for benchmarks.
+
+Pure noise compresses and decodes very differently from real photos, so
+images are built from a coarse random colour field upsampled to full size
+plus mild grain, which gives JPEG sizes close to phone-camera output.
+"""
+import io
+from typing import Iterator, Tuple
+
+import numpy as np
+from PIL import Image
+
+PHONE_RESOLUTION = (4000, 3000)  # 12 MP
+
+# What farmers upload: (size, format, share), mostly straight from the
+# phone camera, some resized by messaging apps, a few screenshots
+UPLOAD_MIX = (
+    (PHONE_RESOLUTION, "JPEG", 0.5),
+    ((1600, 1200), "JPEG", 0.3),
+    ((1280, 960), "PNG", 0.1),
+    ((640, 480), "JPEG", 0.1),
+)
+
+
+def make_image(rng: np.random.Generator, size: Tuple[int, int] = PHONE_RESOLUTION) -> Image.Image:
+    coarse = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+    grain = rng.integers(-12, 13, size=(size[1], size[0], 3), dtype=np.int16)
+    pixels = np.clip(np.asarray(img, dtype=np.int16) + grain, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def encode(img: Image.Image, fmt: str = "JPEG", quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(buffer, format=fmt, quality=quality)
+    else:
+        img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def image_corpus(
+    count: int,
+    seed: int = 0,
+    size: Tuple[int, int] = PHONE_RESOLUTION,
+    fmt: str = "JPEG",
+) -> Iterator[bytes]:
+    """Yield ``count`` encoded images; the same seed always gives the same bytes."""
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        yield encode(make_image(rng, size), fmt)
+
+
+def upload_mix(count: int, seed: int = 0) -> Iterator[bytes]:
+    """Yield ``count`` encoded images drawn from UPLOAD_MIX; the same seed always gives the same bytes."""
+    rng = np.random.default_rng(seed)
+    shares = np.array([share for _, _, share in UPLOAD_MIX])
+    for index in rng.choice(len(UPLOAD_MIX), size=count, p=shares / shares.sum()):
+        size, fmt, _ = UPLOAD_MIX[index]
+        yield encode(make_image(rng, size), fmt)
@@ -0,0 +1,70 @@
+"""
+Cost and accuracy of test-time augmentation (TTA) on a labeled folder.
+
+The folder must hold one sub-folder per class (cocci, healthy, ncd, salmo).
+Every image is scored once as a single view and once as the four TTA views
+in one forward pass. The report gives accuracy and per-image latency for
+both modes, and how many decisions TTA changed. Run from the AI-Model
+directory:
+
+    python benchmarks/tta_accuracy.py --labeled-dir data/labeled
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import tta_views  # noqa: E402
+from runtime import CLASS_NAMES, load_classifier  # noqa: E402
+from runtime_parity import load_labeled  # noqa: E402
+
+
+def score(model, images, make_batch):
+    probabilities, latencies = [], []
+    for image in images:
+        start = time.perf_counter()
+        probabilities.append(model.predict(make_batch(image)).mean(axis=0))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.stack(probabilities), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labeled-dir", required=True)
+    parser.add_argument("--model", default="models/bigDatasetWithDinaNCD_10E.h5")
+    parser.add_argument("--limit", type=int, default=250, help="Images per class")
+    args = parser.parse_args()
+
+    images, labels = load_labeled(args.labeled_dir, args.limit)
+    model = load_classifier(args.model)
+    model.predict(images[:1])
+    model.predict(tta_views(images[0]))  # Warm up both batch shapes
+
+    single, single_ms = score(model, images, lambda image: image[np.newaxis])
+    tta, tta_ms = score(model, images, tta_views)
+    single_pred, tta_pred = single.argmax(axis=1), tta.argmax(axis=1)
+
+    print(f"images: {len(images)}")
+    print(f"{'mode':<8} {'accuracy':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, predicted, latencies in (("single", single_pred, single_ms), ("tta", tta_pred, tta_ms)):
+        print(
+            f"{name:<8} {np.mean(predicted == labels):>9.2%} "
+            f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}"
+        )
+    print(f"TTA cost: {np.median(tta_ms) / np.median(single_ms):.2f}x median latency")
+    print(f"decisions changed: {np.sum(single_pred != tta_pred)} "
+          f"(fixed {np.sum((single_pred != labels) & (tta_pred == labels))}, "
+          f"broke {np.sum((single_pred == labels) & (tta_pred != labels))})")
+    for label, class_name in enumerate(CLASS_NAMES):
+        mask = labels == label
+        if mask.any():
+            print(f"    {class_name:<8} single {np.mean(single_pred[mask] == label):.2%}  "
+                  f"tta {np.mean(tta_pred[mask] == label):.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Peak memory of AI-Model under a burst of large uploads.
+
+The app runs in-process behind httpx's ASGI transport. After the model is
+ready and one request has warmed every code path, ``--concurrency`` uploads
+of 12 MP photos are sent at once, repeated ``--rounds`` times. The report
+gives the process peak RSS before and after the burst, the peak request
+body bytes held in flight (from /uploads/stats) and the status codes seen.
+Run from the AI-Model directory, optionally with the server's limits:
+
+    python benchmarks/upload_memory.py --concurrency 64
+    MAX_REQUEST_BYTES=4000000 python benchmarks/upload_memory.py --png
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import resource
+import sys
+
+import httpx
+
+from synthetic import image_corpus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(args) -> dict:
+    import main
+
+    images = list(image_corpus(args.images, fmt="PNG" if args.png else "JPEG"))
+    statuses = collections.Counter()
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            while (await client.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.1)
+
+            async def post(image: bytes):
+                response = await client.post("/predict/", files={"file": ("photo", image, "application/octet-stream")})
+                statuses[response.status_code] += 1
+
+            await post(images[0])
+            before = peak_rss_mb()
+            for round_index in range(args.rounds):
+                await asyncio.gather(*(post(images[(round_index + i) % len(images)]) for i in range(args.concurrency)))
+            uploads = (await client.get("/uploads/stats")).json()
+
+    return {
+        "concurrency": args.concurrency,
+        "upload_mb": round(sum(map(len, images)) / len(images) / 2**20, 2),
+        "peak_rss_before_mb": round(before, 1),
+        "peak_rss_after_mb": round(peak_rss_mb(), 1),
+        "peak_inflight_body_mb": round(uploads["peak_inflight_bytes"] / 2**20, 1),
+        "rejected_requests": uploads["rejected_requests"],
+        "statuses": dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--images", type=int, default=4, help="Distinct images to cycle through")
+    parser.add_argument("--png", action="store_true", help="Upload PNGs instead of JPEGs")
+    args = parser.parse_args()
+
+    # Identical uploads would be answered from the cache without decoding
+    os.environ.setdefault("PREDICTION_CACHE", "false")
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Score a directory, tar or zip archive of flock images offline.
+
+Uses the same preprocessing and model runtimes as the service. Images are
+decoded in a pool of worker processes and run through the model in large
+batches; results are appended to the output as they are produced, so a run
+of any size holds only a few batches in memory.
+
+Output is CSV, or Parquet when the output path ends in .parquet (needs
+pyarrow; written as a directory of part files). One row per image:
+
+    source, predicted_class, confidence, p_cocci, p_healthy, p_ncd, p_salmo, error
+
+Progress is recorded in an append-only checkpoint next to the output
+(<output>.checkpoint). Re-running the same command skips the images that
+are already scored; a checkpoint written with a different model file is
+refused unless --restart is given. Example, run from the AI-Model directory:
+
+    python bulk_diagnose.py archive/2024-flock.tar.gz results/2024-flock.csv --workers 16
+"""
+import argparse
+import collections
+import concurrent.futures
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tarfile
+import time
+import zipfile
+from typing import Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from cache import file_fingerprint
+from preprocessing import IMAGE_SIZE, InvalidImageError, load_image
+from runtime import CLASS_NAMES, RUNTIMES, load_classifier
+
+logger = logging.getLogger("ai-model.bulk")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MAX_IMAGE_PIXELS = 50_000_000
+COLUMNS = ["source", "predicted_class", "confidence"] + [f"p_{name}" for name in CLASS_NAMES] + ["error"]
+
+# An image is referenced by its path on disk, or by its bytes when it comes
+# out of an archive
+SourceItem = Tuple[str, Union[str, bytes]]
+
+
+def iter_sources(path: str, skip: Set[str]) -> Iterator[SourceItem]:
+    """Yield (name, path or bytes) for every image under ``path`` not in ``skip``."""
+    if os.path.isdir(path):
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                full_path = os.path.join(root, name)
+                source = os.path.relpath(full_path, path)
+                if name.lower().endswith(IMAGE_EXTENSIONS) and source not in skip:
+                    yield source, full_path
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS) and info.filename not in skip:
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(path):
+        # Stream mode reads compressed tars front to back without seeking
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS) and member.name not in skip:
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"{path} is not a directory, zip or tar archive")
+
+
+def decode_chunk(items: List[SourceItem]) -> Tuple[List[str], np.ndarray, dict]:
+    """
+    Decode a chunk of images in a worker process.
+
+    Returns the names, their resized pixels as uint8 (a quarter of the
+    float32 size to send back to the parent) and the errors by name for
+    images that could not be decoded; those get an all-zero row.
+    """
+    names = [name for name, _ in items]
+    pixels = np.zeros((len(items), IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.uint8)
+    errors = {}
+    for index, (name, source) in enumerate(items):
+        try:
+            image_file = io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+            with image_file:
+                pixels[index] = np.asarray(load_image(image_file, IMAGE_SIZE, MAX_IMAGE_PIXELS))
+        except (InvalidImageError, OSError) as e:
+            errors[name] = str(e)
+    return names, pixels, errors
+
+
+def chunked(items: Iterator[SourceItem], size: int) -> Iterator[List[SourceItem]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def decoded_chunks(pool, items: Iterator[SourceItem], chunk_size: int, max_in_flight: int):
+    """Results of ``decode_chunk`` in input order, with at most ``max_in_flight`` chunks queued."""
+    pending = collections.deque()
+    for chunk in chunked(items, chunk_size):
+        pending.append(pool.submit(decode_chunk, chunk))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class Checkpoint:
+    """
+    Append-only record of scored images.
+
+    The first line names the model; every later line lists the images of
+    one flushed batch together with the output position after it (a byte
+    offset for CSV, a part number for Parquet), so a resumed run can drop
+    output written after the last complete entry.
+    """
+
+    def __init__(self, path: str, model_fingerprint: str, restart: bool = False):
+        self.path = path
+        self.done = set()
+        self.position = 0
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            valid_bytes = self._load(model_fingerprint)
+            self._file = open(path, "a")
+            self._file.truncate(valid_bytes)
+        else:
+            self._file = open(path, "w")
+            self._write({"model": model_fingerprint})
+
+    def _load(self, model_fingerprint: str) -> int:
+        # Returns the length of the intact prefix of the file
+        with open(self.path, "rb") as f:
+            header = f.readline()
+            if json.loads(header).get("model") != model_fingerprint:
+                raise SystemExit(f"{self.path} was written by a different model; use --restart to score everything again")
+            valid_bytes = len(header)
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn final line from an interrupted run
+                self.done.update(entry["names"])
+                self.position = entry["position"]
+                valid_bytes += len(line)
+        return valid_bytes
+
+    def record(self, names: List[str], position: int) -> None:
+        self.done.update(names)
+        self.position = position
+        self._write({"names": names, "position": position})
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter:
+    def __init__(self, path: str, position: int):
+        exists = os.path.exists(path)
+        self._file = open(path, "a+", newline="")
+        self._file.truncate(position if exists else 0)
+        self._file.seek(0, os.SEEK_END)
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(COLUMNS)
+
+    def write(self, rows: List[list]) -> int:
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes each batch as its own part file; the position is the number of parts."""
+
+    def __init__(self, path: str, position: int):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.parts = position
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            # Parts past the checkpoint come from an interrupted run
+            if name.startswith("part-") and int(name[5:10]) >= position:
+                os.remove(os.path.join(path, name))
+
+    def write(self, rows: List[list]) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({column: [row[i] for row in rows] for i, column in enumerate(COLUMNS)})
+        part = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        pq.write_table(table, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self.parts += 1
+        return self.parts
+
+    def close(self) -> None:
+        pass
+
+
+def result_rows(names: List[str], probabilities: Optional[np.ndarray], errors: dict) -> List[list]:
+    rows = []
+    for index, name in enumerate(names):
+        if name in errors:
+            rows.append([name, None, None] + [None] * len(CLASS_NAMES) + [errors[name]])
+            continue
+        prediction = probabilities[index]
+        predicted = int(np.argmax(prediction))
+        rows.append(
+            [name, CLASS_NAMES[predicted], round(float(prediction[predicted]), 6)]
+            + [round(float(p), 6) for p in prediction]
+            + [None]
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory, .zip or .tar[.gz|.bz2|.xz] of images")
+    parser.add_argument("output", help="Output .csv file, or .parquet directory")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "models/bigDatasetWithDinaNCD_10E.h5"))
+    parser.add_argument("--runtime", choices=RUNTIMES, help="Defaults to the model file's extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decoding processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="Images per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Images per decoding task")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and score everything")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    checkpoint = Checkpoint(args.output + ".checkpoint", file_fingerprint(args.model), args.restart)
+    if args.output.endswith(".parquet"):
+        writer = ParquetWriter(args.output, checkpoint.position)
+    else:
+        writer = CsvWriter(args.output, checkpoint.position)
+    if checkpoint.done:
+        logger.info("resuming: %d images already scored", len(checkpoint.done))
+
+    # Workers are spawned, not forked, so none of them inherits the model or
+    # its runtime's thread pools
+    pool = concurrent.futures.ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+    model = load_classifier(args.model, args.runtime)
+
+    batch = np.empty((args.batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    names, errors, filled = [], {}, 0
+    scored, start = 0, time.perf_counter()
+
+    def flush():
+        nonlocal names, errors, filled, scored
+        probabilities = model.predict(batch[:filled]) if filled else None
+        # Failed images have a row in the batch too, so indices line up
+        position = writer.write(result_rows(names, probabilities, errors))
+        checkpoint.record(names, position)
+        scored += len(names)
+        elapsed = time.perf_counter() - start
+        logger.info("scored %d images (%.0f/s, %d failed in batch)", scored, scored / elapsed, len(errors))
+        names, errors, filled = [], {}, 0
+
+    try:
+        items = iter_sources(args.source, checkpoint.done)
+        for chunk_names, pixels, chunk_errors in decoded_chunks(pool, items, args.chunk_size, args.workers * 4):
+            offset = 0
+            while offset < len(chunk_names):
+                take = min(len(chunk_names) - offset, args.batch_size - filled)
+                # Same scaling as preprocess_into, straight into the batch buffer
+                np.divide(pixels[offset:offset + take], np.float32(255.0), out=batch[filled:filled + take], casting="unsafe")
+                names.extend(chunk_names[offset:offset + take])
+                errors.update((name, chunk_errors[name]) for name in chunk_names[offset:offset + take] if name in chunk_errors)
+                filled += take
+                offset += take
+                if filled == args.batch_size:
+                    flush()
+        if names:
+            flush()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        writer.close()
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info("done: %d images in %.1fs (%.0f/s) -> %s", scored, elapsed, scored / elapsed if elapsed else 0, args.output)
+
+
+if __name__ == "__main__":
+    main()
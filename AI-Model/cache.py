@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger("ai-model.cache")
+
+_GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def file_fingerprint(path: str) -> str:
+    """SHA-256 of a model file, used to tie cached predictions to the model that made them."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_key(source: Union[bytes, BinaryIO]) -> str:
+    """Cache key for the exact bytes of an upload, given as bytes or a seekable file."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        # Hash in chunks so a spooled upload is never copied into one buffer
+        for chunk in iter(lambda: source.read(1 << 16), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return "raw:" + digest.hexdigest()
+
+
+def perceptual_key(image: np.ndarray) -> str:
+    """
+    Cache key from a 64-bit difference hash of a preprocessed image.
+
+    The image is reduced to 8x9 grey block means and each bit records
+    whether a block is brighter than its right-hand neighbour, so
+    re-encoded, re-sized or lightly re-compressed copies of a photo
+    usually map to the same key.
+    """
+    gray = image @ _GRAY_WEIGHTS
+    row_edges = np.linspace(0, gray.shape[0], 9).astype(int)[:-1]
+    col_edges = np.linspace(0, gray.shape[1], 10).astype(int)[:-1]
+    blocks = np.add.reduceat(np.add.reduceat(gray, row_edges, axis=0), col_edges, axis=1)
+    blocks /= np.outer(np.diff(np.append(row_edges, gray.shape[0])), np.diff(np.append(col_edges, gray.shape[1])))
+    bits = np.packbits(blocks[:, 1:] > blocks[:, :-1])
+    return "phash:" + bits.tobytes().hex()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of class probabilities.
+
+    The memory tier is an LRU of at most ``max_entries`` entries, each valid
+    for ``ttl_seconds``. The optional SQLite tier at ``sqlite_path`` is shared
+    by every worker on the host and survives restarts. Every entry is stored
+    against ``model_fingerprint``; rows written by a different model file are
+    purged when the cache opens and never returned.
+    """
+
+    def __init__(
+        self,
+        model_fingerprint: str,
+        max_entries: int = 4096,
+        ttl_seconds: float = 3600,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.model_fingerprint = model_fingerprint
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, probabilities BLOB NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (model, key))"
+            )
+            purged = self._db.execute("DELETE FROM predictions WHERE model != ?", (model_fingerprint,)).rowcount
+            if purged:
+                logger.info("purged %d cached predictions from previous models", purged)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                probabilities, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return probabilities
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT probabilities, created_at FROM predictions WHERE model = ? AND key = ?",
+                    (self.model_fingerprint, key),
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    probabilities = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, probabilities, row[1])
+                    self.disk_hits += 1
+                    return probabilities
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, probabilities: np.ndarray) -> None:
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._remember(key, probabilities, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (model, key, probabilities, created_at) VALUES (?, ?, ?, ?)",
+                    (self.model_fingerprint, key, probabilities.tobytes(), now),
+                )
+
+    def _remember(self, key: str, probabilities: np.ndarray, created_at: float) -> None:
+        self._entries[key] = (probabilities, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model_fingerprint": self.model_fingerprint,
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
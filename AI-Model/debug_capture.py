@@ -0,0 +1,109 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+logger = logging.getLogger("ai-model.debug-capture")
+
+
+class CapturedInput:
+    """An uploaded image kept for debugging, stored as the raw upload bytes."""
+
+    __slots__ = ("captured_at", "filename", "content_type", "data")
+
+    def __init__(self, filename: str, content_type: str, data: bytes):
+        self.captured_at = time.time()
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+    def summary(self) -> dict:
+        return {
+            "captured_at": self.captured_at,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "size_bytes": len(self.data),
+        }
+
+
+class DebugCapture:
+    """
+    Opt-in, sampled capture of model inputs.
+
+    A request is captured with probability ``sample_rate``, and at most
+    ``max_per_minute`` captures are taken (token bucket). The last
+    ``buffer_size`` captures stay in memory; if ``spill_dir`` is set they are
+    also written there by a background thread, under names unique to this
+    process so several workers never write the same file. Uploads are kept
+    as received, so capturing never re-encodes an image.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.01,
+        max_per_minute: float = 6,
+        buffer_size: int = 32,
+        spill_dir: Optional[str] = None,
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self.spill_dir = spill_dir
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._tokens = float(max_per_minute)
+        self._refilled_at = time.monotonic()
+        self._sequence = 0
+        self._spill_pool = None
+
+        if enabled and spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spill_pool = ThreadPoolExecutor(1, thread_name_prefix="debug-spill")
+
+    def should_capture(self) -> bool:
+        """Decide whether the current request is sampled; cheap when disabled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._refilled_at) * self.max_per_minute / 60.0
+            self._tokens = min(float(self.max_per_minute), self._tokens + refill)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def capture(self, filename: str, content_type: str, data: bytes) -> None:
+        entry = CapturedInput(filename, content_type, data)
+        with self._lock:
+            self._buffer.append(entry)
+            self._sequence += 1
+            sequence = self._sequence
+
+        if self._spill_pool is not None:
+            self._spill_pool.submit(self._spill, entry, sequence)
+
+    def recent(self) -> List[CapturedInput]:
+        """Captured inputs, oldest first."""
+        with self._lock:
+            return list(self._buffer)
+
+    def _spill(self, entry: CapturedInput, sequence: int) -> None:
+        extension = ".png" if entry.content_type == "image/png" else ".jpg"
+        name = f"{int(entry.captured_at * 1000)}-{os.getpid()}-{sequence}{extension}"
+        try:
+            with open(os.path.join(self.spill_dir, name), "wb") as f:
+                f.write(entry.data)
+        except OSError as e:
+            logger.warning("debug capture spill failed path=%s error=%s", name, e)
+
+    def shutdown(self) -> None:
+        if self._spill_pool is not None:
+            self._spill_pool.shutdown(wait=True)
@@ -0,0 +1,57 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue has no room for another request."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs image decoding and model calls off the event loop.
+
+    Decoding goes to a pool of ``preprocess_workers`` threads; model calls go
+    to a single dedicated thread so a forward pass never waits behind image
+    decodes (TensorFlow parallelises each call with its own intra-op pool).
+    Admission is bounded: once ``max_pending`` images are in flight, new
+    requests are rejected with QueueFullError instead of piling up.
+    """
+
+    def __init__(self, preprocess_workers: int = 4, max_pending: int = 64, retry_after: int = 1):
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._pending = 0
+        self._preprocess_pool = ThreadPoolExecutor(preprocess_workers, thread_name_prefix="preprocess")
+        self._model_pool = ThreadPoolExecutor(1, thread_name_prefix="inference")
+
+    @property
+    def depth(self) -> int:
+        """Number of images admitted and not yet answered."""
+        return self._pending
+
+    @asynccontextmanager
+    async def admit(self, count: int = 1):
+        """Reserve queue capacity for ``count`` images for the duration of a request."""
+        if self._pending + count > self.max_pending:
+            raise QueueFullError(self.retry_after)
+        self._pending += count
+        try:
+            yield
+        finally:
+            self._pending -= count
+
+    async def preprocess(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._preprocess_pool, fn, *args)
+
+    async def infer(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._model_pool, fn, *args)
+
+    def shutdown(self) -> None:
+        self._preprocess_pool.shutdown(wait=False, cancel_futures=True)
+        self._model_pool.shutdown(wait=True)
@@ -0,0 +1,136 @@
+"""
+Export the Keras disease classifier to lightweight CPU runtimes.
+
+Formats:
+    tflite-fp16  float16 weights, float32 compute
+    tflite-int8  post-training integer quantization, calibrated on sample images
+    onnx         float32 ONNX graph (needs tf2onnx)
+    onnx-int8    statically quantized ONNX graph (needs tf2onnx and onnxruntime)
+
+Int8 formats need --calibration-dir, a folder (searched recursively) of
+representative farm photos; a few hundred images covering all four classes
+is enough. Example, run from the AI-Model directory:
+
+    python export_model.py --formats tflite-fp16 tflite-int8 --calibration-dir data/calibration
+
+Serve an export by pointing MODEL_PATH at it; see runtime.py.
+"""
+import argparse
+import logging
+import os
+import random
+from typing import Iterator, List
+
+import numpy as np
+
+from preprocessing import IMAGE_SIZE, preprocess_image
+
+logger = logging.getLogger("ai-model.export")
+
+FORMATS = ("tflite-fp16", "tflite-int8", "onnx", "onnx-int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def find_images(folder: str) -> List[str]:
+    paths = []
+    for root, _, names in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def calibration_batches(folder: str, count: int, seed: int = 0) -> Iterator[np.ndarray]:
+    """Yield preprocessed (1, 180, 180, 3) batches from a random sample of the folder."""
+    paths = find_images(folder)
+    if not paths:
+        raise ValueError(f"No calibration images found in {folder}")
+    random.Random(seed).shuffle(paths)
+    for path in paths[:count]:
+        with open(path, "rb") as f:
+            yield preprocess_image(f)
+
+
+def export_tflite(model, output_path: str, quantization: str, calibration_dir: str = None, calibration_count: int = 200):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        # Integer kernels throughout; inputs and outputs stay float32 so the
+        # service feeds the same tensors to every runtime.
+        converter.representative_dataset = lambda: ([batch] for batch in calibration_batches(calibration_dir, calibration_count))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output_path: str, opset: int = 13):
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = (tf.TensorSpec((None, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), tf.float32, name="image"),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=output_path)
+
+
+def quantize_onnx(float_path: str, output_path: str, calibration_dir: str, calibration_count: int = 200):
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = calibration_batches(calibration_dir, calibration_count)
+
+        def get_next(self):
+            batch = next(self._batches, None)
+            return None if batch is None else {"image": batch}
+
+    quantize_static(
+        float_path,
+        output_path,
+        Reader(),
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/bigDatasetWithDinaNCD_10E.h5")
+    parser.add_argument("--output-dir", default="models")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["tflite-fp16", "tflite-int8"])
+    parser.add_argument("--calibration-dir", help="Representative images for int8 calibration")
+    parser.add_argument("--calibration-count", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if any(fmt.endswith("int8") for fmt in args.formats) and not args.calibration_dir:
+        parser.error("int8 formats need --calibration-dir")
+
+    from tensorflow.keras.models import load_model
+
+    model = load_model(args.model)
+    stem = os.path.join(args.output_dir, os.path.splitext(os.path.basename(args.model))[0])
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for fmt in args.formats:
+        if fmt == "tflite-fp16":
+            path = f"{stem}_fp16.tflite"
+            export_tflite(model, path, "fp16")
+        elif fmt == "tflite-int8":
+            path = f"{stem}_int8.tflite"
+            export_tflite(model, path, "int8", args.calibration_dir, args.calibration_count)
+        elif fmt == "onnx":
+            path = f"{stem}.onnx"
+            export_onnx(model, path)
+        else:
+            float_path = f"{stem}.onnx"
+            if not os.path.exists(float_path):
+                export_onnx(model, float_path)
+            path = f"{stem}_int8.onnx"
+            quantize_onnx(float_path, path, args.calibration_dir, args.calibration_count)
+        logger.info("exported %s to %s (%.1f MB)", fmt, path, os.path.getsize(path) / 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for running several AI-Model workers from one preloaded model.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app (and with PRELOAD_MODEL, the model) is imported once in the master
+process before workers are forked, so model weights are shared copy-on-write
+instead of loaded per worker. Warm-up and the prediction cache are set up in
+each worker after the fork. Preloading is only on by default for the TFLite
+and ONNX runtimes; TensorFlow does not support being used from a child forked
+after it was initialised, so a Keras model is loaded by each worker.
+"""
+import os
+
+from runtime import DEFAULT_MODEL_PATH, FORK_SAFE_RUNTIMES, infer_runtime
+
+if (os.getenv("MODEL_RUNTIME") or infer_runtime(os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH))) in FORK_SAFE_RUNTIMES:
+    os.environ.setdefault("PRELOAD_MODEL", "true")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
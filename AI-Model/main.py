@@ -1,12 +1,191 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, Query, Request, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
+from typing import BinaryIO, List, Optional, Tuple
+import asyncio
 import numpy as np
-import io
-from PIL import Image
+import logging
+import os
+import threading
+import time
 
-app = FastAPI()
+from batcher import MicroBatcher
+from cache import PredictionCache, content_key, file_fingerprint, perceptual_key
+from debug_capture import DebugCapture
+from executor import InferenceExecutor, QueueFullError
+from preprocessing import IMAGE_SIZE, InvalidImageError, preprocess_image, preprocess_into, tta_views
+from runtime import CLASS_NAMES, DEFAULT_MODEL_PATH, FORK_SAFE_RUNTIMES, infer_runtime, load_classifier
+from uploads import UploadLimitMiddleware, UploadStats, sniff_image_type, upload_size
+
+_MODULE_START = time.perf_counter()
+
+# Configure logging
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger("ai-model")
+
+# MODEL_RUNTIME is keras, tflite or onnx; by default it follows the file
+# extension, so pointing MODEL_PATH at an exported .tflite file is enough to
+# serve without TensorFlow. Thread counts of 0 leave the choice to the runtime.
+MODEL_PATH = os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH)  # Ensure your model path is correct
+MODEL_RUNTIME = os.getenv("MODEL_RUNTIME") or None
+
+# The model is loaded once per process at startup and then run on
+# WARMUP_BATCH_SIZES dummy batches, so graph tracing is not paid by the first
+# real request. /readyz reports 503 until both steps are done. With
+# PRELOAD_MODEL the model is instead loaded at import time, which lets a
+# pre-forking server (see gunicorn.conf.py) share it copy-on-write; warm-up
+# still runs in each worker after the fork. Only the TFLite and ONNX runtimes
+# survive the fork; for the Keras runtime the setting is ignored.
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "false").lower() in ("1", "true", "yes")
+
+model = None
+model_ready = False
+model_error = None
+startup_timings = {}
+_model_lock = threading.Lock()
+
+class_names = CLASS_NAMES
+
+# Uploads are streamed into spooled temporary files (memory up to 1 MB, disk
+# beyond) and decoded from there without copying. A request body over
+# MAX_REQUEST_BYTES is cut off with 413 as it streams in; each image must also
+# fit MAX_UPLOAD_BYTES and MAX_IMAGE_PIXELS, which bounds decode memory. The
+# file type is taken from its magic bytes, not the client's Content-Type.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+upload_stats = UploadStats()
+
+# Micro-batching: concurrent requests are grouped into one forward pass of up
+# to MAX_BATCH_SIZE images, waiting at most MAX_BATCH_WAIT_MS for stragglers.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "32"))
+MAX_BATCH_WAIT_MS = float(os.getenv("MAX_BATCH_WAIT_MS", "5"))
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE}").split(",") if size.strip()]
+
+# Decoding and inference run off the event loop. Once MAX_PENDING_IMAGES are
+# in flight, new requests get 503 with Retry-After instead of queueing forever;
+# a batch larger than that could never be admitted and gets 413.
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING_IMAGES = int(os.getenv("MAX_PENDING_IMAGES", "128"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+
+# Test-time augmentation (?tta=true) averages four views of the image in one
+# forward pass. While more than TTA_MAX_QUEUE_DEPTH images are in flight it
+# falls back to the single view, so TTA never adds to an existing backlog.
+TTA_MAX_QUEUE_DEPTH = int(os.getenv("TTA_MAX_QUEUE_DEPTH", str(MAX_BATCH_SIZE)))
+
+executor = InferenceExecutor(
+    preprocess_workers=PREPROCESS_WORKERS,
+    max_pending=MAX_PENDING_IMAGES,
+    retry_after=RETRY_AFTER_SECONDS,
+)
+
+# Repeated uploads are answered from a cache keyed by the SHA-256 of the
+# upload and, for re-encoded copies, by a perceptual hash of the decoded image.
+# PREDICTION_CACHE_DB adds an SQLite tier shared by all workers. Entries are
+# tied to the fingerprint of the loaded model file, so a new model never
+# serves an old model's answers. Each worker opens its own cache once its
+# model has loaded (see prepare_model), never in a pre-forking master, so no
+# SQLite connection crosses a fork.
+PREDICTION_CACHE = os.getenv("PREDICTION_CACHE", "true").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_PERCEPTUAL = os.getenv("PREDICTION_CACHE_PERCEPTUAL", "true").lower() in ("1", "true", "yes")
+prediction_cache = None
+
+
+def load_model_once():
+    """Load the classifier for this process if it is not loaded yet."""
+    global model
+    with _model_lock:
+        if model is None:
+            start = time.perf_counter()
+            model = load_classifier(
+                MODEL_PATH,
+                MODEL_RUNTIME,
+                intra_op_threads=int(os.getenv("TF_INTRA_OP_THREADS", "0")),
+                inter_op_threads=int(os.getenv("TF_INTER_OP_THREADS", "0")),
+            )
+            startup_timings["load_seconds"] = round(time.perf_counter() - start, 3)
+            logger.info(
+                "model loaded path=%s runtime=%s input_shape=%s seconds=%.2f",
+                MODEL_PATH, type(model).__name__, model.input_shape, startup_timings["load_seconds"],
+            )
+    return model
+
+
+def open_prediction_cache():
+    """Open this process's prediction cache, if caching is on."""
+    global prediction_cache
+    if PREDICTION_CACHE and prediction_cache is None:
+        prediction_cache = PredictionCache(
+            file_fingerprint(MODEL_PATH),
+            max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "4096")),
+            ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600")),
+            sqlite_path=os.getenv("PREDICTION_CACHE_DB") or None,
+        )
+
+
+def warm_up():
+    start = time.perf_counter()
+    for size in WARMUP_BATCH_SIZES:
+        model.predict(np.zeros((size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32))
+    startup_timings["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+
+async def prepare_model():
+    global model_ready, model_error
+    try:
+        # All steps run on the inference thread so /healthz keeps answering;
+        # opening the cache hashes the model file for its fingerprint
+        await executor.infer(load_model_once)
+        await executor.infer(open_prediction_cache)
+        await executor.infer(warm_up)
+    except Exception as e:
+        model_error = str(e)
+        logger.exception("model failed to load path=%s", MODEL_PATH)
+        return
+    model_ready = True
+    startup_timings["ready_seconds"] = round(time.perf_counter() - _MODULE_START, 3)
+    logger.info("model ready timings=%s", startup_timings)
+
+
+async def predict_batch(batch: np.ndarray) -> np.ndarray:
+    return await executor.infer(model.predict, batch)
+
+
+batcher = MicroBatcher(predict_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS)
+
+# Opt-in capture of sampled uploads for debugging: the last
+# DEBUG_CAPTURE_BUFFER_SIZE are kept in memory and, if DEBUG_CAPTURE_DIR is
+# set, written there in the background.
+debug_capture = DebugCapture(
+    enabled=os.getenv("DEBUG_CAPTURE", "false").lower() in ("1", "true", "yes"),
+    sample_rate=float(os.getenv("DEBUG_CAPTURE_SAMPLE_RATE", "0.01")),
+    max_per_minute=float(os.getenv("DEBUG_CAPTURE_MAX_PER_MINUTE", "6")),
+    buffer_size=int(os.getenv("DEBUG_CAPTURE_BUFFER_SIZE", "32")),
+    spill_dir=os.getenv("DEBUG_CAPTURE_DIR") or None,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global prediction_cache
+    batcher.start()
+    preparing = asyncio.create_task(prepare_model())
+    yield
+    preparing.cancel()
+    await batcher.stop()
+    executor.shutdown()
+    debug_capture.shutdown()
+    if prediction_cache is not None:
+        prediction_cache.close()
+        prediction_cache = None
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,50 +194,266 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(UploadLimitMiddleware, max_body_bytes=MAX_REQUEST_BYTES, stats=upload_stats)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 
-MODEL_PATH = "models/bigDatasetWithDinaNCD_10E.h5"  # Ensure your model path is correct
-model = load_model(MODEL_PATH)
+def require_ready():
+    if not model_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is not ready",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
 
-# Define your class names as per the notebook's label encoding
-# 0 -> Coccidiosis, 1 -> Healthy, 2 -> New Castle Disease, 3 -> Salmonella
-class_names = ["cocci", "healthy", "ncd", "salmo"]
-IMAGE_SIZE = (180, 180)  # Updated to match training size from notebook
 
-def preprocess_image(image_file) -> np.ndarray:
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    if not model_ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "failed" if model_error else "loading", "error": model_error},
+        )
+    return {"status": "ready", "model": MODEL_PATH, "runtime": type(model).__name__, "timings": startup_timings}
+
+
+def preprocess_upload(image_file, out: np.ndarray = None) -> np.ndarray:
+    """Preprocess an upload to (1, 180, 180, 3), or into a row of a batch buffer."""
     try:
-        img = Image.open(image_file).convert("RGB")
-        print("📂 Processing image file")
-        print(f"🔍 Received image - Size: {img.size}, Mode: {img.mode}")
-        img.save("debug_latest_image.jpg")  # Save for debugging if needed
-
-        img = img.resize(IMAGE_SIZE)  # Resize image to 180x180 to match training
-        img_array = image.img_to_array(img) / 255.0  # Normalize pixel values to [0, 1]
-        img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension: (1, 180, 180, 3)
-        return img_array
-    except Exception as e:
+        if out is None:
+            return preprocess_image(image_file, MAX_IMAGE_PIXELS)
+        preprocess_into(image_file, out, MAX_IMAGE_PIXELS)
+        return out
+    except InvalidImageError as e:
         raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
 
-@app.post("/predict/")
-async def predict(file: UploadFile = File(...)):
-    if file.content_type not in ["image/jpeg", "image/png"]:
+
+def format_prediction(prediction: np.ndarray, top_k: int = 1) -> dict:
+    predicted_class_index = int(np.argmax(prediction))  # Get the predicted class index
+    result = {
+        "predicted_class": class_names[predicted_class_index],  # Get the class name
+        "confidence": float(prediction[predicted_class_index]),  # Get the confidence score
+    }
+    if top_k > 1:
+        ranked = np.argsort(prediction)[::-1][:top_k]
+        result["top_k"] = [{"class": class_names[i], "probability": float(prediction[i])} for i in ranked]
+    return result
+
+
+def check_upload(file: UploadFile) -> str:
+    """Validate an upload's size and magic bytes; returns its real content type."""
+    if upload_size(file.file) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {MAX_UPLOAD_BYTES} bytes")
+    content_type = sniff_image_type(file.file)
+    if content_type is None:
         raise HTTPException(status_code=415, detail="Only JPG or PNG images are allowed.")
+    return content_type
 
-    try:
-        print(f"📂 Received file: {file.filename}")
-        print(f"Model expects input shape: {model.input_shape}")
 
-        image_data = await file.read()  # Read image data
-        img_array = preprocess_image(io.BytesIO(image_data))  # Preprocess image
+def capture_upload(file: UploadFile, content_type: str) -> None:
+    # Only sampled uploads are ever copied out of the spooled file
+    if debug_capture.should_capture():
+        debug_capture.capture(file.filename, content_type, file.file.read())
+        file.file.seek(0)
 
-        print(f"Input image shape: {img_array.shape}")
 
-        # Make prediction directly without padding
-        predictions = model.predict(img_array)  # Shape: (1, 4)
-        predicted_class_index = np.argmax(predictions[0])  # Get the predicted class index
-        predicted_class = class_names[predicted_class_index]  # Get the class name
-        confidence = float(predictions[0][predicted_class_index])  # Get the confidence score
+async def predict_image(image_file: BinaryIO, tta: bool = False) -> Tuple[np.ndarray, int]:
+    """
+    Class probabilities for one upload, from the cache when possible.
 
-        return {"predicted_class": predicted_class, "confidence": confidence}
+    Returns the probabilities and the number of views they average over.
+    """
+    views = 4 if tta and executor.depth <= TTA_MAX_QUEUE_DEPTH else 1
+    suffix = ":tta" if views > 1 else ""
 
-    except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+    # Cache lookups and stores may query SQLite, so like decoding they run
+    # on the preprocessing pool, never on the event loop. Until the cache is
+    # open (see prepare_model) every upload is a miss.
+    raw_key = image_key = None
+    if prediction_cache is not None:
+        raw_key, cached = await executor.preprocess(_lookup_upload, image_file, suffix)
+        if cached is not None:
+            return cached, views
+
+    img_array = await executor.preprocess(preprocess_upload, image_file)  # Shape: (1, 180, 180, 3)
+
+    if raw_key is not None and PREDICTION_CACHE_PERCEPTUAL:
+        image_key, cached = await executor.preprocess(_lookup_image, img_array[0], suffix)
+        if cached is not None:
+            await executor.preprocess(_store_prediction, (raw_key,), cached)
+            return cached, views
+
+    if views > 1:
+        # All views go through the model together, as one group in the batcher
+        probabilities = (await batcher.submit(tta_views(img_array[0]))).mean(axis=0)
+    else:
+        # Queued with any concurrent requests and predicted as one batch
+        probabilities = (await batcher.submit(img_array))[0]  # Shape: (4,)
+
+    if raw_key is not None:
+        keys = (raw_key,) if image_key is None else (raw_key, image_key)
+        await executor.preprocess(_store_prediction, keys, probabilities)
+    return probabilities, views
+
+
+def _lookup_upload(image_file: BinaryIO, suffix: str) -> Tuple[str, Optional[np.ndarray]]:
+    key = content_key(image_file) + suffix
+    return key, prediction_cache.get(key)
+
+
+def _lookup_image(image: np.ndarray, suffix: str) -> Tuple[str, Optional[np.ndarray]]:
+    key = perceptual_key(image) + suffix
+    return key, prediction_cache.get(key)
+
+
+def _store_prediction(keys: Tuple[str, ...], probabilities: np.ndarray) -> None:
+    for key in keys:
+        prediction_cache.put(key, probabilities)
+
+
+@app.post("/predict/")
+async def predict(
+    file: UploadFile = File(...),
+    top_k: int = Query(1, ge=1, le=len(CLASS_NAMES), description="Number of ranked classes to return"),
+    tta: bool = Query(False, description="Average flipped and centre-cropped views"),
+):
+    content_type = check_upload(file)
+    require_ready()
+
+    async with executor.admit():
+        try:
+            capture_upload(file, content_type)
+            probabilities, views = await predict_image(file.file, tta)
+            result = format_prediction(probabilities, top_k)
+            if tta:
+                result["tta_views"] = views
+            logger.debug(
+                "prediction filename=%s bytes=%s class=%s confidence=%.4f",
+                file.filename, file.size, result["predicted_class"], result["confidence"],
+            )
+            return result
+
+        except Exception as e:
+            logger.warning("prediction failed filename=%s error=%s", file.filename, e)
+            return {"error": str(e)}
+
+
+@app.post("/predict/batch")
+async def predict_many(
+    files: List[UploadFile] = File(...),
+    top_k: int = Query(1, ge=1, le=len(CLASS_NAMES), description="Number of ranked classes to return"),
+):
+    """
+    Predict several images in one request; failures are reported per file.
+
+    A batch is admitted as a whole, so one of more than MAX_PENDING_IMAGES
+    files could never be: it is rejected with 413 rather than told to retry.
+    """
+    if len(files) > executor.max_pending:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {executor.max_pending} images per batch; split the batch into smaller ones",
+        )
+    require_ready()
+    async with executor.admit(len(files)):
+        return {"predictions": await _predict_files(files, top_k)}
+
+
+async def _decode_upload(file: UploadFile, out: np.ndarray) -> None:
+    content_type = check_upload(file)
+    capture_upload(file, content_type)
+    await executor.preprocess(preprocess_upload, file.file, out)
+
+
+async def _predict_files(files: List[UploadFile], top_k: int = 1) -> List[dict]:
+    results = [None] * len(files)
+    indices = []
+
+    # Every image is decoded straight into its own row of one batch buffer,
+    # concurrently on the preprocessing pool
+    batch = np.empty((len(files), IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    decoded = await asyncio.gather(
+        *(_decode_upload(file, batch[index]) for index, file in enumerate(files)),
+        return_exceptions=True,
+    )
+    for index, (file, outcome) in enumerate(zip(files, decoded)):
+        if isinstance(outcome, HTTPException):
+            results[index] = {"filename": file.filename, "error": outcome.detail}
+        elif isinstance(outcome, Exception):
+            results[index] = {"filename": file.filename, "error": str(outcome)}
+        else:
+            indices.append(index)
+
+    if indices:
+        if len(indices) < len(files):
+            batch = batch[indices]  # Drop the rows of files that failed to decode
+        try:
+            predictions = await batcher.submit(batch)
+        except Exception as e:
+            for index in indices:
+                results[index] = {"filename": files[index].filename, "error": str(e)}
+        else:
+            for index, prediction in zip(indices, predictions):
+                results[index] = {"filename": files[index].filename, **format_prediction(prediction, top_k)}
+
+    return results
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit and miss counters of the prediction cache (per lookup)."""
+    if prediction_cache is None:
+        raise HTTPException(status_code=404, detail="Prediction cache is disabled")
+    return prediction_cache.stats()
+
+
+@app.get("/uploads/stats")
+async def uploads_stats():
+    """Request body bytes held by in-flight requests, for sizing memory limits."""
+    return {**upload_stats.as_dict(), "max_request_bytes": MAX_REQUEST_BYTES, "max_upload_bytes": MAX_UPLOAD_BYTES}
+
+
+@app.get("/debug/captures")
+async def list_debug_captures():
+    """Summaries of the sampled inputs currently held in memory."""
+    if not debug_capture.enabled:
+        raise HTTPException(status_code=404, detail="Debug capture is disabled")
+    return {"captures": [entry.summary() for entry in debug_capture.recent()]}
+
+
+@app.get("/debug/captures/{index}")
+async def get_debug_capture(index: int):
+    """Raw bytes of one captured input, as uploaded."""
+    if not debug_capture.enabled:
+        raise HTTPException(status_code=404, detail="Debug capture is disabled")
+    captures = debug_capture.recent()
+    if not 0 <= index < len(captures):
+        raise HTTPException(status_code=404, detail="No capture at that index")
+    entry = captures[index]
+    return Response(content=entry.data, media_type=entry.content_type)
+
+
+if PRELOAD_MODEL:
+    if (MODEL_RUNTIME or infer_runtime(MODEL_PATH)) in FORK_SAFE_RUNTIMES:
+        load_model_once()
+    else:
+        # TensorFlow initialised here would be unusable in forked workers
+        logger.warning(
+            "PRELOAD_MODEL ignored for the %s runtime: forked workers cannot use TensorFlow safely, "
+            "so each worker loads the model itself", MODEL_RUNTIME or infer_runtime(MODEL_PATH),
+        )
@@ -0,0 +1,98 @@
+from typing import BinaryIO, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (180, 180)  # Matches the training size from the notebook
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+def load_image(
+    image_file: BinaryIO,
+    size: Tuple[int, int] = IMAGE_SIZE,
+    max_pixels: Optional[int] = None,
+) -> Image.Image:
+    """
+    Decode an image and resize it to ``size``.
+
+    For JPEGs, ``draft`` lets libjpeg scale by 1/2, 1/4 or 1/8 while
+    decoding (in the DCT domain), so a 12 MP photo is never expanded to
+    full resolution; the decoder stops at the smallest scale that is still
+    at least ``size``, and the final resize works from there. Images whose
+    header declares more than ``max_pixels`` are rejected before decoding.
+    """
+    try:
+        img = Image.open(image_file)
+        if max_pixels is not None and img.size[0] * img.size[1] > max_pixels:
+            raise InvalidImageError(f"Image of {img.size[0]}x{img.size[1]} exceeds {max_pixels} pixels")
+        img.draft("RGB", size)
+        img = img.convert("RGB")
+        return img.resize(size, Image.Resampling.BICUBIC)
+    except InvalidImageError:
+        raise
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+
+
+def preprocess_into(image_file: BinaryIO, out: np.ndarray, max_pixels: Optional[int] = None) -> None:
+    """
+    Decode an image and write its normalised pixels into ``out``.
+
+    Args:
+        image_file: Binary file-like object holding a JPEG or PNG
+        out: float32 array of shape (height, width, 3), typically one row
+            of a preallocated batch buffer
+        max_pixels: Reject images larger than this many pixels
+    """
+    img = load_image(image_file, (out.shape[1], out.shape[0]), max_pixels)
+    # Scale uint8 pixels to [0, 1] straight into the destination buffer
+    np.divide(np.asarray(img), np.float32(255.0), out=out, casting="unsafe")
+
+
+def preprocess_image(image_file: BinaryIO, max_pixels: Optional[int] = None) -> np.ndarray:
+    """Decode one image into a new (1, 180, 180, 3) float32 batch."""
+    batch = np.empty((1, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    preprocess_into(image_file, batch[0], max_pixels)
+    return batch
+
+
+def preprocess_image_reference(image_file: BinaryIO) -> np.ndarray:
+    """
+    Full-resolution decode and resize, as the service originally did it.
+
+    Kept as the baseline for parity checks against ``preprocess_image``.
+    """
+    try:
+        img = Image.open(image_file).convert("RGB").resize(IMAGE_SIZE)
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+    return (np.asarray(img, dtype=np.float32) / 255.0)[np.newaxis]
+
+
+def _crop_indices(length: int, fraction: float) -> np.ndarray:
+    # Source positions of a centred crop of `fraction` stretched back to `length`
+    start = length * (1 - fraction) / 2
+    positions = start + (np.arange(length) + 0.5) * fraction - 0.5
+    return np.clip(np.round(positions), 0, length - 1).astype(np.intp)
+
+
+def tta_views(image: np.ndarray, crop_fraction: float = 0.875) -> np.ndarray:
+    """
+    Test-time augmentation views of one preprocessed image, as one batch.
+
+    Returns (4, height, width, 3): the image, its mirror image, a centre
+    crop of ``crop_fraction`` scaled back to full size, and that crop
+    mirrored. Built with array indexing only, no re-decode or re-resize.
+    """
+    height, width = image.shape[:2]
+    views = np.empty((4,) + image.shape, dtype=image.dtype)
+    views[0] = image
+    views[1] = image[:, ::-1]
+    rows = _crop_indices(height, crop_fraction)
+    cols = _crop_indices(width, crop_fraction)
+    views[2] = image[rows[:, np.newaxis], cols]
+    views[3] = views[2][:, ::-1]
+    return views
@@ -0,0 +1,156 @@
+"""
+Model runtimes for the disease classifier.
+
+The service can serve the original Keras .h5 model or an exported
+TFLite/ONNX copy (see export_model.py). The lightweight runtimes avoid
+importing TensorFlow at all when their interpreter packages are installed:
+``ai-edge-litert`` or ``tflite-runtime`` for .tflite files and
+``onnxruntime`` for .onnx files. All of them expose the same small
+interface: ``input_shape`` and ``predict(batch) -> probabilities``.
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+# Label encoding used in training:
+# 0 -> Coccidiosis, 1 -> Healthy, 2 -> New Castle Disease, 3 -> Salmonella
+CLASS_NAMES = ["cocci", "healthy", "ncd", "salmo"]
+
+RUNTIMES = ("keras", "tflite", "onnx")
+
+DEFAULT_MODEL_PATH = "models/bigDatasetWithDinaNCD_10E.h5"
+
+# Runtimes whose loaded model can be shared with workers forked afterwards;
+# TensorFlow does not support use from a child forked after it initialised
+FORK_SAFE_RUNTIMES = ("tflite", "onnx")
+
+
+class KerasClassifier:
+    """Full TensorFlow/Keras runtime for .h5 and .keras models."""
+
+    def __init__(self, path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        # TensorFlow's thread pools must be sized before the model is loaded;
+        # 0 leaves the choice to TensorFlow (one thread per core).
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        self._model = load_model(path)
+        self.input_shape = tuple(self._model.input_shape)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # predict_on_batch skips the per-call tf.data setup that model.predict does
+        return np.asarray(self._model.predict_on_batch(batch))
+
+
+def _tflite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """TFLite interpreter runtime, including int8-quantized models."""
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        interpreter_class = _tflite_interpreter_class()
+        self._interpreter = interpreter_class(model_path=path, num_threads=intra_op_threads or None)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input["shape"][1:])
+        self._batch_size = int(self._input["shape"][0])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Not thread-safe: the service only calls this from its single inference thread
+        if len(batch) != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input["index"], [len(batch), *self.input_shape[1:]])
+            self._interpreter.allocate_tensors()
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch_size = len(batch)
+
+        self._interpreter.set_tensor(self._input["index"], _quantize(batch, self._input))
+        self._interpreter.invoke()
+        return _dequantize(self._interpreter.get_tensor(self._output["index"]), self._output)
+
+
+def _quantize(values: np.ndarray, details: dict) -> np.ndarray:
+    dtype = details["dtype"]
+    if dtype == np.float32:
+        return values
+    scale, zero_point = details["quantization"]
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(values: np.ndarray, details: dict) -> np.ndarray:
+    if details["dtype"] == np.float32:
+        return values
+    scale, zero_point = details["quantization"]
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+class OnnxClassifier:
+    """ONNX Runtime (CPU) runtime."""
+
+    def __init__(self, path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self._session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.input_shape = (None,) + tuple(model_input.shape[1:])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {self._input_name: batch})[0]
+
+
+def infer_runtime(path: str) -> str:
+    """Pick a runtime from the model file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".tflite":
+        return "tflite"
+    if extension == ".onnx":
+        return "onnx"
+    return "keras"
+
+
+def load_classifier(
+    path: str,
+    runtime: Optional[str] = None,
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+):
+    """
+    Load a classifier with the requested runtime.
+
+    Args:
+        path: Model file (.h5/.keras, .tflite or .onnx)
+        runtime: One of RUNTIMES; inferred from the extension when omitted
+        intra_op_threads: Threads used inside one operator (0 = runtime default)
+        inter_op_threads: Threads used across independent operators (0 = runtime default)
+
+    Returns:
+        Classifier with ``input_shape`` and ``predict(batch)``
+    """
+    runtime = runtime or infer_runtime(path)
+    if runtime == "keras":
+        return KerasClassifier(path, intra_op_threads, inter_op_threads)
+    if runtime == "tflite":
+        return TFLiteClassifier(path, intra_op_threads)
+    if runtime == "onnx":
+        return OnnxClassifier(path, intra_op_threads, inter_op_threads)
+    raise ValueError(f"Unknown model runtime {runtime!r}, expected one of {', '.join(RUNTIMES)}")
@@ -0,0 +1,96 @@
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Leading bytes of the formats the classifier accepts
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+}
+
+
+def sniff_image_type(upload: BinaryIO) -> Optional[str]:
+    """Content type from the file's magic bytes, or None if it is not a JPEG or PNG."""
+    head = upload.read(8)
+    upload.seek(0)
+    for signature, content_type in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def upload_size(upload: BinaryIO) -> int:
+    upload.seek(0, 2)
+    size = upload.tell()
+    upload.seek(0)
+    return size
+
+
+class UploadStats:
+    """Request body bytes currently held by in-flight requests, and the peak seen."""
+
+    def __init__(self):
+        self.inflight_bytes = 0
+        self.peak_inflight_bytes = 0
+        self.rejected_requests = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "inflight_bytes": self.inflight_bytes,
+            "peak_inflight_bytes": self.peak_inflight_bytes,
+            "rejected_requests": self.rejected_requests,
+        }
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that caps request bodies at ``max_body_bytes``.
+
+    A declared Content-Length over the limit is rejected with 413 before
+    any of the body is read; otherwise the body is counted as it streams in
+    and the request fails with 413 as soon as the limit is crossed, so an
+    oversized upload is never buffered in full.
+    """
+
+    def __init__(self, app, max_body_bytes: int, stats: UploadStats):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_body_bytes:
+            self.stats.rejected_requests += 1
+            await self._too_large()(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                size = len(message.get("body", b""))
+                received += size
+                self.stats.inflight_bytes += size
+                self.stats.peak_inflight_bytes = max(self.stats.peak_inflight_bytes, self.stats.inflight_bytes)
+                if received > self.max_body_bytes:
+                    self.stats.rejected_requests += 1
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            self.stats.inflight_bytes -= received
+
+    def _detail(self) -> str:
+        return f"Request body exceeds {self.max_body_bytes} bytes"
+
+    def _too_large(self) -> JSONResponse:
+        return JSONResponse(status_code=413, content={"detail": self._detail()})
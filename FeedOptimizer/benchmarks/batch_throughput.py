@@ -0,0 +1,107 @@
+"""
+Throughput of solving many formulas: sequentially in one process, as
+concurrent POST /optimize calls, and as one POST /optimize/batch.
+
+The app runs in-process behind httpx's ASGI transport, with its solver
+pool started by the lifespan. Requests are a seeded mix of layer and
+broiler formulas (see synthetic.py). Run from the FeedOptimizer directory:
+
+    python benchmarks/batch_throughput.py --count 1000
+    OPTIMIZER_WORKERS=4 python benchmarks/batch_throughput.py
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import request_mix  # noqa: E402
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    # CBC writes its log to the inherited stdout of every solve
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def sequential(requests) -> dict:
+    from optimizer.optimizer import generate_feed_formula
+
+    start = time.perf_counter()
+    succeeded = sum(generate_feed_formula(request).optimization_success for request in requests)
+    return {"seconds": time.perf_counter() - start, "succeeded": succeeded}
+
+
+async def over_http(requests, concurrency: int) -> dict:
+    import main
+
+    # Every mode solves the same requests: measure solving, not the solution cache
+    main.FEED_CACHE_ENTRIES = 0
+    payloads = [request.model_dump(mode="json") for request in requests]
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            # Start every worker before timing
+            await client.post("/optimize/batch", json=payloads[: main.OPTIMIZER_WORKERS * main.CHUNKS_PER_WORKER])
+
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def post_one(payload):
+                async with semaphore:
+                    response = await client.post("/optimize", json=payload)
+                return response.status_code == 200 and response.json()["optimization_success"]
+
+            start = time.perf_counter()
+            succeeded = sum(await asyncio.gather(*(post_one(payload) for payload in payloads)))
+            results["single"] = {"seconds": time.perf_counter() - start, "succeeded": succeeded}
+
+            start = time.perf_counter()
+            response = await client.post("/optimize/batch", json=payloads)
+            response.raise_for_status()
+            body = response.json()
+            succeeded = sum(item["success"] and item["result"]["optimization_success"] for item in body["results"])
+            results["batch"] = {"seconds": time.perf_counter() - start, "succeeded": succeeded}
+            results["workers"] = main.OPTIMIZER_WORKERS
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64, help="In-flight /optimize calls")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    requests = list(request_mix(args.count, args.seed))
+    with quiet_stdout():
+        results = {"sequential": sequential(requests)}
+        results.update(asyncio.run(over_http(requests, args.concurrency)))
+
+    report = {"count": args.count, "workers": results.pop("workers")}
+    for mode, result in results.items():
+        report[mode] = {
+            "seconds": round(result["seconds"], 2),
+            "formulas_per_second": round(args.count / result["seconds"], 1),
+            "succeeded": result["succeeded"],
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
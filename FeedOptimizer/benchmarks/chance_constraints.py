@@ -0,0 +1,121 @@
+"""
+Chance-constrained formulas and their Monte Carlo compliance check.
+
+Gives every synthetic ingredient a lot-to-lot standard deviation of each
+nutrient (--cv, relative to its value) and, for each ingredient count,
+solves the request at each --probabilities with compliance_probability.
+0.5 is the plain least-cost formula, for comparison. Reports per
+probability:
+
+- cost and premium over the least-cost formula
+- solves and cuts the ChanceSolve took, and the whole request's latency
+- compliance_ms: simulate_compliance alone, over --samples lots
+- worst_bound_failure: the largest fraction of samples outside any one
+  bound, which should be close to 1 - probability
+- compliance_rate: fraction of samples meeting every bound at once
+
+Run from the FeedOptimizer directory:
+
+    python benchmarks/chance_constraints.py --sizes 15 50 200
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.matrix import NUTRIENTS, IngredientMatrix  # noqa: E402
+from optimizer.models import BirdType, ProductionStage  # noqa: E402
+from optimizer.optimizer import (  # noqa: E402
+    formulation_program,
+    generate_feed_formula,
+    request_requirements,
+    simulate_compliance,
+)
+from optimizer.solvers import ChanceSolve  # noqa: E402
+
+# Coefficient of variation of each nutrient between lots, in NUTRIENTS order
+DEFAULT_CV = (0.06, 0.03, 0.10, 0.08, 0.10)
+
+
+def median_ms(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def with_variation(request, cv):
+    ingredients = [
+        ingredient.model_copy(update={
+            f"{field}_sd": (getattr(ingredient, field) or 0.0) * spread for (_, field, _), spread in zip(NUTRIENTS, cv)
+        })
+        for ingredient in request.ingredients
+    ]
+    return request.model_copy(update={"ingredients": ingredients})
+
+
+def run(size: int, probabilities, cv, samples: int, rounds: int, solver: str, seed: int) -> dict:
+    base = with_variation(make_request(np.random.default_rng(seed), BirdType.LAYER, ProductionStage.LAYER, size), cv)
+    least_cost = None
+    rows = []
+    for probability in probabilities:
+        request = base.model_copy(update={"compliance_probability": probability, "compliance_samples": samples})
+        response = generate_feed_formula(request, solver)
+        if not response.optimization_success:
+            rows.append({"probability": probability, "message": response.optimization_message})
+            continue
+
+        requirements = request_requirements(request)
+        matrix = IngredientMatrix.from_ingredients(request.ingredients)
+        chance = ChanceSolve(formulation_program(request, requirements, matrix), solver)
+        x = chance.solve().x
+        least_cost = response.total_cost if least_cost is None else least_cost
+        failures = [
+            rate for nutrient in response.compliance.nutrients
+            for rate in (nutrient.below_minimum, nutrient.above_maximum) if rate is not None
+        ]
+        rows.append({
+            "probability": probability,
+            "total_cost": response.total_cost,
+            "premium": round(response.total_cost / least_cost - 1, 4),
+            "solves": chance.solves,
+            "cuts": chance.cuts,
+            "formula_ms": median_ms(lambda: generate_feed_formula(request, solver), rounds),
+            "compliance_ms": median_ms(lambda: simulate_compliance(request, requirements, matrix, x), rounds),
+            "worst_bound_failure": max(failures),
+            "compliance_rate": response.compliance.compliance_rate,
+        })
+    return {"ingredients": size, "samples": samples, "probabilities": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 50, 200])
+    parser.add_argument("--probabilities", type=float, nargs="+", default=[0.5, 0.8, 0.9, 0.95])
+    parser.add_argument("--cv", type=float, nargs=len(NUTRIENTS), default=list(DEFAULT_CV))
+    parser.add_argument("--samples", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--solver", default="highs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = [
+        run(size, args.probabilities, args.cv, args.samples, args.rounds, args.solver, args.seed) for size in args.sizes
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Post-solve extraction time against the number of ingredients.
+
+For each ingredient count, solves one request and then times turning the
+solution into a FormulaResponse: "loop" is the per-ingredient extraction
+generate_feed_formula used to do (reproduced below, models built one by
+one, with a boolean chain for meets_requirements), "vectorized" is
+build_formula_response. Only the time after the solve is measured. Run
+from the FeedOptimizer directory:
+
+    python benchmarks/extraction_profile.py --sizes 15 50 100 200 500
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.matrix import IngredientMatrix, build_linear_program  # noqa: E402
+from optimizer.models import BirdType, FormulaResponse, IngredientResult, NutritionResult, ProductionStage  # noqa: E402
+from optimizer.optimizer import build_formula_response, request_requirements  # noqa: E402
+from optimizer.solvers import get_solver  # noqa: E402
+
+
+def loop_extraction(request, requirements, ingredients, quantities) -> FormulaResponse:
+    """The extraction as it was before it was vectorized"""
+    results = []
+    totals = [0.0] * 6
+    for ingredient, quantity in zip(ingredients, quantities.tolist()):
+        if quantity < 0.001:
+            continue
+        contributions = (
+            quantity * ingredient.protein_percentage / 100,
+            quantity * ingredient.energy_kcal_per_kg,
+            quantity * ingredient.calcium_percentage / 100,
+            quantity * ingredient.phosphorus_percentage / 100,
+            quantity * ingredient.fiber_percentage / 100,
+            quantity * ingredient.price_per_kg,
+        )
+        totals = [total + value for total, value in zip(totals, contributions)]
+        results.append(IngredientResult(
+            name=ingredient.name,
+            quantity_kg=round(quantity, 3),
+            percentage=round(quantity / request.batch_size_kg * 100, 2),
+            cost=round(contributions[5], 2),
+            protein_contribution=round(contributions[0], 3),
+            energy_contribution=round(contributions[1], 0),
+            calcium_contribution=round(contributions[2], 3),
+            phosphorus_contribution=round(contributions[3], 3),
+            fiber_contribution=round(contributions[4], 3),
+        ))
+    batch = request.batch_size_kg
+    protein, energy, calcium, phosphorus, fiber = (
+        totals[0] / batch * 100, totals[1] / batch, totals[2] / batch * 100, totals[3] / batch * 100, totals[4] / batch * 100
+    )
+    meets = (
+        protein >= requirements.min_protein_percentage and
+        (requirements.max_protein_percentage is None or protein <= requirements.max_protein_percentage) and
+        energy >= requirements.min_energy_kcal_per_kg and
+        (requirements.max_energy_kcal_per_kg is None or energy <= requirements.max_energy_kcal_per_kg) and
+        calcium >= requirements.min_calcium_percentage and
+        (requirements.max_calcium_percentage is None or calcium <= requirements.max_calcium_percentage) and
+        phosphorus >= requirements.min_phosphorus_percentage and
+        (requirements.max_phosphorus_percentage is None or phosphorus <= requirements.max_phosphorus_percentage) and
+        (requirements.max_fiber_percentage is None or fiber <= requirements.max_fiber_percentage)
+    )
+    results.sort(key=lambda result: result.quantity_kg, reverse=True)
+    return FormulaResponse(
+        formula_name=f"{request.bird_type.value} {request.production_stage.value} Formula",
+        bird_type=request.bird_type,
+        production_stage=request.production_stage,
+        ingredients=results,
+        nutrition=NutritionResult(
+            protein_percentage=round(protein, 2),
+            energy_kcal_per_kg=round(energy, 0),
+            calcium_percentage=round(calcium, 2),
+            phosphorus_percentage=round(phosphorus, 2),
+            fiber_percentage=round(fiber, 2),
+            meets_requirements=meets,
+        ),
+        total_cost=round(totals[5], 2),
+        cost_per_kg=round(totals[5] / batch, 2),
+        batch_size_kg=batch,
+        optimization_success=True,
+        optimization_message="Optimization completed successfully",
+    )
+
+
+def median_us(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1e6, 1)
+
+
+def run(size: int, rounds: int, seed: int) -> dict:
+    request = make_request(np.random.default_rng(seed), BirdType.BROILER, ProductionStage.GROWER, size)
+    requirements = request_requirements(request)
+    ingredients = [i for i in request.ingredients if i.available]
+    matrix = IngredientMatrix.from_ingredients(ingredients)
+    solution = get_solver().solve(build_linear_program(matrix, requirements, request.batch_size_kg))
+    if not solution.optimal:
+        return {"ingredients": size, "status": solution.status}
+
+    loop = loop_extraction(request, requirements, ingredients, solution.x)
+    vectorized = build_formula_response(request, requirements, matrix, solution.x)
+    return {
+        "ingredients": size,
+        "in_formula": len(vectorized.ingredients),
+        "loop_us": median_us(lambda: loop_extraction(request, requirements, ingredients, solution.x), rounds),
+        "vectorized_us": median_us(lambda: build_formula_response(request, requirements, matrix, solution.x), rounds),
+        "same_total_cost": loop.total_cost == vectorized.total_cost,
+        "meets_requirements": {"loop": loop.nutrition.meets_requirements, "vectorized": vectorized.nutrition.meets_requirements},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 50, 100, 200, 500])
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(json.dumps([run(size, args.rounds, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
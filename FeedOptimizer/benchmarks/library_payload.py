@@ -0,0 +1,127 @@
+"""
+Inline ingredients against a stored ingredient library.
+
+For libraries of 40 to 200 ingredients, compares a FormulaRequest that
+carries every Ingredient with a LibraryFormulaRequest that names the
+library and overrides a few prices:
+
+- payload: request body size in bytes
+- parse: JSON parsing and validation of the body
+- build: LP construction from the request's ingredients
+- http: end-to-end latency of POST /optimize against
+  POST /libraries/{id}/optimize, sequentially, through the app in-process
+
+Run from the FeedOptimizer directory:
+
+    python benchmarks/library_payload.py --sizes 40 100 200 --rounds 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.library import IngredientLibrary  # noqa: E402
+from optimizer.matrix import IngredientMatrix, build_linear_program  # noqa: E402
+from optimizer.models import BirdType, FormulaRequest, LibraryFormulaRequest, ProductionStage  # noqa: E402
+from optimizer.optimizer import request_requirements  # noqa: E402
+
+# Prices a farm typically updates between formulations
+OVERRIDDEN = ("maize", "soybean_meal", "fish_meal", "wheat_bran", "sorghum")
+
+
+def median_us(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1e6, 1)
+
+
+def bodies(size: int, seed: int):
+    request = make_request(np.random.default_rng(seed), BirdType.LAYER, ProductionStage.LAYER, size)
+    prices = {ingredient.name: ingredient.price_per_kg * 1.02 for ingredient in request.ingredients if ingredient.name in OVERRIDDEN}
+    ingredients = [
+        ingredient.model_copy(update={"price_per_kg": prices.get(ingredient.name, ingredient.price_per_kg)})
+        for ingredient in request.ingredients
+    ]
+    inline = request.model_copy(update={"ingredients": ingredients}).model_dump_json()
+    library_request = LibraryFormulaRequest(**request.model_dump(exclude={"ingredients"}), prices=prices)
+    return request, inline, library_request.model_dump_json(exclude_defaults=True)
+
+
+async def over_http(request, inline: str, by_library: str, rounds: int) -> dict:
+    import main
+
+    headers = {"content-type": "application/json"}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            response = await client.post("/libraries", json=[i.model_dump(mode="json") for i in request.ingredients])
+            library_url = f"/libraries/{response.json()['library_id']}/optimize"
+
+            results = {}
+            for mode, url, body in (("inline", "/optimize", inline), ("library", library_url, by_library)):
+                await client.post(url, content=body, headers=headers)  # start the worker
+                samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    response = await client.post(url, content=body, headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                results[mode] = round(statistics.median(samples) * 1000, 3)
+    return results
+
+
+def run(size: int, rounds: int, seed: int) -> dict:
+    request, inline, by_library = bodies(size, seed)
+    library = IngredientLibrary.from_ingredients(request.ingredients)
+    parsed_inline = FormulaRequest.model_validate_json(inline)
+    parsed_library = LibraryFormulaRequest.model_validate_json(by_library)
+    requirements = request_requirements(parsed_inline)
+
+    def build_inline():
+        available = [i for i in parsed_inline.ingredients if i.available]
+        build_linear_program(IngredientMatrix.from_ingredients(available), requirements, parsed_inline.batch_size_kg)
+
+    def build_library():
+        columns, prices = library.columns(parsed_library)
+        build_linear_program(library.matrix.take(columns, prices), requirements, parsed_library.batch_size_kg)
+
+    http = asyncio.run(over_http(request, inline, by_library, rounds))
+    return {
+        "ingredients": size,
+        "payload_bytes": {"inline": len(inline), "library": len(by_library)},
+        "parse_us": {
+            "inline": median_us(lambda: FormulaRequest.model_validate_json(inline), rounds),
+            "library": median_us(lambda: LibraryFormulaRequest.model_validate_json(by_library), rounds),
+        },
+        "build_us": {"inline": median_us(build_inline, rounds), "library": median_us(build_library, rounds)},
+        "http_median_ms": http,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40, 100, 200])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(json.dumps([run(size, args.rounds, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
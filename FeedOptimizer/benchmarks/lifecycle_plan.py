@@ -0,0 +1,136 @@
+"""
+Lifecycle planning for a large flock: one combined LP against solving each
+period on its own.
+
+The plan covers a layer flock from day 1 through a 72-week cycle with
+soybean meal, groundnut cake and limestone in limited stock. "combined" is
+plan_lifecycle(), which shares the stock across all periods in one LP;
+"sequential" solves the periods in order, each taking what stock is
+left, as separate /optimize calls would. Streaming time covers turning
+the plan into NDJSON lines. Run from the FeedOptimizer directory:
+
+    python benchmarks/lifecycle_plan.py --flock 100000 --period-days 7 1
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_ingredients  # noqa: E402
+
+from optimizer.matrix import IngredientMatrix, build_linear_program  # noqa: E402
+from optimizer.models import BirdType, InventoryIngredient, LifecyclePlanRequest  # noqa: E402
+from optimizer.planner import build_lifecycle_program, plan_lifecycle, plan_lines, plan_periods  # noqa: E402
+from optimizer.solvers import get_solver  # noqa: E402
+
+# Share of the plan's total feed each stocked ingredient could cover
+STOCK_SHARE = {"soybean_meal": 0.05, "groundnut_cake": 0.03, "limestone": 0.03}
+
+
+def make_plan_request(flock: int, days: int, period_days: int, ingredient_count: int, seed: int) -> LifecyclePlanRequest:
+    request = LifecyclePlanRequest(
+        bird_type=BirdType.LAYER,
+        flock_size=flock,
+        start_age_days=1,
+        end_age_days=days,
+        period_days=period_days,
+        ingredients=[],
+    )
+    total_feed_kg = sum(period.feed_kg for period in plan_periods(request))
+    ingredients = [
+        InventoryIngredient(**ingredient.model_dump(), stock_kg=(
+            total_feed_kg * STOCK_SHARE[ingredient.name] if ingredient.name in STOCK_SHARE else None
+        ))
+        for ingredient in make_ingredients(np.random.default_rng(seed), ingredient_count)
+    ]
+    return request.model_copy(update={"ingredients": ingredients})
+
+
+def sequential_cost(request: LifecyclePlanRequest):
+    """Total cost solving period by period, each using up stock first come first served"""
+    solver = get_solver()
+    matrix = IngredientMatrix.from_ingredients(request.ingredients)
+    remaining = np.array([np.inf if i.stock_kg is None else i.stock_kg for i in request.ingredients])
+    total = 0.0
+    for period in plan_periods(request):
+        program = build_linear_program(matrix, period.requirements, period.feed_kg)
+        program.col_upper = np.minimum(program.col_upper, remaining)
+        program.col_lower = np.minimum(program.col_lower, program.col_upper)
+        solution = solver.solve(program)
+        if not solution.optimal:
+            return None, period.period
+        remaining = np.maximum(remaining - solution.x, 0.0)
+        total += solution.objective
+    return total, None
+
+
+def run(flock: int, days: int, period_days: int, ingredient_count: int, seed: int) -> dict:
+    request = make_plan_request(flock, days, period_days, ingredient_count, seed)
+
+    start = time.perf_counter()
+    program = build_lifecycle_program(plan_periods(request), request.ingredients)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plan = plan_lifecycle(request)
+    plan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lines = size = 0
+    for line in plan_lines(plan):
+        lines += 1
+        size += len(line)
+    stream_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sequential, failed_period = sequential_cost(request)
+    sequential_seconds = time.perf_counter() - start
+
+    return {
+        "flock": flock,
+        "days": days,
+        "period_days": period_days,
+        "ingredients": ingredient_count,
+        "periods": len(plan.periods),
+        "columns": program.num_cols,
+        "rows": program.num_rows,
+        "nonzeros": int(len(program.value)),
+        "build_seconds": round(build_seconds, 3),
+        "plan_seconds": round(plan_seconds, 3),
+        "stream_seconds": round(stream_seconds, 3),
+        "lines": lines,
+        "ndjson_mb": round(size / 1e6, 2),
+        "combined_cost": round(plan.total_cost, 2) if plan.success else plan.message,
+        "sequential_cost": round(sequential, 2) if sequential is not None else f"infeasible at period {failed_period}",
+        "sequential_seconds": round(sequential_seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flock", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=504, help="72 weeks")
+    parser.add_argument("--period-days", type=int, nargs="+", default=[7, 1])
+    parser.add_argument("--ingredients", type=int, nargs="+", default=[15, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = [
+        run(args.flock, args.days, period_days, ingredient_count, args.seed)
+        for period_days in args.period_days
+        for ingredient_count in args.ingredients
+    ]
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"results": results, "peak_rss_mb": round(peak_rss_mb, 1)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
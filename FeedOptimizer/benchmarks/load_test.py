@@ -0,0 +1,202 @@
+"""
+Load test of POST /optimize at increasing concurrency, with baselines.
+
+The app runs in-process behind httpx's ASGI transport, with its solver
+pool started by the lifespan and the solution cache off, so every request
+is solved. Requests come from synthetic.load_mix: every BirdType and
+ProductionStage pair, 5 to 200 ingredients. At each --concurrency level,
+that many clients send --requests requests between them, each client
+waiting for its response before sending the next. Reported per level:
+
+- throughput: completed requests per second
+- p50_ms / p95_ms / p99_ms: request latency as a client sees it
+- peak_rss_mb: largest resident memory of the API process and its solver
+  workers together, sampled every few milliseconds during the level
+- statuses: HTTP status codes, and how many formulas were optimal
+
+--save writes the report as a baseline; --baseline compares against one
+and exits with status 1 when any level's throughput fell, or its p95 or
+peak RSS rose, by more than --tolerance. Baselines record the machine
+they were taken on: compare on the same one. Run from the FeedOptimizer
+directory:
+
+    python benchmarks/load_test.py --save benchmarks/baselines/load_test.json
+    python benchmarks/load_test.py --baseline benchmarks/baselines/load_test.json
+    OPTIMIZER_WORKERS=4 python benchmarks/load_test.py --concurrency 1 4 16
+
+The service runs instrumented unless FEED_METRICS=false is set (the
+baseline records which), so its timings include the instrumentation.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import load_mix  # noqa: E402
+
+from batch_throughput import quiet_stdout  # noqa: E402
+
+# (metric, direction): a regression is the metric moving against direction
+COMPARED_METRICS = (("throughput", 1), ("p95_ms", -1), ("peak_rss_mb", -1))
+
+
+def process_tree_rss_bytes(pid: int) -> int:
+    """Resident memory of a process and all its descendants, from /proc"""
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as statm:
+                total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            with open(f"/proc/{pid}/task/{pid}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            # Exited between listing and reading
+            continue
+    return total
+
+
+class PeakRss:
+    """Samples the process tree's RSS in a thread while in use, keeping the peak"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        pid = os.getpid()
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss_bytes(pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def drive(client: httpx.AsyncClient, payloads, concurrency: int) -> dict:
+    queue = collections.deque(payloads)
+    latencies = []
+    statuses = collections.Counter()
+
+    async def user():
+        while queue:
+            payload = queue.popleft()
+            start = time.perf_counter()
+            response = await client.post("/optimize", json=payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200 and response.json()["optimization_success"]:
+                statuses["optimal"] += 1
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "statuses": dict(statuses),
+    }
+
+
+async def run(args) -> dict:
+    import main
+
+    # Measure solving, not the solution cache
+    main.FEED_CACHE_ENTRIES = 0
+    payloads = [request.model_dump(mode="json") for request in load_mix(args.requests, args.seed)]
+    levels = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            # Start every worker before timing
+            await client.post("/optimize/batch", json=payloads[: main.OPTIMIZER_WORKERS * main.CHUNKS_PER_WORKER])
+            for concurrency in args.concurrency:
+                levels.append(await drive(client, payloads, concurrency))
+    return {
+        "benchmark": "FeedOptimizer POST /optimize",
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {
+            "requests": args.requests, "seed": args.seed, "workers": main.OPTIMIZER_WORKERS, "metrics": main.FEED_METRICS,
+        },
+        "levels": levels,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of report against baseline, as messages"""
+    regressions = []
+    if report["settings"] != baseline["settings"] or report["machine"] != baseline["machine"]:
+        print("warning: baseline was taken with other settings or on another machine", file=sys.stderr)
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        for metric, direction in COMPARED_METRICS:
+            change = (level[metric] - before[metric]) / before[metric]
+            if change * direction < -tolerance:
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {metric} {before[metric]} -> {level[metric]} ({change:+.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=280, help="Requests at each concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the report to this baseline file")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with quiet_stdout():
+        report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
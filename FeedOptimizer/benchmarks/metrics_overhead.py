@@ -0,0 +1,80 @@
+"""
+Cost of the stage timings and metrics of optimizer.metrics.
+
+Solves the same synthetic.request_mix requests (every bird type, 5 to 200
+ingredients) with solve_feed_formula as a solver worker does, alternately:
+
+- off: no Profile is current, as with FEED_METRICS=false (stage() is a
+  no-op)
+- on: under profiled(), as the API sends work to its workers, and with
+  the Profile added to the metrics with observe()
+
+and reports the median per-request time of each and the difference,
+plus how long /metrics takes to render afterwards. For the end-to-end
+cost through the API (middleware, route timing, profiles returned from
+the workers), compare benchmarks/batch_throughput.py with FEED_METRICS=false.
+Run from the FeedOptimizer directory:
+
+    python benchmarks/metrics_overhead.py --requests 2000
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import request_mix  # noqa: E402
+
+from optimizer.metrics import observe, profiled, render_metrics  # noqa: E402
+from optimizer.models import BirdType  # noqa: E402
+from optimizer.optimizer import solve_feed_formula  # noqa: E402
+
+# Ingredient counts the requests cycle through
+INGREDIENT_COUNTS = (5, 15, 50, 100, 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    requests = list(request_mix(args.requests, args.seed, tuple(BirdType), INGREDIENT_COUNTS))
+    for request in requests[:50]:
+        solve_feed_formula(request)
+
+    off, on = [], []
+    for request in requests:
+        # Alternate so both see the same requests and the same machine state
+        start = time.perf_counter()
+        solve_feed_formula(request)
+        off.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        _, profile = profiled(solve_feed_formula, request)
+        observe(profile)
+        on.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    text = render_metrics()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    off_ms, on_ms = statistics.median(off) * 1000, statistics.median(on) * 1000
+    print(json.dumps({
+        "requests": args.requests,
+        "off_ms": round(off_ms, 4),
+        "on_ms": round(on_ms, 4),
+        "overhead_us": round((on_ms - off_ms) * 1000, 1),
+        "overhead": round(on_ms / off_ms - 1, 4),
+        "render_ms": round(render_ms, 3),
+        "metrics_lines": text.count("\n"),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+MIP solve time against ingredient count, for sizing time_limit_seconds.
+
+For each ingredient count and each --settings case (an ingredient limit,
+a bag size, or both), solves --seeds synthetic broiler starter requests
+as MIPs, for a --batch-kg batch. Minor ingredients (at most 10% of the
+batch: minerals, oil, some meals) are weighed, everything else comes in
+bags. Reports per size and case:
+
+- lp_ms: median latency of the same requests as plain LPs
+- solve_seconds: p50 / p95 / max of the MIP solve (MipReport)
+- statuses: how the solves ended (Optimal, Solution Found, ...)
+- max_gap: largest relative gap left by a solve that hit the limit
+- premium: median cost over the LP formula, what the rules cost
+
+Run from the FeedOptimizer directory:
+
+    python benchmarks/mip_solve_time.py --sizes 10 25 50 100 200
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.models import BirdType, ProductionStage  # noqa: E402
+from optimizer.optimizer import generate_feed_formula  # noqa: E402
+
+# Integer settings tried at each size, as "max_ingredients:bag_size_kg"
+# with an empty side left unset
+DEFAULT_SETTINGS = ["6:", ":25", "6:25"]
+
+
+def parse_setting(setting: str) -> dict:
+    limit, bag = setting.split(":")
+    update = {}
+    if limit:
+        update["max_ingredients"] = int(limit)
+    if bag:
+        update["bag_size_kg"] = float(bag)
+    return update
+
+
+def weigh_minor_ingredients(request):
+    ingredients = [
+        ingredient.model_copy(update={"bag_size_kg": 0.0})
+        if ingredient.max_inclusion_percentage is not None and ingredient.max_inclusion_percentage <= 10 else ingredient
+        for ingredient in request.ingredients
+    ]
+    return request.model_copy(update={"ingredients": ingredients})
+
+
+def percentile(values, q: float) -> float:
+    return round(float(np.percentile(values, q)), 3)
+
+
+def run(size: int, settings, seeds: int, batch_kg: float, time_limit: float, mip_gap: float, solver: str) -> dict:
+    requests = [
+        weigh_minor_ingredients(make_request(np.random.default_rng(seed), BirdType.BROILER, ProductionStage.STARTER, size))
+        .model_copy(update={"batch_size_kg": batch_kg})
+        for seed in range(seeds)
+    ]
+    lp_ms, lp_costs = [], []
+    for request in requests:
+        start = time.perf_counter()
+        response = generate_feed_formula(request, solver)
+        lp_ms.append(time.perf_counter() - start)
+        lp_costs.append(response.total_cost if response.optimization_success else None)
+
+    cases = []
+    for setting in settings:
+        seconds, premiums, gaps, statuses = [], [], [], Counter()
+        for request, lp_cost in zip(requests, lp_costs):
+            update = dict(parse_setting(setting), time_limit_seconds=time_limit, mip_gap=mip_gap)
+            response = generate_feed_formula(request.model_copy(update=update), solver)
+            if response.mip is None:
+                statuses[response.optimization_message] += 1
+                continue
+            statuses[response.mip.status] += 1
+            seconds.append(response.mip.solve_seconds)
+            if response.mip.gap is not None and response.mip.status != "Optimal":
+                gaps.append(response.mip.gap)
+            if response.optimization_success and lp_cost:
+                premiums.append(response.total_cost / lp_cost - 1)
+        cases.append({
+            "setting": parse_setting(setting),
+            "solve_seconds": [percentile(seconds, 50), percentile(seconds, 95), round(max(seconds), 3)] if seconds else None,
+            "statuses": dict(statuses),
+            "max_gap": round(max(gaps), 4) if gaps else None,
+            "premium": round(statistics.median(premiums), 4) if premiums else None,
+        })
+    return {"ingredients": size, "lp_ms": round(statistics.median(lp_ms) * 1000, 3), "cases": cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--settings", nargs="+", default=DEFAULT_SETTINGS)
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--batch-kg", type=float, default=1000.0)
+    parser.add_argument("--time-limit", type=float, default=10.0)
+    parser.add_argument("--mip-gap", type=float, default=1e-4)
+    parser.add_argument("--solver", default="highs")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = [
+        run(size, args.settings, args.seeds, args.batch_kg, args.time_limit, args.mip_gap, args.solver) for size in args.sizes
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cost/nutrition frontier from one model against one solve per point.
+
+For each ingredient count, builds a --points frontier with
+generate_feed_frontier (one model, warm-started epsilon-constraint sweep)
+and compares it with:
+
+- least_cost: one plain least-cost formula (generate_feed_formula)
+- independent: one generate_feed_formula call per frontier priority, as
+  a client sweeping cost_optimization_priority would make them
+
+"frontier_in_solves" is the frontier time in least-cost formulas; the
+frontier also builds one response per point. "sweep_in_solves" only
+counts the LP work: the PrioritySweep over the priorities (model load
+included) in cold solves of the least-cost LP. Costs of the independent
+formulas are checked against the frontier's. Run from the
+FeedOptimizer directory:
+
+    python benchmarks/priority_frontier.py --sizes 15 50 200 --points 20
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.matrix import IngredientMatrix, build_linear_program, build_priority_program  # noqa: E402
+from optimizer.models import BirdType, FrontierRequest, ProductionStage  # noqa: E402
+from optimizer.optimizer import generate_feed_formula, generate_feed_frontier, request_requirements  # noqa: E402
+from optimizer.solvers import PrioritySweep, get_solver  # noqa: E402
+
+
+def median_ms(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def run(size: int, points: int, rounds: int, solver: str, seed: int) -> dict:
+    request = make_request(np.random.default_rng(seed), BirdType.LAYER, ProductionStage.LAYER, size)
+    frontier_request = FrontierRequest(**request.model_dump(), points=points)
+    frontier = generate_feed_frontier(frontier_request, solver)
+    priorities = [point.cost_optimization_priority for point in frontier.points]
+
+    def independent():
+        return [
+            generate_feed_formula(request.model_copy(update={"cost_optimization_priority": priority}), solver)
+            for priority in priorities
+        ]
+
+    same_costs = all(
+        abs(formula.total_cost - point.total_cost) <= 0.011 for formula, point in zip(independent(), frontier.points)
+    )
+    least_cost_ms = median_ms(lambda: generate_feed_formula(request, solver), rounds)
+    frontier_ms = median_ms(lambda: generate_feed_frontier(frontier_request, solver), rounds)
+
+    program = build_linear_program(
+        IngredientMatrix.from_ingredients(request.ingredients), request_requirements(request), request.batch_size_kg
+    )
+    priority_program = build_priority_program(program)
+    cold_solve_ms = median_ms(lambda: get_solver(solver).solve(program), rounds)
+    sweep_ms = median_ms(lambda: PrioritySweep(priority_program, solver).solve(priorities), rounds)
+    return {
+        "ingredients": size,
+        "points": points,
+        "cost_range": [frontier.points[0].total_cost, frontier.points[-1].total_cost],
+        "deviation_range": [frontier.points[0].nutrition_deviation, frontier.points[-1].nutrition_deviation],
+        "solves": frontier.solves,
+        "simplex_iterations": frontier.simplex_iterations,
+        "least_cost_ms": least_cost_ms,
+        "frontier_ms": frontier_ms,
+        "independent_ms": median_ms(independent, max(rounds // points, 1)),
+        "frontier_in_solves": round(frontier_ms / least_cost_ms, 2),
+        "cold_solve_ms": cold_solve_ms,
+        "sweep_ms": sweep_ms,
+        "sweep_in_solves": round(sweep_ms / cold_solve_ms, 2),
+        "same_costs": same_costs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 50, 200])
+    parser.add_argument("--points", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--solver", default="highs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(json.dumps([run(size, args.points, args.rounds, args.solver, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
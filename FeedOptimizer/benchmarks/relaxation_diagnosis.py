@@ -0,0 +1,142 @@
+"""
+Infeasible requests: trial and error against one request with allow_relaxation.
+
+Each request is made infeasible the way farms run into it, by going
+without a group of ingredients (mineral sources, or protein meals). The
+"manual" client does what users do after an empty failure response: it
+loosens every requirement by another 10% of the original (minimums down,
+maximums up) and posts again, up to --max-attempts times. The "relaxed"
+client posts the request once with allow_relaxation. Both go through
+/optimize in-process (httpx's ASGI transport). Reports round trips and
+latency per request, how many manual clients gave up, and how far and
+how many requirements each approach relaxed. Run from the FeedOptimizer
+directory:
+
+    python benchmarks/relaxation_diagnosis.py --count 100
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import request_mix  # noqa: E402
+
+from optimizer.optimizer import generate_feed_formula, request_requirements  # noqa: E402
+
+# Ingredient groups a farm can run out of
+SHORTAGES = {
+    "minerals": lambda ingredient: (ingredient.calcium_percentage or 0) >= 5,
+    "protein meals": lambda ingredient: ingredient.protein_percentage >= 25,
+}
+
+
+def infeasible_requests(count: int, seed: int):
+    requests = []
+    for index, request in enumerate(request_mix(count * 4, seed)):
+        shortage = list(SHORTAGES.values())[index % len(SHORTAGES)]
+        request = request.model_copy(update={
+            "ingredients": [ingredient for ingredient in request.ingredients if not shortage(ingredient)]
+        })
+        if not generate_feed_formula(request).optimization_success:
+            requests.append(request)
+        if len(requests) == count:
+            break
+    return requests
+
+
+def loosened(request, step: float):
+    """The request with every requirement loosened by step, relative to the original"""
+    requirements = request_requirements(request).model_dump()
+    for field, value in requirements.items():
+        if value:
+            requirements[field] = value * (1 - step) if field.startswith("min") else value * (1 + step)
+    return request.model_copy(update={"custom_requirements": requirements})
+
+
+def relative_relaxation(original: dict, used: dict) -> float:
+    """Largest relative change of any requirement"""
+    return max(abs(used[field] - value) / value for field, value in original.items() if value)
+
+
+async def run(requests, max_attempts: int) -> dict:
+    import main
+
+    main.FEED_CACHE_ENTRIES = 0
+    manual_trips, manual_ms, manual_relaxation, manual_changed, gave_up = [], [], [], [], 0
+    relaxed_ms, relaxed_relaxation, relaxed_changed = [], [], []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            await client.get("/")
+            for request in requests:
+                original = request_requirements(request).model_dump()
+
+                start = time.perf_counter()
+                for attempt in range(max_attempts + 1):
+                    attempt_request = loosened(request, 0.1 * attempt) if attempt else request
+                    body = json.loads(attempt_request.model_dump_json())
+                    result = (await client.post("/optimize", json=body)).json()
+                    if result["optimization_success"]:
+                        break
+                manual_ms.append((time.perf_counter() - start) * 1000)
+                manual_trips.append(attempt + 1)
+                if result["optimization_success"]:
+                    manual_relaxation.append(0.1 * attempt)
+                    manual_changed.append(sum(1 for value in original.values() if value) if attempt else 0)
+                else:
+                    gave_up += 1
+
+                body = json.loads(request.model_copy(update={"allow_relaxation": True}).model_dump_json())
+                start = time.perf_counter()
+                result = (await client.post("/optimize", json=body)).json()
+                relaxed_ms.append((time.perf_counter() - start) * 1000)
+                # The relaxed requirements, taken as the relaxed-to bounds
+                relaxed = dict(original)
+                for item in result["relaxations"]:
+                    if item["bound"] in ("min", "max"):
+                        field = next(f for f in original if f.startswith(item["bound"]) and item["constraint"] in f)
+                        relaxed[field] = item["relaxed_to"]
+                relaxed_relaxation.append(relative_relaxation(original, relaxed))
+                relaxed_changed.append(len(result["relaxations"]))
+
+    return {
+        "requests": len(requests),
+        "manual": {
+            "mean_round_trips": round(statistics.mean(manual_trips), 2),
+            "median_ms": round(statistics.median(manual_ms), 2),
+            "gave_up": gave_up,
+            "median_relative_relaxation": round(statistics.median(manual_relaxation), 3) if manual_relaxation else None,
+            "mean_requirements_relaxed": round(statistics.mean(manual_changed), 2) if manual_changed else None,
+        },
+        "relaxed": {
+            "round_trips": 1,
+            "median_ms": round(statistics.median(relaxed_ms), 2),
+            "gave_up": 0,
+            "median_relative_relaxation": round(statistics.median(relaxed_relaxation), 3),
+            "mean_requirements_relaxed": round(statistics.mean(relaxed_changed), 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--max-attempts", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    requests = infeasible_requests(args.count, args.seed)
+    print(json.dumps(asyncio.run(run(requests, args.max_attempts)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Per-request cost of resolving nutritional requirements.
+
+Times get_default_requirements over every bird type, production stage,
+target and a spread of ages, once with the resolved requirements cached
+and once resolving every call from the base table (the cache bypassed).
+Run from the FeedOptimizer directory:
+
+    python benchmarks/requirements_resolution.py
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimizer.models import BirdType, ProductionStage, TargetNutrition  # noqa: E402
+from optimizer import utils  # noqa: E402
+
+AGES = (7, 28, 42, 200, 400, 600)
+
+
+def time_per_call(calls, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in calls:
+            utils.get_default_requirements(*args)
+    return (time.perf_counter() - start) / (repeat * len(calls)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # Log lines (including the warning for combinations without defaults)
+    # would dominate the timings
+    logging.disable(logging.WARNING)
+    calls = [
+        (bird_type, age, stage, target)
+        for bird_type, stage, target, age in itertools.product(BirdType, ProductionStage, TargetNutrition, AGES)
+    ]
+
+    cached = utils.resolve_requirements
+    time_per_call(calls, 1)  # Fill the cache
+    warm = time_per_call(calls, args.repeat)
+    utils.resolve_requirements = cached.__wrapped__
+    try:
+        cold = time_per_call(calls, args.repeat)
+    finally:
+        utils.resolve_requirements = cached
+
+    print(f"calls per pass: {len(calls)}")
+    print(f"uncached: {cold:8.2f} us/call")
+    print(f"cached:   {warm:8.2f} us/call ({cold / warm:.1f}x faster)")
+    print(f"cache: {cached.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Price ranges from one sensitivity solve against finding them by re-solving.
+
+For every ingredient of a request, the range of its price over which the
+optimal formula stays the same is found two ways: bisecting on the price
+with repeated generate_feed_formula calls (what callers did before
+include_sensitivity), and reading price_lower/price_upper off one solve
+with include_sensitivity=True. Run from the FeedOptimizer directory:
+
+    python benchmarks/sensitivity_sweep.py --ingredients 15 50
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.models import BirdType, ProductionStage  # noqa: E402
+from optimizer.optimizer import generate_feed_formula  # noqa: E402
+
+
+def quantities(response) -> dict:
+    return {ingredient.name: ingredient.quantity_kg for ingredient in response.ingredients}
+
+
+def same_formula(response, baseline: dict) -> bool:
+    found = quantities(response)
+    return found.keys() == baseline.keys() and all(abs(found[name] - baseline[name]) <= 0.01 for name in baseline)
+
+
+def reprice(request, name: str, price: float):
+    ingredients = [
+        ingredient.model_copy(update={"price_per_kg": price}) if ingredient.name == name else ingredient
+        for ingredient in request.ingredients
+    ]
+    return request.model_copy(update={"ingredients": ingredients})
+
+
+def bisect_price(request, name: str, baseline: dict, inside: float, outside: float, steps: int) -> float:
+    """Price between inside (same formula) and outside (formula changed) where the formula changes"""
+    for _ in range(steps):
+        middle = (inside + outside) / 2
+        if same_formula(generate_feed_formula(reprice(request, name, middle)), baseline):
+            inside = middle
+        else:
+            outside = middle
+    return (inside + outside) / 2
+
+
+def by_resolving(request, steps: int):
+    baseline = quantities(generate_feed_formula(request))
+    solves = 1
+    ranges = {}
+    for ingredient in request.ingredients:
+        price = ingredient.price_per_kg
+        lower = upper = None
+        # Probe far outside the current price first; no change there means no limit
+        if not same_formula(generate_feed_formula(reprice(request, ingredient.name, 1e-6)), baseline):
+            lower = bisect_price(request, ingredient.name, baseline, price, 1e-6, steps)
+            solves += steps
+        if not same_formula(generate_feed_formula(reprice(request, ingredient.name, price * 100)), baseline):
+            upper = bisect_price(request, ingredient.name, baseline, price, price * 100, steps)
+            solves += steps
+        solves += 2
+        ranges[ingredient.name] = (lower, upper)
+    return ranges, solves
+
+
+def by_sensitivity(request):
+    response = generate_feed_formula(request.model_copy(update={"include_sensitivity": True}))
+    return {
+        ingredient.name: (ingredient.price_lower, ingredient.price_upper)
+        for ingredient in response.sensitivity.ingredients
+    }
+
+
+def run(size: int, steps: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    request = make_request(rng, BirdType.BROILER, ProductionStage.GROWER, size)
+
+    start = time.perf_counter()
+    resolved, solves = by_resolving(request, steps)
+    resolving_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranged = by_sensitivity(request)
+    sensitivity_seconds = time.perf_counter() - start
+
+    # Limits outside the probed prices count as "no limit", as for bisection
+    prices = {ingredient.name: ingredient.price_per_kg for ingredient in request.ingredients}
+    agree = 0
+    for name, (low, high) in ranged.items():
+        low = None if low is None or low <= 1e-6 else low
+        high = None if high is None or high >= prices[name] * 100 else high
+        agree += all(
+            (a is None and b is None) or (a is not None and b is not None and abs(a - b) <= 1e-3 * max(1.0, b))
+            for a, b in zip(resolved[name], (low, high))
+        )
+
+    return {
+        "ingredients": size,
+        "resolving": {"solves": solves, "seconds": round(resolving_seconds, 3)},
+        "sensitivity": {"solves": 1, "seconds": round(sensitivity_seconds, 4)},
+        "speedup": round(resolving_seconds / sensitivity_seconds, 1),
+        "ranges_agreeing": f"{agree}/{len(resolved)}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ingredients", type=int, nargs="+", default=[15, 50])
+    parser.add_argument("--steps", type=int, default=30, help="Bisection steps per price limit")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(json.dumps([run(size, args.steps, args.seed) for size in args.ingredients], indent=2))
+
+
+if __name__ == "__main__":
+    main()
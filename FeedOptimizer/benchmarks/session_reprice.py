@@ -0,0 +1,102 @@
+"""
+Cost of re-pricing a formula: a fresh solve of the whole request against a
+warm re-solve of a formula session (optimizer/session.py).
+
+Each round moves the prices of maize, soybean meal and fish meal (and
+their variants) by up to +/-5%, as a day's market update would. "fresh"
+is POST /optimize's path, generate_feed_formula with HiGHS; "session" is
+FormulaSession.apply on a session created once. Run from the FeedOptimizer
+directory:
+
+    python benchmarks/session_reprice.py --sizes 15 50 200 --rounds 200
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_request  # noqa: E402
+
+from optimizer.models import BirdType, FormulaDelta, ProductionStage  # noqa: E402
+from optimizer.optimizer import generate_feed_formula  # noqa: E402
+from optimizer.session import FormulaSession  # noqa: E402
+
+REPRICED = ("maize", "soybean_meal", "fish_meal")
+
+
+def price_updates(request, rounds: int, rng: np.random.Generator):
+    base = {
+        ingredient.name: ingredient.price_per_kg
+        for ingredient in request.ingredients
+        if ingredient.name.rsplit("_", 1)[0] in REPRICED or ingredient.name in REPRICED
+    }
+    for _ in range(rounds):
+        yield {name: round(price * float(rng.uniform(0.95, 1.05)), 4) for name, price in base.items()}
+
+
+def milliseconds(samples):
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+    }
+
+
+def run(size: int, rounds: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    request = make_request(rng, BirdType.LAYER, ProductionStage.LAYER, size)
+    updates = list(price_updates(request, rounds, rng))
+
+    fresh, fresh_costs = [], []
+    for prices in updates:
+        ingredients = [
+            ingredient.model_copy(update={"price_per_kg": prices[ingredient.name]}) if ingredient.name in prices else ingredient
+            for ingredient in request.ingredients
+        ]
+        repriced = request.model_copy(update={"ingredients": ingredients})
+        start = time.perf_counter()
+        fresh_costs.append(generate_feed_formula(repriced, "highs").total_cost)
+        fresh.append(time.perf_counter() - start)
+
+    session = FormulaSession(request)
+    cold = session.solve()
+    warm, warm_costs, iterations = [], [], []
+    for prices in updates:
+        delta = FormulaDelta(prices=prices)
+        start = time.perf_counter()
+        response = session.apply(delta)
+        warm.append(time.perf_counter() - start)
+        warm_costs.append(response.formula.total_cost)
+        iterations.append(response.simplex_iterations)
+
+    return {
+        "ingredients": size,
+        "rounds": rounds,
+        "fresh": milliseconds(fresh),
+        "session": milliseconds(warm),
+        "speedup": round(statistics.median(fresh) / statistics.median(warm), 1),
+        "cold_iterations": cold.simplex_iterations,
+        "warm_iterations_median": statistics.median(iterations),
+        "same_costs": fresh_costs == warm_costs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 50, 200])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(json.dumps([run(size, args.rounds, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
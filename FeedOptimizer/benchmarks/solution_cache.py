@@ -0,0 +1,108 @@
+"""
+Solution cache on a workload of repeated requests.
+
+Farms using the default ingredient set for the same bird type and stage
+send requests that differ only in batch size. The workload draws --count
+requests from --distinct request shapes, each with its own random batch
+size, and posts them one by one to /optimize with the solution cache off
+and on (in-process, through httpx's ASGI transport). It also times a
+cache hit (key + rebuild of the response) against a solve in-process.
+Run from the FeedOptimizer directory:
+
+    python benchmarks/solution_cache.py --count 2000 --distinct 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import request_mix  # noqa: E402
+
+from optimizer.cache import SolutionCache, solution_key  # noqa: E402
+from optimizer.optimizer import solve_feed_formula  # noqa: E402
+
+
+def workload(count: int, distinct: int, seed: int):
+    rng = np.random.default_rng(seed)
+    shapes = list(request_mix(distinct, seed))
+    for index in rng.integers(0, distinct, size=count):
+        batch_size_kg = float(rng.choice([25, 50, 100, 250, 500, 1000, 2000]))
+        yield shapes[index].model_copy(update={"batch_size_kg": batch_size_kg})
+
+
+async def over_http(requests, cache_entries: int) -> dict:
+    import main
+
+    main.FEED_CACHE_ENTRIES = cache_entries
+    payloads = [request.model_dump(mode="json") for request in requests]
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            await client.get("/")
+            samples = []
+            for payload in payloads:
+                start = time.perf_counter()
+                response = await client.post("/optimize", json=payload)
+                samples.append(time.perf_counter() - start)
+                response.raise_for_status()
+            stats = main.solution_cache.stats() if main.solution_cache is not None else None
+    return {
+        "seconds": round(sum(samples), 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+        "cache": stats,
+    }
+
+
+def in_process(requests, rounds: int) -> dict:
+    cache = SolutionCache(sqlite_path=None)
+    request = requests[0]
+    key = solution_key(request)
+    _, solution = solve_feed_formula(request)
+    cache.put(request, key, solution)
+
+    def median_us(fn):
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return round(statistics.median(samples) * 1e6, 1)
+
+    return {
+        "solve_us": median_us(lambda: solve_feed_formula(request)),
+        "hit_us": median_us(lambda: cache.get(request, solution_key(request))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    requests = list(workload(args.count, args.distinct, args.seed))
+    report = {
+        "count": args.count,
+        "distinct": args.distinct,
+        "in_process": in_process(requests, args.rounds),
+        "uncached": asyncio.run(over_http(requests, 0)),
+        "cached": asyncio.run(over_http(requests, 4096)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-request latency of the HiGHS and CBC backends by problem size.
+
+For each ingredient count, times generate_feed_formula end to end and the
+LP build and solve on their own, over a seeded set of requests. Run from
+the FeedOptimizer directory:
+
+    python benchmarks/solver_latency.py
+    python benchmarks/solver_latency.py --sizes 10 50 200 --repeat 50
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimizer.matrix import IngredientMatrix, build_linear_program  # noqa: E402
+from optimizer.models import BirdType  # noqa: E402
+from optimizer.optimizer import generate_feed_formula  # noqa: E402
+from optimizer.solvers import get_solver  # noqa: E402
+from optimizer.utils import get_default_requirements  # noqa: E402
+from synthetic import request_mix  # noqa: E402
+
+
+def percentiles(samples_ms):
+    return np.percentile(samples_ms, 50), np.percentile(samples_ms, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 15, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=30, help="Requests per size and solver")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(f"{'n':>5} {'solver':<7} {'build ms':>9} {'solve p50':>10} {'solve p95':>10} {'total p50':>10} {'total p95':>10}")
+    for size in args.sizes:
+        requests = list(request_mix(args.repeat, args.seed, bird_types=list(BirdType), ingredient_counts=(size,)))
+        for name in ("highs", "cbc"):
+            solver = get_solver(name)
+            generate_feed_formula(requests[0], name)  # Load the solver
+            build_ms, solve_ms, total_ms = [], [], []
+            for request in requests:
+                start = time.perf_counter()
+                requirements = get_default_requirements(
+                    request.bird_type, request.bird_age, request.production_stage, request.target_nutrition
+                )
+                program = build_linear_program(
+                    IngredientMatrix.from_ingredients(request.ingredients), requirements, request.batch_size_kg
+                )
+                built = time.perf_counter()
+                solver.solve(program)
+                solved = time.perf_counter()
+                generate_feed_formula(request, name)
+                total_ms.append((time.perf_counter() - solved) * 1000)
+                build_ms.append((built - start) * 1000)
+                solve_ms.append((solved - built) * 1000)
+            print(
+                f"{size:>5} {name:<7} {np.median(build_ms):>9.3f} "
+                f"{percentiles(solve_ms)[0]:>10.3f} {percentiles(solve_ms)[1]:>10.3f} "
+                f"{percentiles(total_ms)[0]:>10.3f} {percentiles(total_ms)[1]:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Check that the HiGHS and CBC backends give the same formulas.
+
+Solves a seeded mix of requests, covering every bird type and stage with
+5 to 200 ingredients, with both backends and compares the status, the
+total cost (relative tolerance --rtol) and the nutrient levels reported
+in the response. LPs can have several optimal blends at the same cost, so
+the ingredient quantities themselves are only reported, not required to
+match. meets_requirements must be true for both: it allows for the
+solvers landing within their feasibility tolerance on either side of a
+bound.
+Exits non-zero on any mismatch. Run from the FeedOptimizer directory:
+
+    python benchmarks/solver_parity.py --count 500
+"""
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimizer.models import BirdType  # noqa: E402
+from optimizer.optimizer import generate_feed_formula  # noqa: E402
+from synthetic import request_mix  # noqa: E402
+
+INGREDIENT_COUNTS = (5, 10, 15, 25, 50, 100, 200)
+NUTRITION_FIELDS = ("protein_percentage", "energy_kcal_per_kg", "calcium_percentage", "phosphorus_percentage", "fiber_percentage")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    mismatches, same_blend, optimal = [], 0, 0
+    requests = request_mix(args.count, args.seed, bird_types=list(BirdType), ingredient_counts=INGREDIENT_COUNTS)
+    for index, request in enumerate(requests):
+        highs = generate_feed_formula(request, "highs")
+        cbc = generate_feed_formula(request, "cbc")
+        label = f"#{index} {request.bird_type.value}/{request.production_stage.value} n={len(request.ingredients)}"
+
+        if highs.optimization_message != cbc.optimization_message:
+            mismatches.append(f"{label}: status {highs.optimization_message!r} vs {cbc.optimization_message!r}")
+            continue
+        if not highs.optimization_success:
+            continue
+        optimal += 1
+        if not np.isclose(highs.total_cost, cbc.total_cost, rtol=args.rtol, atol=0.011):
+            mismatches.append(f"{label}: total cost {highs.total_cost} vs {cbc.total_cost}")
+        for field in NUTRITION_FIELDS:
+            # Rounded to 2 decimals (energy to 0) in the response, so allow one step
+            ours, theirs = getattr(highs.nutrition, field), getattr(cbc.nutrition, field)
+            if abs(ours - theirs) > (1.0 if field == "energy_kcal_per_kg" else 0.011):
+                mismatches.append(f"{label}: {field} {ours} vs {theirs}")
+        if not (highs.nutrition.meets_requirements and cbc.nutrition.meets_requirements):
+            mismatches.append(f"{label}: meets_requirements {highs.nutrition.meets_requirements} "
+                              f"vs {cbc.nutrition.meets_requirements}")
+        quantities = lambda response: {item.name: item.quantity_kg for item in response.ingredients}  # noqa: E731
+        same_blend += quantities(highs) == quantities(cbc)
+
+    print(f"requests: {args.count}, optimal: {optimal}, identical blends: {same_blend}")
+    for mismatch in mismatches:
+        print("MISMATCH", mismatch)
+    print("parity OK" if not mismatches else f"{len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
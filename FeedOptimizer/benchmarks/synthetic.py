@@ -0,0 +1,133 @@
+"""
+Seeded synthetic FormulaRequests for benchmarks.
+
+Ingredients are drawn from a catalogue of common East African feed
+ingredients with typical nutrient values, ordered so that the first five
+already make a feasible diet for most stages. Requests with more ingredients
+than the catalogue holds get variants of catalogue entries ("maize_2")
+with jittered nutrients and prices, which keeps every request feasible for
+most bird types and stages while growing the LP.
+"""
+import itertools
+from typing import Iterator, List, Sequence
+
+import numpy as np
+
+from optimizer.models import BirdType, FormulaRequest, Ingredient, ProductionStage, TargetNutrition
+
+# name, price/kg, protein %, energy kcal/kg, calcium %, phosphorus %, fiber %, max inclusion %
+CATALOGUE = (
+    ("maize", 0.35, 8.5, 3350, 0.02, 0.28, 2.2, 70),
+    ("soybean_meal", 0.70, 44.0, 2230, 0.30, 0.65, 6.0, 35),
+    ("limestone", 0.08, 0.0, 0, 38.00, 0.00, 0.0, 10),
+    ("dicalcium_phosphate", 1.00, 0.0, 0, 22.00, 18.00, 0.0, 3),
+    ("vegetable_oil", 1.50, 0.0, 8800, 0.00, 0.00, 0.0, 5),
+    ("fish_meal", 1.20, 60.0, 2800, 5.00, 3.00, 1.0, 10),
+    ("wheat_bran", 0.20, 15.5, 1300, 0.10, 1.00, 10.0, 15),
+    ("sorghum", 0.30, 10.0, 3250, 0.03, 0.30, 2.5, 40),
+    ("sunflower_cake", 0.40, 28.0, 1800, 0.30, 0.90, 18.0, 10),
+    ("oyster_shell", 0.10, 0.0, 0, 36.00, 0.00, 0.0, 10),
+    ("groundnut_cake", 0.60, 45.0, 2600, 0.20, 0.60, 7.0, 15),
+    ("rice_bran", 0.18, 12.0, 2400, 0.07, 1.50, 12.0, 15),
+    ("cassava_meal", 0.22, 2.5, 3100, 0.20, 0.10, 4.0, 20),
+    ("cottonseed_cake", 0.38, 36.0, 2000, 0.20, 1.00, 13.0, 8),
+    ("bone_meal", 0.50, 20.0, 0, 24.00, 12.00, 0.0, 3),
+)
+
+# Stages each bird type is normally fed in (those with default requirements)
+STAGES = {
+    BirdType.LAYER: (ProductionStage.STARTER, ProductionStage.GROWER, ProductionStage.PRE_LAY, ProductionStage.LAYER),
+    BirdType.BROILER: (ProductionStage.STARTER, ProductionStage.GROWER, ProductionStage.FINISHER),
+    BirdType.DUAL_PURPOSE: (ProductionStage.STARTER, ProductionStage.GROWER, ProductionStage.LAYER),
+    BirdType.BREEDER: (ProductionStage.STARTER, ProductionStage.GROWER, ProductionStage.LAYER),
+}
+
+# Ingredient counts of load_mix, from a farm's few ingredients to a mill's list
+LOAD_INGREDIENT_COUNTS = (5, 10, 15, 25, 50, 100, 200)
+
+# Typical age in days for each stage
+STAGE_AGES = {
+    ProductionStage.STARTER: (1, 21),
+    ProductionStage.GROWER: (22, 35),
+    ProductionStage.FINISHER: (36, 49),
+    ProductionStage.PRE_LAY: (112, 140),
+    ProductionStage.LAYER: (140, 600),
+}
+
+
+def make_ingredients(rng: np.random.Generator, count: int) -> List[Ingredient]:
+    ingredients = []
+    for index in range(count):
+        name, price, protein, energy, calcium, phosphorus, fiber, max_inclusion = CATALOGUE[index % len(CATALOGUE)]
+        variant = index // len(CATALOGUE)
+        if variant:
+            # Same kind of ingredient from another supplier
+            name = f"{name}_{variant + 1}"
+            nutrients = rng.uniform(0.95, 1.05, size=5)
+            protein, energy, calcium, phosphorus, fiber = (
+                float(value * jitter) for value, jitter in zip((protein, energy, calcium, phosphorus, fiber), nutrients)
+            )
+        ingredients.append(Ingredient(
+            name=name,
+            price_per_kg=round(price * float(rng.uniform(0.85, 1.15)), 4),
+            protein_percentage=round(protein, 3),
+            energy_kcal_per_kg=round(energy, 1),
+            calcium_percentage=round(calcium, 3),
+            phosphorus_percentage=round(phosphorus, 3),
+            fiber_percentage=round(fiber, 3),
+            max_inclusion_percentage=max_inclusion,
+        ))
+    return ingredients
+
+
+def make_request(
+    rng: np.random.Generator,
+    bird_type: BirdType,
+    production_stage: ProductionStage,
+    ingredient_count: int = len(CATALOGUE),
+) -> FormulaRequest:
+    low, high = STAGE_AGES[production_stage]
+    return FormulaRequest(
+        bird_type=bird_type,
+        bird_age=int(rng.integers(low, high + 1)),
+        production_stage=production_stage,
+        target_nutrition=TargetNutrition.BALANCED,
+        batch_size_kg=float(rng.choice([50, 100, 250, 500, 1000])),
+        ingredients=make_ingredients(rng, ingredient_count),
+    )
+
+
+def request_mix(
+    count: int,
+    seed: int = 0,
+    bird_types: Sequence[BirdType] = (BirdType.LAYER, BirdType.BROILER),
+    ingredient_counts: Sequence[int] = (len(CATALOGUE),),
+) -> Iterator[FormulaRequest]:
+    """Yield ``count`` requests cycling over the stages of ``bird_types``; the same seed gives the same requests."""
+    rng = np.random.default_rng(seed)
+    pairs = [(bird_type, stage) for bird_type in bird_types for stage in STAGES[bird_type]]
+    for (bird_type, stage), ingredient_count in zip(
+        itertools.islice(itertools.cycle(pairs), count),
+        itertools.cycle(ingredient_counts),
+    ):
+        yield make_request(rng, bird_type, stage, ingredient_count)
+
+
+def load_mix(
+    count: int,
+    seed: int = 0,
+    ingredient_counts: Sequence[int] = LOAD_INGREDIENT_COUNTS,
+) -> Iterator[FormulaRequest]:
+    """
+    Yield ``count`` requests over every BirdType/ProductionStage pair and
+    each of ``ingredient_counts``, in a seeded shuffled order so small and
+    large formulas interleave the way they arrive at the API. Unusual pairs
+    (broiler pre-lay) are included: the API accepts them and resolves
+    requirements for them. The same seed gives the same requests.
+    """
+    rng = np.random.default_rng(seed)
+    cases = list(itertools.product(itertools.product(BirdType, ProductionStage), ingredient_counts))
+    order = itertools.cycle(rng.permutation(len(cases)).tolist())
+    for index in itertools.islice(order, count):
+        (bird_type, stage), ingredient_count = cases[index]
+        yield make_request(rng, bird_type, stage, ingredient_count)
@@ -1,10 +1,41 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, List
+import asyncio
+import functools
+import multiprocessing
+import time
 import uvicorn
 import logging
+import os
 
-from optimizer.models import FormulaRequest, FormulaResponse
-from optimizer.optimizer import generate_feed_formula
+from pydantic import ValidationError
+
+from optimizer.models import (
+    BatchFormulaResponse,
+    BatchItemResult,
+    FormulaDelta,
+    FormulaRequest,
+    FormulaResponse,
+    FrontierRequest,
+    FrontierResponse,
+    Ingredient,
+    LibraryFormulaRequest,
+    LibraryInfo,
+    LifecyclePlanRequest,
+    SessionFormulaResponse,
+)
+from optimizer.cache import FEED_CACHE_ENTRIES, SolutionCache, solution_key
+from optimizer.library import IngredientLibrary, LibraryStore
+from optimizer.metrics import FEED_METRICS, Profile, current_profile, observe, profiled, profiling, render_metrics, stage
+from optimizer.optimizer import generate_feed_frontier, generate_library_formula, solve_feed_formula, solve_feed_formulas
+from optimizer.planner import plan_lifecycle, plan_lines
+from optimizer.session import FormulaSession, SessionStore
 
 # Configure logging
 logging.basicConfig(
@@ -13,12 +44,203 @@ logging.basicConfig(
 )
 logger = logging.getLogger("feed-optimizer")
 
+# Solves run in a pool of OPTIMIZER_WORKERS processes, never on the event
+# loop. A batch is split into chunks of requests so that each worker gets
+# several chunks and the per-task overhead is paid per chunk, not per formula.
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", str(os.cpu_count() or 1)))
+MAX_BATCH_REQUESTS = int(os.getenv("MAX_BATCH_REQUESTS", "5000"))
+MAX_PLAN_DAYS = int(os.getenv("MAX_PLAN_DAYS", "1000"))
+CHUNKS_PER_WORKER = 4
+
+solver_pool = None
+
+# Repeated requests are answered from a cache of solutions keyed by a hash of
+# the requirements and ingredients, before anything is sent to the pool
+solution_cache = None
+
+# Formula sessions keep a loaded model in this process, so their solves run
+# on a thread rather than in the solver pool
+formula_sessions = SessionStore()
+
+# Ingredient libraries live in this process; each solve sends its library's
+# arrays to the worker, never the ingredient models
+ingredient_libraries = LibraryStore()
+
+
+def start_solver_pool() -> ProcessPoolExecutor:
+    global solver_pool
+    # Spawned workers import only the optimizer package, not the web server
+    solver_pool = ProcessPoolExecutor(OPTIMIZER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return solver_pool
+
+
+async def run_in_pool(fn, *args):
+    """Run fn in the solver pool, replacing the pool if a worker has died"""
+    pool = solver_pool
+    try:
+        profile = current_profile()
+        if profile is None:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        # The worker times its stages under a Profile of its own and sends it back
+        with stage("pool"):
+            result, worker_profile = await asyncio.get_running_loop().run_in_executor(pool, profiled, fn, *args)
+        profile.merge(worker_profile)
+        return result
+    except BrokenProcessPool:
+        if solver_pool is pool:
+            logger.error("Solver pool broken, starting a new one")
+            start_solver_pool()
+            pool.shutdown(wait=False)
+        raise
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global solution_cache
+    start_solver_pool()
+    if FEED_CACHE_ENTRIES > 0:
+        solution_cache = SolutionCache()
+    yield
+    solver_pool.shutdown(cancel_futures=True)
+    if solution_cache is not None:
+        solution_cache.close()
+        solution_cache = None
+
+
+# The solution cache reads and writes SQLite, and rebuilding a response
+# from a hit can take as long as a small solve (e.g. simulate_compliance),
+# so lookups and stores run on a thread, never on the event loop
+
+def lookup_solution(request: FormulaRequest):
+    """(key, cached response) for a request; either can be None"""
+    key = solution_key(request)
+    return key, (solution_cache.get(request, key) if key is not None else None)
+
+
+async def solve_formula(request: FormulaRequest) -> FormulaResponse:
+    """Solve one request in the pool, or answer it from the solution cache"""
+    key = None
+    if solution_cache is not None:
+        key, cached = await asyncio.to_thread(lookup_solution, request)
+        if cached is not None:
+            return cached
+
+    response, solution = await run_in_pool(solve_feed_formula, request)
+    if key is not None and solution is not None:
+        await asyncio.to_thread(solution_cache.put, request, key, solution)
+    return response
+
+
+def lookup_batch(requests: List[FormulaRequest], indexes: List[int], results: List[BatchItemResult]):
+    """
+    Answer what the cache can of a batch's requests at indexes, filling in
+    results; of several identical requests only the first is looked up and
+    solved. Returns the keys, the indexes left to solve and (index, first
+    index) of repeats.
+    """
+    keys = [None] * len(requests)
+    pending, repeats, first_with_key = [], [], {}
+    for index in indexes:
+        request = requests[index]
+        key = keys[index] = solution_key(request)
+        if key is not None:
+            if key.key in first_with_key:
+                repeats.append((index, first_with_key[key.key]))
+                continue
+            cached = solution_cache.get(request, key)
+            if cached is not None:
+                results[index] = BatchItemResult(success=True, result=cached)
+                continue
+            first_with_key[key.key] = index
+        pending.append(index)
+    return keys, pending, repeats
+
+
+def store_batch(requests: List[FormulaRequest], keys, solutions, repeats, results: List[BatchItemResult]) -> None:
+    """Store a batch's new solutions, then answer its repeats from them"""
+    for index, solution in solutions:
+        solution_cache.put(requests[index], keys[index], solution)
+    for index, first in repeats:
+        cached = solution_cache.get(requests[index], keys[index])
+        results[index] = BatchItemResult(success=True, result=cached) if cached is not None else results[first].model_copy()
+
+
+class ProfilingMiddleware:
+    """
+    Gives every HTTP request a Profile, adds it to the metrics when the
+    request is done, and with an "X-Profile: 1" request header returns its
+    stage timings in a Server-Timing response header
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = Profile()
+        wants_timings = any(
+            name == b"x-profile" and value.lower() not in (b"0", b"false", b"no") for name, value in scope["headers"]
+        )
+
+        async def send_profiled(message):
+            if message["type"] == "http.response.start":
+                if profile.handler_done is not None:
+                    profile.add("serialize", time.perf_counter() - profile.handler_done)
+                if wants_timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        with profiling(profile):
+            try:
+                await self.app(scope, receive, send_profiled)
+            finally:
+                observe(profile)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route that labels the request's Profile with its path, and whose
+    endpoint notes when it starts (everything before is parsing) and when
+    it returns (everything after, up to the response, is serialization)
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **endpoint_kwargs):
+            profile = current_profile()
+            if profile is None:
+                return await endpoint(*args, **endpoint_kwargs)
+            profile.add("parse", time.perf_counter() - profile.start)
+            try:
+                return await endpoint(*args, **endpoint_kwargs)
+            finally:
+                profile.handler_done = time.perf_counter()
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    async def handle(self, scope, receive, send):
+        profile = current_profile()
+        if profile is not None:
+            profile.route = self.path
+        await super().handle(scope, receive, send)
+
+
 app = FastAPI(
     title="PoultryPal Feed Formula Optimizer",
     description="API for generating optimized poultry feed formulas",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# With FEED_METRICS off nothing is timed: requests get no Profile
+if FEED_METRICS:
+    app.router.route_class = TimedRoute
+    app.add_middleware(ProfilingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -43,7 +265,7 @@ async def optimize_formula(request: FormulaRequest):
     """
     try:
         logger.info(f"Received optimization request for {request.bird_type} at age {request.bird_age}")
-        result = generate_feed_formula(request)
+        result = await solve_formula(request)
         logger.info(f"Optimization completed successfully")
         return result
     except Exception as e:
@@ -51,5 +273,237 @@ async def optimize_formula(request: FormulaRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def batch_error(error: ValidationError) -> str:
+    """A batch item's validation errors as one line, "field: message; ..." """
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'request'}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+@app.post(
+    "/optimize/batch",
+    response_model=BatchFormulaResponse,
+    # Items are validated one by one, but are documented as what they must be
+    openapi_extra={"requestBody": {"content": {"application/json": {"schema": {
+        "type": "array", "items": {"$ref": "#/components/schemas/FormulaRequest"},
+    }}}}},
+)
+async def optimize_formulas(requests: List[Any]):
+    """
+    Generate optimized feed formulas for many requests in one call
+
+    Requests are solved in parallel; results come back in request order and
+    a failed request, including one that is not a valid FormulaRequest,
+    only marks its own result as failed.
+    """
+    if not requests:
+        raise HTTPException(status_code=400, detail="At least one request is required")
+    if len(requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_REQUESTS} requests per batch")
+
+    logger.info(f"Received batch optimization request with {len(requests)} formulas")
+    results: List[BatchItemResult] = [None] * len(requests)
+    valid = []
+    with stage("parse"):
+        for index, item in enumerate(requests):
+            try:
+                requests[index] = FormulaRequest.model_validate(item)
+                valid.append(index)
+            except ValidationError as e:
+                requests[index] = None
+                results[index] = BatchItemResult(success=False, error=f"Invalid request: {batch_error(e)}")
+
+    keys, pending, repeats = [None] * len(requests), valid, []
+    if solution_cache is not None and valid:
+        keys, pending, repeats = await asyncio.to_thread(lookup_batch, requests, valid, results)
+
+    solutions = []
+    if pending:
+        chunk_size = -(-len(pending) // (OPTIMIZER_WORKERS * CHUNKS_PER_WORKER))
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        outcomes = await asyncio.gather(
+            *(run_in_pool(solve_feed_formulas, [requests[index] for index in chunk]) for chunk in chunks),
+            return_exceptions=True,
+        )
+
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, BaseException):
+                # The pool itself failed (e.g. a worker was killed), not a solve
+                logger.error(f"Batch chunk of {len(chunk)} formulas failed: {outcome!r}")
+                outcome = [(BatchItemResult(success=False, error=f"Solver worker failed: {outcome!r}"), None) for _ in chunk]
+            for index, (result, solution) in zip(chunk, outcome):
+                results[index] = result
+                if keys[index] is not None and solution is not None:
+                    solutions.append((index, solution))
+
+    if solutions or repeats:
+        await asyncio.to_thread(store_batch, requests, keys, solutions, repeats, results)
+
+    for index, result in enumerate(results):
+        result.index = index
+
+    succeeded = sum(result.success for result in results)
+    logger.info(f"Batch optimization finished: {succeeded} succeeded, {len(results) - succeeded} failed")
+    return BatchFormulaResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+
+@app.post("/optimize/frontier", response_model=FrontierResponse)
+async def optimize_frontier(request: FrontierRequest):
+    """
+    Formulas from least cost to closest to the nutrient targets, to choose
+    a cost/nutrition trade-off from; all come from one model
+    """
+    try:
+        logger.info(f"Received frontier request of {request.points} points for {request.bird_type}")
+        return await run_in_pool(generate_feed_frontier, request)
+    except Exception as e:
+        logger.error(f"Frontier failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage timings, solver outcomes and model sizes in the Prometheus text format"""
+    if not FEED_METRICS:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit and miss counters of the solution cache (per lookup)"""
+    if solution_cache is None:
+        raise HTTPException(status_code=404, detail="Solution cache is disabled")
+    return solution_cache.stats()
+
+
+def get_library(library_id: str) -> IngredientLibrary:
+    try:
+        return ingredient_libraries.get(library_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Ingredient library {library_id} not found")
+
+
+@app.post("/libraries", response_model=LibraryInfo, status_code=201)
+async def create_library(ingredients: List[Ingredient]):
+    """
+    Store an ingredient library for /libraries/{id}/optimize
+
+    The id is a hash of the ingredients: posting the same ingredients
+    again returns the same id, and any change gives a new one.
+    """
+    if not ingredients:
+        raise HTTPException(status_code=400, detail="At least one ingredient is required")
+    try:
+        library = ingredient_libraries.add(ingredients)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return LibraryInfo(library_id=library.version, ingredient_count=len(library))
+
+
+@app.get("/libraries/{library_id}", response_model=LibraryInfo)
+async def read_library(library_id: str):
+    """Ingredients of a stored library"""
+    library = get_library(library_id)
+    return LibraryInfo(library_id=library.version, ingredient_count=len(library), ingredients=library.ingredients())
+
+
+@app.post("/libraries/{library_id}/optimize", response_model=FormulaResponse)
+async def optimize_library_formula(library_id: str, request: LibraryFormulaRequest):
+    """
+    Generate an optimized feed formula from a stored ingredient library
+
+    The request names ingredients by id and may override their prices.
+    """
+    library = get_library(library_id)
+    try:
+        # Reject unknown ingredient ids before going to a worker
+        library.columns(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        logger.info(f"Received library optimization request for {request.bird_type} at age {request.bird_age}")
+        return await run_in_pool(generate_library_formula, request, library)
+    except Exception as e:
+        logger.error(f"Optimization failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/plan/lifecycle")
+async def plan_flock_lifecycle(request: LifecyclePlanRequest):
+    """
+    Least-cost feeding plan for a flock over an age range, as one LP
+
+    Ingredient stock is shared between all periods. The plan streams back
+    as newline-delimited JSON: a summary line, one line per period with
+    its formula, then one line per stocked ingredient.
+    """
+    days = request.end_age_days - request.start_age_days + 1
+    if days > MAX_PLAN_DAYS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PLAN_DAYS} days per plan")
+
+    try:
+        logger.info(f"Received lifecycle plan request for {request.flock_size} {request.bird_type} over {days} days")
+        plan = await run_in_pool(plan_lifecycle, request)
+    except Exception as e:
+        logger.error(f"Lifecycle plan failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(plan_lines(plan), media_type="application/x-ndjson")
+
+
+def get_session(session_id: str) -> FormulaSession:
+    try:
+        return formula_sessions.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Formula session {session_id} not found")
+
+
+@app.post("/sessions", response_model=SessionFormulaResponse, status_code=201)
+async def create_session(request: FormulaRequest):
+    """
+    Solve a formula and keep it loaded for cheap re-solves
+
+    Price and availability changes posted to /sessions/{id}/reprice are
+    solved from the previous optimal basis.
+    """
+    try:
+        session = FormulaSession(request)
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Formula sessions require the HiGHS solver (highspy)")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"Created formula session {session.id} for {request.bird_type} at age {request.bird_age}")
+    result = await asyncio.to_thread(session.solve)
+    formula_sessions.add(session)
+    return result
+
+
+@app.get("/sessions/{session_id}", response_model=SessionFormulaResponse)
+async def read_session(session_id: str):
+    """Latest formula of a session"""
+    return get_session(session_id).last_response
+
+
+@app.post("/sessions/{session_id}/reprice", response_model=SessionFormulaResponse)
+async def reprice_session(session_id: str, delta: FormulaDelta):
+    """Apply ingredient price and availability changes and re-solve"""
+    session = get_session(session_id)
+    try:
+        return await asyncio.to_thread(session.apply, delta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    """Drop a formula session"""
+    try:
+        formula_sessions.remove(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Formula session {session_id} not found")
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,4 +1,11 @@
 # Package initialization
+from optimizer.metrics import *
 from optimizer.models import *
+from optimizer.matrix import *
+from optimizer.solvers import *
+from optimizer.library import *
 from optimizer.optimizer import *
+from optimizer.cache import *
+from optimizer.session import *
+from optimizer.planner import *
 from optimizer.utils import *
\ No newline at end of file
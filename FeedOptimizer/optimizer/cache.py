@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from optimizer.matrix import IngredientMatrix
+from optimizer.models import FormulaRequest, FormulaResponse, Ingredient, NutritionalRequirement
+from optimizer.optimizer import failed_response, formulation_program, optimal_response, request_requirements
+from optimizer.solvers import NOT_SOLVED, OPTIMAL, SolverResult, get_solver
+
+logger = logging.getLogger("feed-optimizer.cache")
+
+# Memory tier size (0 turns the cache off), entry lifetime, and the
+# optional SQLite file shared by every API process on the host
+FEED_CACHE_ENTRIES = int(os.getenv("FEED_CACHE_ENTRIES", "4096"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "3600"))
+FEED_CACHE_SQLITE = os.getenv("FEED_CACHE_SQLITE")
+
+# Part of every key: bump it when the formulation changes, so solutions of
+# the old LP are never served
+FORMULATION_VERSION = "3"
+
+# Solutions are stored for this batch size and rescaled on the way out: the
+# LP's right-hand sides and bounds are all proportional to the batch size,
+# so its optimal solution is too
+REFERENCE_BATCH_KG = 100.0
+
+
+def cacheable(request: FormulaRequest) -> bool:
+    """Whether a request's response can be rebuilt from cached quantities alone"""
+    # Sensitivity reports need the solver's duals and relaxations the
+    # elastic program's slacks, neither of which is cached. Compliance
+    # reports are sampled again from the cached formula, with the same seed.
+    # MIP formulas depend on how far the solve got within its time limit
+    return not (
+        request.include_sensitivity or request.allow_relaxation
+        or request.max_ingredients is not None or request.bag_size_kg is not None
+    )
+
+
+class SolutionKey:
+    """
+    Cache key for a request, and what is needed to answer it from the cache
+
+    The key hashes the resolved requirements, the available ingredients
+    (sorted, so their order in the request does not matter), the cost
+    priority and compliance probability, the solver and the formulation
+    version; not the batch size.
+
+    Attributes:
+        key: Hex digest
+        requirements: Resolved requirements of the request
+        ingredients: Available ingredients, in request order
+        order: For each position in sorted order, the index in ingredients
+    """
+
+    def __init__(self, key: str, requirements: NutritionalRequirement, ingredients: List[Ingredient], order: np.ndarray):
+        self.key = key
+        self.requirements = requirements
+        self.ingredients = ingredients
+        self.order = order
+
+
+def solution_key(request: FormulaRequest, solver: Optional[str] = None) -> Optional[SolutionKey]:
+    """SolutionKey for a request, or None if it cannot be served from the cache"""
+    if not cacheable(request):
+        return None
+    ingredients = [i for i in request.ingredients if i.available]
+    if not ingredients:
+        return None
+
+    requirements = request_requirements(request)
+    # Plain tuples hash far faster than model dumps; None is normalized the
+    # way IngredientMatrix reads it, so equivalent requests share a key
+    rows = [
+        (
+            i.name, i.price_per_kg, i.protein_percentage, i.energy_kcal_per_kg,
+            i.calcium_percentage or 0.0, i.phosphorus_percentage or 0.0, i.fiber_percentage or 0.0,
+            i.min_inclusion_percentage or 0.0, 100.0 if i.max_inclusion_percentage is None else i.max_inclusion_percentage,
+            i.protein_percentage_sd or 0.0, i.energy_kcal_per_kg_sd or 0.0, i.calcium_percentage_sd or 0.0,
+            i.phosphorus_percentage_sd or 0.0, i.fiber_percentage_sd or 0.0,
+        )
+        for i in ingredients
+    ]
+    order = np.array(sorted(range(len(rows)), key=rows.__getitem__), dtype=np.intp)
+    content = repr((
+        FORMULATION_VERSION,
+        get_solver(solver).name,
+        tuple(sorted(requirements.model_dump().items())),
+        request.cost_optimization_priority,
+        request.compliance_probability,
+        [rows[j] for j in order],
+    ))
+    return SolutionKey(hashlib.sha256(content.encode("utf-8")).hexdigest(), requirements, ingredients, order)
+
+
+class SolutionCache:
+    """
+    Two-tier cache of solved formulas, per REFERENCE_BATCH_KG of feed.
+
+    The memory tier is an LRU of at most ``max_entries`` entries, each valid
+    for ``ttl_seconds``. The optional SQLite tier at ``sqlite_path`` is shared
+    by every API process on the host and survives restarts. Entries hold the
+    solve status and the ingredient quantities in sorted ingredient order,
+    so any request with the same key, whatever its batch size or ingredient
+    order, can be answered from them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = FEED_CACHE_ENTRIES,
+        ttl_seconds: float = FEED_CACHE_TTL,
+        sqlite_path: Optional[str] = FEED_CACHE_SQLITE,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS solutions ("
+                "key TEXT PRIMARY KEY, status TEXT NOT NULL, quantities BLOB, created_at REAL NOT NULL)"
+            )
+            expired = self._db.execute(
+                "DELETE FROM solutions WHERE created_at < ?", (time.time() - ttl_seconds,)
+            ).rowcount
+            if expired:
+                logger.info("purged %d expired cached solutions", expired)
+
+    def get(self, request: FormulaRequest, key: SolutionKey) -> Optional[FormulaResponse]:
+        """Response for the request from a cached solution, or None on a miss"""
+        entry = self._lookup(key.key)
+        if entry is None:
+            return None
+        status, quantities = entry
+        if status != OPTIMAL:
+            return failed_response(request, f"Optimization failed: {status}")
+
+        x = np.empty(len(key.ingredients))
+        x[key.order] = quantities * (request.batch_size_kg / REFERENCE_BATCH_KG)
+        matrix = IngredientMatrix.from_ingredients(key.ingredients)
+        # The nutrition deviation is read off the LP; nothing else cached needs it
+        program = formulation_program(request, key.requirements, matrix) if request.cost_optimization_priority < 1 else None
+        return optimal_response(request, key.requirements, matrix, program, SolverResult(OPTIMAL, x))
+
+    def put(self, request: FormulaRequest, key: SolutionKey, solution: SolverResult) -> None:
+        """Store the solve of a request that missed the cache"""
+        if solution.status == NOT_SOLVED:
+            # Not an answer about the LP (e.g. the solver gave up): solve again next time
+            return
+        quantities = None
+        if solution.optimal:
+            quantities = solution.x[key.order] * (REFERENCE_BATCH_KG / request.batch_size_kg)
+        now = time.time()
+        with self._lock:
+            self._remember(key.key, (solution.status, quantities), now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO solutions (key, status, quantities, created_at) VALUES (?, ?, ?, ?)",
+                    (key.key, solution.status, None if quantities is None else quantities.tobytes(), now),
+                )
+
+    def _lookup(self, key: str) -> Optional[Tuple[str, Optional[np.ndarray]]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                solution, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return solution
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT status, quantities, created_at FROM solutions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] <= self.ttl_seconds:
+                    solution = (row[0], None if row[1] is None else np.frombuffer(row[1], dtype=np.float64))
+                    self._remember(key, solution, row[2])
+                    self.disk_hits += 1
+                    return solution
+
+            self.misses += 1
+            return None
+
+    def _remember(self, key: str, solution: Tuple[str, Optional[np.ndarray]], created_at: float) -> None:
+        self._entries[key] = (solution, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from optimizer.matrix import NUTRIENTS, IngredientMatrix
+from optimizer.models import Ingredient, LibraryFormulaRequest
+
+# Configure logging
+logger = logging.getLogger("feed-optimizer.library")
+
+# Libraries are kept in memory, the least recently used dropped past
+# MAX_INGREDIENT_LIBRARIES. With FEED_LIBRARY_DIR set they are also written
+# there and reloaded on demand, so they survive restarts.
+MAX_INGREDIENT_LIBRARIES = int(os.getenv("MAX_INGREDIENT_LIBRARIES", "64"))
+FEED_LIBRARY_DIR = os.getenv("FEED_LIBRARY_DIR")
+
+_LIBRARY_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+def library_version(ingredients: List[Ingredient]) -> str:
+    """SHA-256 of the ingredients' canonical JSON; the same ingredients always give the same version"""
+    canonical = json.dumps(
+        [ingredient.model_dump(mode="json") for ingredient in ingredients],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IngredientLibrary:
+    """
+    A farm's ingredients, validated once and held as an IngredientMatrix
+
+    Formula requests name library ingredients by id (their name) and only
+    send price overrides, so nothing is re-parsed or re-validated per
+    request and LP columns are sliced straight out of the matrix. A
+    library never changes: editing it gives a new version, and with it a
+    new id.
+
+    Attributes:
+        version: Content hash of the ingredients, also the library's id
+        matrix: All ingredients, in library order
+        contents: Nutrient fields as given (percentages, kcal/kg), shape
+            (5, n) in NUTRIENTS order, for rebuilding Ingredient models
+        contents_sd: The nutrient fields' *_sd fields as given, likewise,
+            NaN where they are None
+        available: Whether each ingredient is available by default
+    """
+
+    def __init__(
+        self,
+        version: str,
+        matrix: IngredientMatrix,
+        contents: np.ndarray,
+        contents_sd: np.ndarray,
+        available: np.ndarray
+    ):
+        self.version = version
+        self.matrix = matrix
+        self.contents = contents
+        self.contents_sd = contents_sd
+        self.available = available
+        self.index: Dict[str, int] = {name: j for j, name in enumerate(matrix.names)}
+
+    @classmethod
+    def from_ingredients(cls, ingredients: List[Ingredient]) -> "IngredientLibrary":
+        names = [ingredient.name for ingredient in ingredients]
+        if len(set(names)) != len(names):
+            raise ValueError("Ingredient names must be unique in a library")
+        return cls(
+            version=library_version(ingredients),
+            matrix=IngredientMatrix.from_ingredients(ingredients),
+            contents=np.array(
+                [[getattr(ingredient, field) or 0.0 for ingredient in ingredients] for _, field, _ in NUTRIENTS],
+                dtype=np.float64,
+            ).reshape(len(NUTRIENTS), len(ingredients)),
+            contents_sd=np.array(
+                [[getattr(ingredient, f"{field}_sd") for ingredient in ingredients] for _, field, _ in NUTRIENTS],
+                dtype=np.float64,
+            ).reshape(len(NUTRIENTS), len(ingredients)),
+            available=np.array([ingredient.available for ingredient in ingredients], dtype=bool),
+        )
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def columns(self, request: LibraryFormulaRequest) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Library columns a request uses, and their prices after its overrides
+
+        Raises:
+            ValueError: If the request names an ingredient not in the library
+        """
+        named = set(request.prices) | set(request.unavailable) | set(request.ingredient_ids or ())
+        unknown = sorted(named - set(self.index))
+        if unknown:
+            raise ValueError(f"Unknown ingredients: {', '.join(unknown)}")
+
+        if request.ingredient_ids is None:
+            selected = self.available.copy()
+        else:
+            selected = np.zeros(len(self), dtype=bool)
+            selected[[self.index[name] for name in request.ingredient_ids]] = True
+        selected[[self.index[name] for name in request.unavailable]] = False
+
+        prices = self.matrix.prices.copy()
+        for name, price in request.prices.items():
+            prices[self.index[name]] = price
+        columns = np.flatnonzero(selected)
+        return columns, prices[columns]
+
+    def ingredient(self, column: int, price: Optional[float] = None) -> Ingredient:
+        """Ingredient model for one column, e.g. for a formula response"""
+        fields = {field: float(self.contents[row, column]) for row, (_, field, _) in enumerate(NUTRIENTS)}
+        fields.update(
+            (f"{field}_sd", float(self.contents_sd[row, column]))
+            for row, (_, field, _) in enumerate(NUTRIENTS)
+            if not np.isnan(self.contents_sd[row, column])
+        )
+        if not np.isnan(self.matrix.bag_size[column]):
+            fields["bag_size_kg"] = float(self.matrix.bag_size[column])
+        return Ingredient(
+            name=self.matrix.names[column],
+            available=bool(self.available[column]),
+            price_per_kg=float(self.matrix.prices[column] if price is None else price),
+            min_inclusion_percentage=float(self.matrix.min_inclusion[column]),
+            max_inclusion_percentage=float(self.matrix.max_inclusion[column]),
+            **fields,
+        )
+
+    def ingredients(self) -> List[Ingredient]:
+        return [self.ingredient(j) for j in range(len(self))]
+
+
+class LibraryStore:
+    """Ingredient libraries by id, optionally persisted to a directory"""
+
+    def __init__(self, max_libraries: int = MAX_INGREDIENT_LIBRARIES, directory: Optional[str] = FEED_LIBRARY_DIR):
+        self.max_libraries = max_libraries
+        self.directory = directory
+        self._libraries: "OrderedDict[str, IngredientLibrary]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, ingredients: List[Ingredient]) -> IngredientLibrary:
+        """Store a library for the ingredients; adding the same ingredients again returns the same library"""
+        library = IngredientLibrary.from_ingredients(ingredients)
+        if self.directory and not os.path.exists(self._path(library.version)):
+            # Write then rename, so a crash never leaves a partial library
+            path = self._path(library.version)
+            with open(path + ".tmp", "w") as f:
+                json.dump([ingredient.model_dump(mode="json") for ingredient in ingredients], f)
+            os.replace(path + ".tmp", path)
+        self._remember(library)
+        logger.info(f"Stored ingredient library {library.version} with {len(library)} ingredients")
+        return library
+
+    def get(self, library_id: str) -> IngredientLibrary:
+        """Library by id; raises KeyError if it is not stored"""
+        with self._lock:
+            if library_id in self._libraries:
+                self._libraries.move_to_end(library_id)
+                return self._libraries[library_id]
+
+        if not (self.directory and _LIBRARY_ID.match(library_id) and os.path.exists(self._path(library_id))):
+            raise KeyError(library_id)
+        with open(self._path(library_id)) as f:
+            library = IngredientLibrary.from_ingredients([Ingredient(**item) for item in json.load(f)])
+        self._remember(library)
+        return library
+
+    def _remember(self, library: IngredientLibrary) -> None:
+        with self._lock:
+            self._libraries[library.version] = library
+            self._libraries.move_to_end(library.version)
+            while len(self._libraries) > self.max_libraries:
+                self._libraries.popitem(last=False)
+
+    def _path(self, library_id: str) -> str:
+        return os.path.join(self.directory, f"{library_id}.json")
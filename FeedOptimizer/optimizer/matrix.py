@@ -0,0 +1,719 @@
+import logging
+from statistics import NormalDist
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from optimizer.models import Ingredient, NutritionalRequirement
+
+# Configure logging
+logger = logging.getLogger("feed-optimizer.matrix")
+
+# Nutrients constrained by NutritionalRequirement: the Ingredient field that
+# holds each one, and the factor that turns "kg of ingredient" into "kg (or
+# kcal) of nutrient"
+NUTRIENTS: Tuple[Tuple[str, str, float], ...] = (
+    ("protein", "protein_percentage", 0.01),
+    ("energy", "energy_kcal_per_kg", 1.0),
+    ("calcium", "calcium_percentage", 0.01),
+    ("phosphorus", "phosphorus_percentage", 0.01),
+    ("fiber", "fiber_percentage", 0.01),
+)
+NUTRIENT_NAMES = tuple(name for name, _, _ in NUTRIENTS)
+
+# Weight of relaxing a requirement against ingredient cost in elastic
+# programs: relaxing a bound by 0.1% costs as much as the whole batch at
+# the highest ingredient price
+RELAXATION_PENALTY = 1000.0
+
+
+class IngredientMatrix:
+    """
+    Ingredients as columnar NumPy arrays, one column per ingredient
+
+    Attributes:
+        names: Ingredient names, in column order
+        prices: Price per kg, shape (n,)
+        nutrients: Nutrient content per kg of ingredient, shape (5, n), rows
+            in NUTRIENTS order (percentages already divided by 100)
+        min_inclusion: Minimum inclusion percentage, shape (n,)
+        max_inclusion: Maximum inclusion percentage, shape (n,)
+        nutrient_sd: Lot-to-lot standard deviation of each nutrient content,
+            shape (5, n), scaled like nutrients (0 where it is exact)
+        bag_size: Bag size of each ingredient in kg, shape (n,), NaN where
+            the ingredient has none of its own (0: weighed)
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        prices: np.ndarray,
+        nutrients: np.ndarray,
+        min_inclusion: np.ndarray,
+        max_inclusion: np.ndarray,
+        nutrient_sd: Optional[np.ndarray] = None,
+        bag_size: Optional[np.ndarray] = None
+    ):
+        self.names = names
+        self.prices = prices
+        self.nutrients = nutrients
+        self.min_inclusion = min_inclusion
+        self.max_inclusion = max_inclusion
+        self.nutrient_sd = np.zeros_like(nutrients) if nutrient_sd is None else nutrient_sd
+        self.bag_size = np.full(len(names), np.nan) if bag_size is None else bag_size
+
+    @classmethod
+    def from_ingredients(cls, ingredients: List[Ingredient]) -> "IngredientMatrix":
+        # One pass over the models; optional fields left as None count as 0,
+        # except the bag size
+        rows = [
+            (
+                ingredient.price_per_kg,
+                np.nan if ingredient.bag_size_kg is None else ingredient.bag_size_kg,
+                ingredient.min_inclusion_percentage or 0.0,
+                100.0 if ingredient.max_inclusion_percentage is None else ingredient.max_inclusion_percentage,
+                *(getattr(ingredient, field) or 0.0 for _, field, _ in NUTRIENTS),
+                *(getattr(ingredient, f"{field}_sd") or 0.0 for _, field, _ in NUTRIENTS),
+            )
+            for ingredient in ingredients
+        ]
+        values = np.array(rows, dtype=np.float64).reshape(len(ingredients), 4 + 2 * len(NUTRIENTS))
+        scale = np.array([factor for _, _, factor in NUTRIENTS])
+        return cls(
+            names=[ingredient.name for ingredient in ingredients],
+            prices=values[:, 0].copy(),
+            nutrients=values[:, 4:4 + len(NUTRIENTS)].T * scale[:, np.newaxis],
+            min_inclusion=values[:, 2].copy(),
+            max_inclusion=values[:, 3].copy(),
+            nutrient_sd=values[:, 4 + len(NUTRIENTS):].T * scale[:, np.newaxis],
+            bag_size=values[:, 1].copy(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def take(self, columns: np.ndarray, prices: Optional[np.ndarray] = None) -> "IngredientMatrix":
+        """The ingredients at columns, in that order, optionally with new prices"""
+        return IngredientMatrix(
+            names=[self.names[j] for j in columns.tolist()],
+            prices=self.prices[columns] if prices is None else prices,
+            nutrients=self.nutrients[:, columns],
+            min_inclusion=self.min_inclusion[columns],
+            max_inclusion=self.max_inclusion[columns],
+            nutrient_sd=self.nutrient_sd[:, columns],
+            bag_size=self.bag_size[columns],
+        )
+
+
+class LinearProgram:
+    """
+    Feed formulation LP in matrix form:
+
+        minimize    cost @ x
+        subject to  row_lower <= A @ x <= row_upper
+                    col_lower <= x <= col_upper
+
+    where x is kg of each ingredient. Row 0 is the total weight; every other
+    row is one nutrient, with -inf / inf for a missing bound.
+    """
+
+    def __init__(
+        self,
+        cost: np.ndarray,
+        col_lower: np.ndarray,
+        col_upper: np.ndarray,
+        A: np.ndarray,
+        row_lower: np.ndarray,
+        row_upper: np.ndarray,
+        row_names: List[str]
+    ):
+        self.cost = cost
+        self.col_lower = col_lower
+        self.col_upper = col_upper
+        self.A = A
+        self.row_lower = row_lower
+        self.row_upper = row_upper
+        self.row_names = row_names
+
+    @property
+    def num_cols(self) -> int:
+        return self.A.shape[1]
+
+    @property
+    def num_rows(self) -> int:
+        return self.A.shape[0]
+
+    def columnwise(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        A in compressed sparse column form: (start, index, value)
+
+        The non-zeros of column j are value[start[j]:start[j + 1]], in rows
+        index[start[j]:start[j + 1]].
+        """
+        # np.nonzero on A.T walks A column by column
+        cols, rows = np.nonzero(self.A.T)
+        start = np.searchsorted(cols, np.arange(self.num_cols + 1)).astype(np.int32)
+        return start, rows.astype(np.int32), self.A.T[cols, rows]
+
+    def activity(self, x: np.ndarray) -> np.ndarray:
+        """Row activities A @ x"""
+        return self.A @ x
+
+
+class SparseLinearProgram(LinearProgram):
+    """
+    LinearProgram whose A is only held column-wise, for models too large
+    and too sparse to store densely (see optimizer/planner.py)
+    """
+
+    def __init__(
+        self,
+        cost: np.ndarray,
+        col_lower: np.ndarray,
+        col_upper: np.ndarray,
+        start: np.ndarray,
+        index: np.ndarray,
+        value: np.ndarray,
+        row_lower: np.ndarray,
+        row_upper: np.ndarray,
+        row_names: List[str]
+    ):
+        super().__init__(cost, col_lower, col_upper, None, row_lower, row_upper, row_names)
+        self.start = start
+        self.index = index
+        self.value = value
+
+    @property
+    def num_cols(self) -> int:
+        return len(self.start) - 1
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.row_lower)
+
+    def columnwise(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.start, self.index, self.value
+
+    def activity(self, x: np.ndarray) -> np.ndarray:
+        columns = np.repeat(np.arange(self.num_cols), np.diff(self.start))
+        return np.bincount(self.index, weights=self.value * x[columns], minlength=self.num_rows)
+
+
+class ElasticProgram(LinearProgram):
+    """
+    LinearProgram whose nutrient bounds and ingredient inclusion limits may
+    be violated, at a penalty (see build_elastic_program)
+
+    Columns are the ingredients, then one slack per relaxable bound; rows
+    are the batch weight, then one per relaxable bound. Each slack
+    measures how far its bound is relaxed, in LP units (kg or kcal in the
+    batch, or kg of the ingredient).
+
+    Attributes:
+        num_ingredients: Number of ingredient columns
+        slack_constraints: (constraint, bound) relaxed by each slack column:
+            a nutrient with "min" or "max", or an ingredient name with
+            "min_inclusion" or "max_inclusion"
+        slack_required: The bound each slack relaxes, in requirement units
+            (percent, kcal/kg, or percent of the batch for inclusion limits)
+        slack_scale: LP units per requirement unit, for each slack
+    """
+
+    def __init__(
+        self,
+        program: LinearProgram,
+        num_ingredients: int,
+        slack_constraints: List[Tuple[str, str]],
+        slack_required: np.ndarray,
+        slack_scale: np.ndarray
+    ):
+        super().__init__(
+            program.cost, program.col_lower, program.col_upper, program.A,
+            program.row_lower, program.row_upper, program.row_names
+        )
+        self.num_ingredients = num_ingredients
+        self.slack_constraints = slack_constraints
+        self.slack_required = slack_required
+        self.slack_scale = slack_scale
+
+    def relaxed(self, x: np.ndarray) -> np.ndarray:
+        """How far each bound is relaxed by the solution x, in requirement units"""
+        return x[self.num_ingredients:] / self.slack_scale
+
+
+class ChanceProgram(LinearProgram):
+    """
+    LinearProgram whose nutrient bounds must hold with a given probability
+    (see build_chance_program)
+
+    Attributes:
+        z: Standard normal quantile of the probability
+        chance_rows: LP row of each chance-constrained bound
+        chance_sign: 1 where the bound is the row's minimum, -1 its maximum
+        variance: Variance of each bound's row coefficients, shape (k, n)
+    """
+
+    def __init__(
+        self,
+        program: LinearProgram,
+        z: float,
+        chance_rows: np.ndarray,
+        chance_sign: np.ndarray,
+        variance: np.ndarray
+    ):
+        super().__init__(
+            program.cost, program.col_lower, program.col_upper, program.A,
+            program.row_lower, program.row_upper, program.row_names
+        )
+        self.z = z
+        self.chance_rows = chance_rows
+        self.chance_sign = chance_sign
+        self.variance = variance
+
+    def bounds(self) -> np.ndarray:
+        """The bound of each chance constraint"""
+        return np.where(self.chance_sign > 0, self.row_lower[self.chance_rows], self.row_upper[self.chance_rows])
+
+    def violation(self, x: np.ndarray) -> np.ndarray:
+        """
+        How far x falls short of each chance constraint (<= 0 where it is
+        met), in standard deviations of the blend's level; relative to the
+        bound where the level does not vary
+        """
+        sd = np.sqrt(self.variance @ np.square(x))
+        bounds = self.bounds()
+        shortfall = self.chance_sign * (bounds - self.A[self.chance_rows] @ x) + self.z * sd
+        return shortfall / np.where(sd > 0, sd, np.maximum(np.abs(bounds), 1.0))
+
+    def cuts(self, x: np.ndarray, constraints: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Linear cuts (A, row_lower, row_upper) for the given chance
+        constraints at x
+
+        sqrt(variance @ x ** 2) is convex, so its tangent at x lies under
+        it everywhere: each cut holds for every blend that meets its
+        chance constraint, and is violated by x itself when x violates it.
+        """
+        sd = np.sqrt(self.variance[constraints] @ np.square(x))
+        gradient = self.variance[constraints] * x / np.where(sd > 0, sd, 1.0)[:, np.newaxis]
+        sign = self.chance_sign[constraints]
+        bounds = self.bounds()[constraints]
+        return (
+            self.A[self.chance_rows[constraints]] - (sign * self.z)[:, np.newaxis] * gradient,
+            np.where(sign > 0, bounds, -np.inf),
+            np.where(sign > 0, np.inf, bounds),
+        )
+
+
+class MixedIntegerProgram(LinearProgram):
+    """
+    LinearProgram with integer columns (see build_mixed_integer_program)
+
+    Columns are the ingredients, in kg or, for those bought in bags, in
+    whole bags; then, when the number of ingredients is limited, one
+    inclusion binary per ingredient.
+
+    Attributes:
+        integrality: Whether each column must take an integer value
+        num_ingredients: Number of ingredient columns
+        unit_kg: kg per unit of each ingredient column (its bag size, or 1)
+    """
+
+    def __init__(self, program: LinearProgram, integrality: np.ndarray, num_ingredients: int, unit_kg: np.ndarray):
+        super().__init__(
+            program.cost, program.col_lower, program.col_upper, program.A,
+            program.row_lower, program.row_upper, program.row_names
+        )
+        self.integrality = integrality
+        self.num_ingredients = num_ingredients
+        self.unit_kg = unit_kg
+
+    def quantities(self, x: np.ndarray) -> np.ndarray:
+        """kg of each ingredient in the solution x"""
+        return x[:self.num_ingredients] * self.unit_kg
+
+
+class PriorityProgram(LinearProgram):
+    """
+    LinearProgram with the formula's nutrition deviation as a second
+    objective (see build_priority_program)
+
+    Columns are the ingredients, then an over and an under column per
+    banded nutrient; rows are the LP's, then one target row per banded
+    nutrient, then the deviation row, whose upper bound caps the deviation
+    (inf by default).
+
+    Attributes:
+        num_ingredients: Number of ingredient columns
+        targets: Banded nutrients, in target row order
+        target_weights: Weight of each target's distance in the deviation
+        deviation_row: Index of the deviation row
+    """
+
+    def __init__(self, program: LinearProgram, num_ingredients: int, targets: List[str], target_weights: np.ndarray):
+        super().__init__(
+            program.cost, program.col_lower, program.col_upper, program.A,
+            program.row_lower, program.row_upper, program.row_names
+        )
+        self.num_ingredients = num_ingredients
+        self.targets = targets
+        self.target_weights = target_weights
+        self.deviation_row = program.num_rows - 1
+
+    def deviation_cost(self) -> np.ndarray:
+        """Objective that makes the LP minimize the deviation"""
+        cost = np.zeros(self.num_cols)
+        cost[self.num_ingredients:] = np.repeat(self.target_weights, 2)
+        return cost
+
+    def ingredient_cost(self) -> np.ndarray:
+        """Objective of the plain formulation: ingredient cost only"""
+        cost = np.zeros(self.num_cols)
+        cost[:self.num_ingredients] = self.cost[:self.num_ingredients]
+        return cost
+
+    def deviation(self, x: np.ndarray) -> float:
+        """Nutrition deviation of the ingredient quantities x[:num_ingredients]"""
+        rows = self.deviation_row - len(self.targets) + np.arange(len(self.targets))
+        n = self.num_ingredients
+        distance = np.abs(self.A[rows, :n] @ x[:n] - self.row_lower[rows])
+        return float(distance @ self.target_weights)
+
+
+def nutrient_bounds(requirements: NutritionalRequirement) -> List[Tuple[str, Optional[float], Optional[float]]]:
+    """
+    (nutrient, minimum, maximum) for every constrained nutrient, per kg of feed
+
+    Follows the rules the PuLP formulation always used: protein and energy
+    minimums always apply; calcium and phosphorus are only constrained
+    when their minimum is positive; fiber only has a maximum.
+    """
+    bounds = [
+        ("protein", requirements.min_protein_percentage / 100, _per_kg(requirements.max_protein_percentage, 100)),
+        ("energy", requirements.min_energy_kcal_per_kg, _per_kg(requirements.max_energy_kcal_per_kg, 1)),
+    ]
+    if requirements.min_calcium_percentage > 0:
+        bounds.append(("calcium", requirements.min_calcium_percentage / 100, _per_kg(requirements.max_calcium_percentage, 100)))
+    if requirements.min_phosphorus_percentage > 0:
+        bounds.append(("phosphorus", requirements.min_phosphorus_percentage / 100, _per_kg(requirements.max_phosphorus_percentage, 100)))
+    if requirements.max_fiber_percentage:
+        bounds.append(("fiber", None, requirements.max_fiber_percentage / 100))
+    return bounds
+
+
+def _per_kg(value: Optional[float], divisor: float) -> Optional[float]:
+    # A maximum of 0 or None means "no maximum", as in the PuLP formulation
+    return value / divisor if value else None
+
+
+def build_linear_program(
+    matrix: IngredientMatrix,
+    requirements: NutritionalRequirement,
+    batch_size_kg: float
+) -> LinearProgram:
+    """
+    Build the least-cost formulation LP for a batch of batch_size_kg
+
+    Args:
+        matrix: Available ingredients
+        requirements: Nutritional requirements to meet
+        batch_size_kg: Total weight of the batch
+
+    Returns:
+        LinearProgram with one row for the batch weight and one per constrained nutrient
+    """
+    bounds = nutrient_bounds(requirements)
+    nutrient_index = {name: i for i, name in enumerate(NUTRIENT_NAMES)}
+
+    A = np.empty((len(bounds) + 1, len(matrix)))
+    A[0] = 1.0
+    A[1:] = matrix.nutrients[[nutrient_index[name] for name, _, _ in bounds]]
+
+    row_lower = np.array([batch_size_kg] + [-np.inf if low is None else low * batch_size_kg for _, low, _ in bounds])
+    row_upper = np.array([batch_size_kg] + [np.inf if high is None else high * batch_size_kg for _, _, high in bounds])
+
+    return LinearProgram(
+        cost=matrix.prices,
+        col_lower=matrix.min_inclusion * (batch_size_kg / 100),
+        col_upper=matrix.max_inclusion * (batch_size_kg / 100),
+        A=A,
+        row_lower=row_lower,
+        row_upper=row_upper,
+        row_names=["total_weight"] + [name for name, _, _ in bounds],
+    )
+
+
+def build_elastic_program(
+    program: LinearProgram,
+    names: List[str],
+    batch_size_kg: float,
+    penalty: float = RELAXATION_PENALTY
+) -> ElasticProgram:
+    """
+    Goal-programming version of a formulation LP, feasible whenever there
+    is at least one ingredient
+
+    Every nutrient bound and ingredient inclusion limit becomes a one-sided
+    row with a slack column of its own (so even contradictory bounds can
+    be relaxed); the batch weight stays exact. A slack costs penalty times
+    the cost of the batch at the highest ingredient price for each
+    relaxation of 100% of its bound (of one unit, for bounds below 1), so
+    the optimum relaxes as little as it can in relative terms, then is the
+    cheapest formula with those relaxations. A program that is feasible as
+    it is gets no relaxation and the same formula.
+
+    Args:
+        program: LP from build_linear_program
+        names: Ingredient names, in column order
+        batch_size_kg: Total weight of the batch
+        penalty: Weight of relaxation against ingredient cost
+
+    Returns:
+        ElasticProgram with the ingredients' columns first
+    """
+    n = program.num_cols
+    factors = {name: factor for name, _, factor in NUTRIENTS}
+    inclusion = batch_size_kg / 100
+
+    # One (coefficients, constraint, bound, LP bound, scale, slack limit) per
+    # relaxable bound. Nutrient contents are never negative, so a minimum of
+    # 0 always holds, and no slack needs to exceed its bound or the most the
+    # batch could contain.
+    bounds = []
+    for row, name in enumerate(program.row_names[1:], start=1):
+        scale = batch_size_kg * factors[name]
+        low, high = program.row_lower[row], program.row_upper[row]
+        if low > 0:
+            bounds.append((program.A[row], name, "min", low, scale, low))
+        if np.isfinite(high):
+            bounds.append((program.A[row], name, "max", high, scale, batch_size_kg * program.A[row].max()))
+    identity = np.eye(n)
+    for j in range(n):
+        low, high = program.col_lower[j], program.col_upper[j]
+        if low > 0:
+            bounds.append((identity[j], names[j], "min_inclusion", low, inclusion, low))
+        if high < batch_size_kg:
+            bounds.append((identity[j], names[j], "max_inclusion", high, inclusion, batch_size_kg))
+
+    m = len(bounds)
+    is_min = np.array([bound.startswith("min") for _, _, bound, _, _, _ in bounds], dtype=bool)
+    limit = np.array([value for _, _, _, value, _, _ in bounds])
+    slack_scale = np.array([scale for _, _, _, _, scale, _ in bounds])
+    required = limit / slack_scale
+
+    A = np.zeros((1 + m, n + m))
+    A[0, :n] = 1.0
+    if m:
+        A[1:, :n] = np.array([coefficients for coefficients, *_ in bounds])
+    # A slack raises its row's activity to meet a minimum, or lowers it to a maximum
+    A[1 + np.arange(m), n + np.arange(m)] = np.where(is_min, 1.0, -1.0)
+
+    batch_cost = batch_size_kg * max(float(program.cost.max()), 1.0)
+    slack_cost = penalty * batch_cost / (slack_scale * np.maximum(np.abs(required), 1.0))
+
+    elastic = LinearProgram(
+        cost=np.concatenate([program.cost, slack_cost]),
+        col_lower=np.zeros(n + m),
+        col_upper=np.concatenate([np.full(n, batch_size_kg), [slack_limit for *_, slack_limit in bounds]]),
+        A=A,
+        row_lower=np.concatenate([program.row_lower[:1], np.where(is_min, limit, -np.inf)]),
+        row_upper=np.concatenate([program.row_upper[:1], np.where(is_min, np.inf, limit)]),
+        # Ingredient names may not be valid LP row names
+        row_names=program.row_names[:1] + [f"relax_{k}" for k in range(m)],
+    )
+    return ElasticProgram(elastic, n, [(name, bound) for _, name, bound, _, _, _ in bounds], required, slack_scale)
+
+
+def build_chance_program(program: LinearProgram, matrix: IngredientMatrix, probability: float) -> "ChanceProgram":
+    """
+    Formulation LP whose nutrient bounds must hold with the given
+    probability when ingredient contents vary from lot to lot
+
+    With each ingredient's contents normally distributed and independent
+    between lots, a blend x meets a minimum with probability p exactly when
+
+        mean @ x - z * sqrt(variance @ x ** 2) >= minimum
+
+    (z the p-quantile of the standard normal), and likewise a maximum with
+    + z. These constraints are convex but not linear: ChanceSolve meets
+    them by adding linear cuts to the LP. The LP's own nutrient rows stay,
+    since every chance constraint implies them. Minimums of 0 always hold
+    and nutrients with no variation keep their plain row only.
+
+    Args:
+        program: LP from build_linear_program
+        matrix: Ingredients in LP column order, with their nutrient_sd
+        probability: Probability of meeting each bound, at least 0.5
+
+    Returns:
+        ChanceProgram with the LP's columns and rows, and no cuts yet
+    """
+    nutrient_index = {name: i for i, name in enumerate(NUTRIENT_NAMES)}
+    rows, signs = [], []
+    for row, name in enumerate(program.row_names[1:], start=1):
+        if not matrix.nutrient_sd[nutrient_index[name]].any():
+            continue
+        if program.row_lower[row] > 0:
+            rows.append(row)
+            signs.append(1.0)
+        if np.isfinite(program.row_upper[row]):
+            rows.append(row)
+            signs.append(-1.0)
+
+    nutrients = [nutrient_index[program.row_names[row]] for row in rows]
+    return ChanceProgram(
+        program,
+        z=NormalDist().inv_cdf(probability),
+        chance_rows=np.array(rows, dtype=np.intp),
+        chance_sign=np.array(signs),
+        variance=np.square(matrix.nutrient_sd[nutrients]).reshape(len(rows), program.num_cols),
+    )
+
+
+def build_priority_program(program: LinearProgram) -> PriorityProgram:
+    """
+    Formulation LP that can trade ingredient cost against nutrition deviation
+
+    The deviation of a formula is how far its nutrients land from the
+    midpoints of their bands, in half band widths, averaged over the
+    nutrients with both a minimum and a maximum: 0 with every one of them
+    at its midpoint, 1 with every one at a bound. Each banded nutrient gets
+    a target row, activity - over + under = midpoint, and the deviation
+    row sums over + under, weighted, so capping it (epsilon constraint)
+    or minimizing it only changes bounds and costs, never the matrix.
+
+    Args:
+        program: LP from build_linear_program
+
+    Returns:
+        PriorityProgram whose cost is still the ingredient cost, with the
+        deviation uncapped
+    """
+    n = program.num_cols
+    banded = [
+        row for row in range(1, program.num_rows)
+        if np.isfinite(program.row_lower[row]) and np.isfinite(program.row_upper[row])
+    ]
+    k = len(banded)
+    midpoint = (program.row_lower[banded] + program.row_upper[banded]) / 2
+    half_width = np.maximum((program.row_upper[banded] - program.row_lower[banded]) / 2, 1e-12)
+
+    A = np.zeros((program.num_rows + k + 1, n + 2 * k))
+    A[:program.num_rows, :n] = program.A
+    target_rows = program.num_rows + np.arange(k)
+    A[target_rows, :n] = program.A[banded]
+    A[target_rows, n + 2 * np.arange(k)] = -1.0
+    A[target_rows, n + 2 * np.arange(k) + 1] = 1.0
+    weights = 1.0 / (max(k, 1) * half_width)
+    A[-1, n:] = np.repeat(weights, 2)
+
+    # Neither side can exceed the most the batch could contain of the nutrient
+    most = program.row_upper[0] * program.A[banded].max(axis=1, initial=0.0)
+    extended = LinearProgram(
+        cost=np.concatenate([program.cost, np.zeros(2 * k)]),
+        col_lower=np.concatenate([program.col_lower, np.zeros(2 * k)]),
+        col_upper=np.concatenate([program.col_upper, np.repeat(most, 2)]),
+        A=A,
+        row_lower=np.concatenate([program.row_lower, midpoint, [-np.inf]]),
+        row_upper=np.concatenate([program.row_upper, midpoint, [np.inf]]),
+        row_names=program.row_names + [f"target_{program.row_names[row]}" for row in banded] + ["deviation"],
+    )
+    return PriorityProgram(extended, n, [program.row_names[row] for row in banded], weights)
+
+
+def build_mixed_integer_program(
+    program: LinearProgram,
+    bag_size: np.ndarray,
+    max_ingredients: Optional[int] = None
+) -> MixedIntegerProgram:
+    """
+    Formulation MIP for the rules mills work by: ingredients in whole
+    bags, and at most max_ingredients ingredients
+
+    The column of an ingredient with a bag size counts its bags, its
+    inclusion limits rounded inwards to whole bags. With an ingredient
+    limit, each ingredient j gets a binary y_j, a row
+    x_j <= upper_j * y_j (so the ingredient is only used when it is
+    counted; one with a minimum inclusion always is), and
+    sum(y) <= max_ingredients.
+
+    Args:
+        program: LP from build_linear_program
+        bag_size: Bag size of each ingredient in kg (0: any quantity)
+        max_ingredients: Most ingredients the formula may use (None: any number)
+
+    Returns:
+        MixedIntegerProgram with the ingredients' columns first
+    """
+    n = program.num_cols
+    bagged = bag_size > 0
+    unit = np.where(bagged, bag_size, 1.0)
+    # Within rounding error of a whole bag counts as that bag
+    col_lower = np.where(bagged, np.ceil(program.col_lower / unit - 1e-9), program.col_lower)
+    col_upper = np.where(bagged, np.floor(program.col_upper / unit + 1e-9), program.col_upper)
+
+    if max_ingredients is None:
+        scaled = LinearProgram(
+            program.cost * unit, col_lower, col_upper, program.A * unit,
+            program.row_lower, program.row_upper, program.row_names
+        )
+        return MixedIntegerProgram(scaled, bagged, n, unit)
+
+    m = program.num_rows
+    A = np.zeros((m + n + 1, 2 * n))
+    A[:m, :n] = program.A * unit
+    A[m + np.arange(n), np.arange(n)] = 1.0
+    A[m + np.arange(n), n + np.arange(n)] = -col_upper
+    A[-1, n:] = 1.0
+
+    extended = LinearProgram(
+        cost=np.concatenate([program.cost * unit, np.zeros(n)]),
+        col_lower=np.concatenate([col_lower, (col_lower > 0).astype(np.float64)]),
+        col_upper=np.concatenate([col_upper, (col_upper > 0).astype(np.float64)]),
+        A=A,
+        row_lower=np.concatenate([program.row_lower, np.full(n + 1, -np.inf)]),
+        row_upper=np.concatenate([program.row_upper, np.zeros(n), [max_ingredients]]),
+        row_names=program.row_names + [f"include_{j}" for j in range(n)] + ["max_ingredients"],
+    )
+    return MixedIntegerProgram(extended, np.concatenate([bagged, np.ones(n, dtype=bool)]), n, unit)
+
+
+def binding_constraints(program: LinearProgram, x: np.ndarray, names: List[str], tol: float = 1e-6) -> List[str]:
+    """
+    Constraints held at their bound by the solution x
+
+    Rows are reported as "total_weight", "min_<nutrient>" or
+    "max_<nutrient>"; ingredient limits as "min_inclusion:<name>" or
+    "max_inclusion:<name>". Ingredients fixed at 0 (unavailable, or a 0%
+    maximum) are not reported.
+
+    Args:
+        program: The LP that was solved
+        x: Optimal kg of each ingredient
+        names: Ingredient names, in column order
+        tol: Absolute tolerance, scaled by the size of each bound
+
+    Returns:
+        Names of the binding constraints, rows first
+    """
+    activity = program.activity(x)
+    binding = []
+    for name, value, low, high in zip(program.row_names, activity, program.row_lower, program.row_upper):
+        if low == high:
+            binding.append(name)
+            continue
+        if np.isfinite(low) and value - low <= tol * max(1.0, abs(low)):
+            binding.append(f"min_{name}")
+        if np.isfinite(high) and high - value <= tol * max(1.0, abs(high)):
+            binding.append(f"max_{name}")
+
+    for name, value, low, high in zip(names, x, program.col_lower, program.col_upper):
+        if high <= 0:
+            continue
+        if low > 0 and value - low <= tol * max(1.0, low):
+            binding.append(f"min_inclusion:{name}")
+        # A 100% maximum can only bind when the ingredient is the whole batch,
+        # which the total weight row already reports
+        if high < program.row_upper[0] and high - value <= tol * max(1.0, high):
+            binding.append(f"max_inclusion:{name}")
+    return binding
@@ -0,0 +1,211 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# FEED_METRICS=false leaves the API uninstrumented: no middleware, no
+# /metrics, and stage() does nothing because no Profile is ever current
+FEED_METRICS = os.getenv("FEED_METRICS", "true").lower() in ("1", "true", "yes")
+
+# Stages of a formula request, in the order they happen:
+# - parse: reading and validating the request body
+# - requirements: resolving the default requirements for the birds
+# - build: the ingredient matrix and the LP (or MIP, ...) from it
+# - solve: the solver itself, in the worker
+# - pool: the round trip to a solver worker as the API sees it, including
+#   queueing, pickling and starting the worker process
+# - extract: the response from the solution
+# - serialize: the response model to JSON
+STAGES = ("parse", "requirements", "build", "solve", "pool", "extract", "serialize")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MODEL_SIZE_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Label values -> per-bucket counts (not cumulative; the last is +Inf), sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            pairs = [f'{name}="{value}"' for name, value in zip(self.labels, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                selector = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{selector}}} {cumulative}")
+            selector = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{selector} {total[0]}")
+            lines.append(f"{self.name}_count{selector} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Prometheus counter with one series per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            pairs = ",".join(f'{name}="{label}"' for name, label in zip(self.labels, labels))
+            lines.append(f"{self.name}_total{{{pairs}}} {value}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "feed_request_seconds", "Time from receiving a request to sending its last byte", ("route",), LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "feed_stage_seconds", "Time spent in each stage of a formula request", ("stage",), LATENCY_BUCKETS
+)
+SOLVER_STATUS = Counter("feed_solver_status", "Solves by solver and outcome", ("solver", "status"))
+MODEL_VARIABLES = Histogram("feed_model_variables", "Columns of the solved models", ("solver",), MODEL_SIZE_BUCKETS)
+MODEL_CONSTRAINTS = Histogram("feed_model_constraints", "Rows of the solved models", ("solver",), MODEL_SIZE_BUCKETS)
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS, SOLVER_STATUS, MODEL_VARIABLES, MODEL_CONSTRAINTS)
+
+# Observations come from the event loop and from session threads
+_metrics_lock = threading.Lock()
+
+
+class Profile:
+    """
+    Timings of one request's stages, and the solves it made
+
+    A request handled by the API gets a Profile for its duration; work sent
+    to a solver worker runs under a Profile of its own, which comes back
+    with the result and is merged in (see profiled). A stage can occur
+    several times, e.g. once per formula of a batch.
+
+    Attributes:
+        start: perf_counter() when the request arrived
+        route: Path of the route that handled the request
+        handler_done: perf_counter() when the endpoint returned, if it has
+        stages: (stage, seconds) in the order they finished
+        solves: (solver, status, variables, constraints) of each solve
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route: Optional[str] = None
+        self.handler_done: Optional[float] = None
+        self.stages: List[Tuple[str, float]] = []
+        self.solves: List[Tuple[str, str, int, int]] = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+
+    def merge(self, other: "Profile") -> None:
+        self.stages.extend(other.stages)
+        self.solves.extend(other.solves)
+
+    def server_timing(self) -> str:
+        """Stage totals as a Server-Timing header value, in ms"""
+        totals: Dict[str, List[float]] = {}
+        for stage, seconds in self.stages:
+            total = totals.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+        entries = [
+            f'{stage};dur={seconds * 1000:.3f}' + (f';desc="{count} calls"' if count > 1 else "")
+            for stage, (seconds, count) in totals.items()
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_profile: ContextVar[Optional[Profile]] = ContextVar("feed_profile", default=None)
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.started)
+
+
+_NOT_PROFILED = contextlib.nullcontext()
+
+
+def stage(name: str):
+    """Context manager timing a stage into the current Profile, if there is one"""
+    profile = _profile.get()
+    return _NOT_PROFILED if profile is None else _Stage(profile, name)
+
+
+def record_solve(solver: str, status: str, variables: int, constraints: int) -> None:
+    """Note a solve's outcome and model size in the current Profile, if there is one"""
+    profile = _profile.get()
+    if profile is not None:
+        profile.solves.append((solver, status, variables, constraints))
+
+
+def current_profile() -> Optional[Profile]:
+    return _profile.get()
+
+
+@contextlib.contextmanager
+def profiling(profile: Profile):
+    """Make profile the current Profile within the block"""
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def profiled(fn: Callable, *args):
+    """Run fn(*args) under a new Profile; returns (result, profile). Sent to solver workers."""
+    with profiling(Profile()) as profile:
+        return fn(*args), profile
+
+
+def observe(profile: Profile) -> None:
+    """Add a finished request's Profile to the metrics"""
+    with _metrics_lock:
+        REQUEST_SECONDS.observe(time.perf_counter() - profile.start, profile.route or "unmatched")
+        for name, seconds in profile.stages:
+            STAGE_SECONDS.observe(seconds, name)
+        for solver, status, variables, constraints in profile.solves:
+            SOLVER_STATUS.inc(solver, status)
+            MODEL_VARIABLES.observe(variables, solver)
+            MODEL_CONSTRAINTS.observe(constraints, solver)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    with _metrics_lock:
+        return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
@@ -42,6 +42,15 @@ class Ingredient(BaseModel):
     fiber_percentage: Optional[float] = Field(0, ge=0, le=100)
     max_inclusion_percentage: Optional[float] = Field(100, ge=0, le=100)
     min_inclusion_percentage: Optional[float] = Field(0, ge=0, le=100)
+    # Lot-to-lot standard deviation of each nutrient field, in its units
+    # (None: the value is exact); only used with compliance_probability
+    protein_percentage_sd: Optional[float] = Field(None, ge=0)
+    energy_kcal_per_kg_sd: Optional[float] = Field(None, ge=0)
+    calcium_percentage_sd: Optional[float] = Field(None, ge=0)
+    phosphorus_percentage_sd: Optional[float] = Field(None, ge=0)
+    fiber_percentage_sd: Optional[float] = Field(None, ge=0)
+    bag_size_kg: Optional[float] = Field(None, ge=0, description="Bag size the ingredient is bought in, used instead of "
+                                                                 "the request's in a MIP solve (0: weighed to any quantity)")
 
 
 class NutritionalRequirement(BaseModel):
@@ -69,17 +78,97 @@ class NutritionalRequirement(BaseModel):
         return v
 
 
-class FormulaRequest(BaseModel):
-    """Request model for feed formula generation"""
+class FormulaParameters(BaseModel):
+    """Everything a formula request specifies besides its ingredients"""
     bird_type: BirdType
     bird_age: int = Field(..., gt=0, description="Age of birds in days")
     production_stage: ProductionStage
     target_nutrition: TargetNutrition = TargetNutrition.BALANCED
     batch_size_kg: Optional[float] = Field(100.0, gt=0, description="Size of batch to produce in kg")
-    ingredients: List[Ingredient]
     custom_requirements: Optional[NutritionalRequirement] = None
     cost_optimization_priority: float = Field(1.0, ge=0, le=1.0, 
-                                             description="Priority given to cost optimization vs. nutritional optimization (0-1)")
+                                             description="Priority given to cost optimization vs. nutritional optimization (0-1): "
+                                                         "1 is the least-cost formula, 0 the cheapest formula closest to the "
+                                                         "midpoints of the nutrient ranges")
+    include_sensitivity: bool = Field(False, description="Report shadow prices, reduced costs and price ranges")
+    allow_relaxation: bool = Field(False, description="If the requirements cannot all be met, return the cheapest "
+                                                      "formula that relaxes them least, and the relaxations")
+    compliance_probability: Optional[float] = Field(None, ge=0.5, lt=1,
+                                                    description="Meet each nutrient requirement with this probability, "
+                                                                "given the ingredients' *_sd fields, and report the "
+                                                                "compliance of sampled lots (0.5: the plain formula)")
+    compliance_samples: int = Field(100_000, ge=1_000, le=1_000_000,
+                                    description="Sampled ingredient lots in the compliance check")
+    max_ingredients: Optional[int] = Field(None, ge=1, description="Use at most this many ingredients (solved as a MIP)")
+    bag_size_kg: Optional[float] = Field(None, gt=0, description="Use ingredients in whole bags of this size, unless they "
+                                                                 "have a bag_size_kg of their own (solved as a MIP)")
+    time_limit_seconds: float = Field(10.0, gt=0, le=300, description="Wall-clock limit of a MIP solve: the best formula "
+                                                                      "found by then is returned, with its gap")
+    mip_gap: float = Field(1e-4, ge=0, lt=1, description="Relative gap to the best possible cost at which a MIP solve "
+                                                         "stops early")
+
+    @validator('include_sensitivity')
+    def sensitivity_needs_least_cost(cls, v, values):
+        if v and values.get('cost_optimization_priority', 1.0) < 1:
+            raise ValueError('include_sensitivity requires a cost_optimization_priority of 1')
+        return v
+
+    @validator('allow_relaxation')
+    def relaxation_excludes_sensitivity(cls, v, values):
+        if v and values.get('include_sensitivity'):
+            raise ValueError('allow_relaxation cannot be combined with include_sensitivity')
+        if v and values.get('cost_optimization_priority', 1.0) < 1:
+            raise ValueError('allow_relaxation requires a cost_optimization_priority of 1')
+        return v
+
+    @validator('compliance_probability')
+    def compliance_needs_least_cost(cls, v, values):
+        if v is not None and values.get('cost_optimization_priority', 1.0) < 1:
+            raise ValueError('compliance_probability requires a cost_optimization_priority of 1')
+        if v is not None and (values.get('include_sensitivity') or values.get('allow_relaxation')):
+            raise ValueError('compliance_probability cannot be combined with include_sensitivity or allow_relaxation')
+        return v
+
+    @validator('max_ingredients', 'bag_size_kg')
+    def integer_mode_needs_plain_formula(cls, v, values):
+        if v is not None and (values.get('include_sensitivity') or values.get('allow_relaxation')
+                              or values.get('compliance_probability') is not None
+                              or values.get('cost_optimization_priority', 1.0) < 1):
+            raise ValueError('max_ingredients and bag_size_kg cannot be combined with include_sensitivity, '
+                             'allow_relaxation, compliance_probability or a cost_optimization_priority below 1')
+        return v
+
+
+class FormulaRequest(FormulaParameters):
+    """Request model for feed formula generation"""
+    ingredients: List[Ingredient]
+
+
+class FrontierRequest(FormulaRequest):
+    """Request model for the cost/nutrition trade-off of a formula request"""
+    points: int = Field(20, ge=2, le=100, description="Number of formulas, from priority 1 (least cost) to 0 (closest to target)")
+
+    @validator('points', always=True)
+    def frontier_excludes_other_modes(cls, v, values):
+        if values.get('compliance_probability') is not None:
+            raise ValueError('compliance_probability is not supported on the frontier')
+        if values.get('max_ingredients') is not None or values.get('bag_size_kg') is not None:
+            raise ValueError('max_ingredients and bag_size_kg are not supported on the frontier')
+        return v
+
+
+class LibraryFormulaRequest(FormulaParameters):
+    """Request model for a formula from the ingredients of a stored library"""
+    ingredient_ids: Optional[List[str]] = Field(None, description="Library ingredients to use (None: all of them)")
+    prices: Dict[str, float] = Field(default_factory=dict, description="Price per kg overrides by ingredient id")
+    unavailable: List[str] = Field(default_factory=list, description="Library ingredients not to use this time")
+
+    @validator('prices')
+    def prices_must_be_positive(cls, v):
+        for name, price in v.items():
+            if price <= 0:
+                raise ValueError(f'price for {name} must be greater than 0')
+        return v
 
 
 class IngredientResult(BaseModel):
@@ -93,6 +182,19 @@ class IngredientResult(BaseModel):
     calcium_contribution: Optional[float] = 0
     phosphorus_contribution: Optional[float] = 0
     fiber_contribution: Optional[float] = 0
+    bags: Optional[int] = Field(None, description="Whole bags of the ingredient, with bag_size_kg")
+
+
+class NutrientCheck(BaseModel):
+    """Level of one nutrient in the formula against its requirement"""
+    nutrient: str
+    minimum: Optional[float] = Field(None, description="Required minimum, in requirement units")
+    maximum: Optional[float] = Field(None, description="Required maximum, in requirement units")
+    value: float = Field(..., description="Level in the formula, in requirement units")
+    slack: Optional[float] = Field(None, description="Distance to the nearest bound when within them; "
+                                                     "None when the nutrient has no bound")
+    violation: float = Field(0, description="Distance outside the violated bound, 0 when within them")
+    satisfied: bool
 
 
 class NutritionResult(BaseModel):
@@ -103,6 +205,74 @@ class NutritionResult(BaseModel):
     phosphorus_percentage: float
     fiber_percentage: float
     meets_requirements: bool
+    checks: List[NutrientCheck] = Field(default_factory=list, description="One check per nutrient, in the order above")
+
+
+class ConstraintSensitivity(BaseModel):
+    """Shadow price of one constraint of the formula"""
+    constraint: str = Field(..., description="total_weight or a nutrient name")
+    minimum: Optional[float] = Field(None, description="Required minimum, in requirement units")
+    maximum: Optional[float] = Field(None, description="Required maximum, in requirement units")
+    value: float = Field(..., description="Level in the formula, in requirement units")
+    binding: Optional[str] = Field(None, description="min, max or fixed when the constraint is at its bound")
+    dual: float = Field(..., description="Change in batch cost per kg (or kcal) of nutrient in the batch")
+    shadow_price: float = Field(..., description="Change in batch cost per unit of the requirement "
+                                                 "(percentage point, kcal/kg, or kg of batch)")
+
+
+class IngredientSensitivity(BaseModel):
+    """Reduced cost and price range of one ingredient"""
+    name: str
+    quantity_kg: float
+    price_per_kg: float
+    reduced_cost: float = Field(..., description="Change in batch cost per kg of the ingredient forced into the formula; "
+                                                  "for an unused ingredient, the price drop before it enters")
+    price_lower: Optional[float] = Field(None, description="Lowest price at which the formula stays optimal (None: no limit)")
+    price_upper: Optional[float] = Field(None, description="Highest price at which the formula stays optimal (None: no limit)")
+
+
+class SensitivityReport(BaseModel):
+    """Sensitivity of an optimal formula, from the same solve"""
+    constraints: List[ConstraintSensitivity]
+    ingredients: List[IngredientSensitivity]
+    ranging_available: bool = Field(True, description="False when the solver does not report price ranges")
+
+
+class Relaxation(BaseModel):
+    """A requirement the formula had to relax to be feasible"""
+    constraint: str = Field(..., description="Nutrient name, or ingredient name for an inclusion limit")
+    bound: str = Field(..., description="min or max for a nutrient, min_inclusion or max_inclusion for an ingredient")
+    required: float = Field(..., description="Requested bound, in requirement units (percent of the batch for inclusion)")
+    relaxed_to: float = Field(..., description="Bound the formula meets instead")
+    amount: float = Field(..., description="How far the bound was relaxed")
+
+
+class NutrientCompliance(BaseModel):
+    """How one nutrient fared over the sampled ingredient lots"""
+    nutrient: str
+    mean: float = Field(..., description="Mean level over the samples, in requirement units")
+    sd: float = Field(..., description="Standard deviation of the level over the samples")
+    below_minimum: Optional[float] = Field(None, description="Fraction of samples below the minimum (None: no minimum)")
+    above_maximum: Optional[float] = Field(None, description="Fraction of samples above the maximum (None: no maximum)")
+    compliance_rate: float = Field(..., description="Fraction of samples within both bounds")
+
+
+class ComplianceReport(BaseModel):
+    """Monte Carlo check of a formula against lot-to-lot nutrient variation"""
+    probability: float = Field(..., description="Requested probability of meeting each requirement")
+    samples: int = Field(..., description="Sampled ingredient lots")
+    compliance_rate: float = Field(..., description="Fraction of samples meeting every requirement at once")
+    nutrients: List[NutrientCompliance] = Field(..., description="Each constrained nutrient, in NUTRIENTS order")
+
+
+class MipReport(BaseModel):
+    """How the integer (MIP) solve of a formula ended"""
+    status: str = Field(..., description="Optimal (within mip_gap), or Solution Found when stopped by the time limit")
+    gap: Optional[float] = Field(None, description="Relative gap between the formula's cost and the best bound "
+                                                   "(None: not reported by the solver)")
+    best_bound: Optional[float] = Field(None, description="Lowest batch cost any formula could have, as proven by the solver")
+    nodes: Optional[int] = Field(None, description="Branch-and-bound nodes explored")
+    solve_seconds: float = Field(..., description="Wall-clock time of the solve")
 
 
 class FormulaResponse(BaseModel):
@@ -118,4 +288,136 @@ class FormulaResponse(BaseModel):
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
     notes: Optional[str] = None
     optimization_success: bool = True
-    optimization_message: Optional[str] = None
\ No newline at end of file
+    optimization_message: Optional[str] = None
+    sensitivity: Optional[SensitivityReport] = None
+    relaxations: Optional[List[Relaxation]] = Field(None, description="With allow_relaxation, the requirements "
+                                                                      "relaxed to find a formula (empty if none)")
+    nutrition_deviation: Optional[float] = Field(None, description="With a cost_optimization_priority below 1, the mean "
+                                                                   "distance of the banded nutrients from the midpoints "
+                                                                   "of their ranges, in half range widths")
+    compliance: Optional[ComplianceReport] = Field(None, description="With compliance_probability, how often "
+                                                                     "sampled lots of the formula meet the requirements")
+    mip: Optional[MipReport] = Field(None, description="With max_ingredients or bag_size_kg, how the MIP solve ended")
+
+
+class FrontierPoint(BaseModel):
+    """One formula on the cost/nutrition frontier"""
+    cost_optimization_priority: float
+    total_cost: float
+    nutrition_deviation: float = Field(..., description="Mean distance of the banded nutrients from the midpoints "
+                                                        "of their ranges, in half range widths")
+    formula: FormulaResponse
+
+
+class FrontierResponse(BaseModel):
+    """Response model for the cost/nutrition frontier of a request"""
+    bird_type: BirdType
+    production_stage: ProductionStage
+    batch_size_kg: float
+    points: List[FrontierPoint] = Field(..., description="From least cost to closest to target")
+    optimization_success: bool = True
+    optimization_message: Optional[str] = None
+    solves: int = Field(0, description="LP solves the frontier took")
+    simplex_iterations: Optional[int] = Field(None, description="Simplex iterations over those solves (HiGHS only)")
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one request in a batch; a failure only affects its own item"""
+    index: int = 0
+    success: bool
+    result: Optional[FormulaResponse] = None
+    error: Optional[str] = None
+
+
+class BatchFormulaResponse(BaseModel):
+    """Response model for a batch of feed formulas, in request order"""
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+class FormulaDelta(BaseModel):
+    """Changes to a formula session's ingredients, by ingredient name"""
+    prices: Dict[str, float] = Field(default_factory=dict, description="New price per kg")
+    availability: Dict[str, bool] = Field(default_factory=dict, description="Whether each ingredient can be used")
+
+    @validator('prices')
+    def prices_must_be_positive(cls, v):
+        for name, price in v.items():
+            if price <= 0:
+                raise ValueError(f'price for {name} must be greater than 0')
+        return v
+
+
+class LibraryInfo(BaseModel):
+    """Response model for a stored ingredient library"""
+    library_id: str = Field(..., description="SHA-256 of the library's ingredients; changes with any edit")
+    ingredient_count: int
+    ingredients: Optional[List[Ingredient]] = None
+
+
+class SessionFormulaResponse(BaseModel):
+    """Response model for a formula session after its latest solve"""
+    session_id: str
+    formula: FormulaResponse
+    binding_constraints: List[str] = Field(default_factory=list,
+                                           description="Constraints held at their bound by the optimal formula")
+    simplex_iterations: int = 0
+    warm_start: bool = False
+
+
+class InventoryIngredient(Ingredient):
+    """Ingredient with the stock available to a whole lifecycle plan"""
+    stock_kg: Optional[float] = Field(None, ge=0, description="Stock for the whole plan in kg (None: unlimited)")
+
+
+class LifecyclePlanRequest(BaseModel):
+    """Request model for a least-cost feeding plan over a flock's life"""
+    bird_type: BirdType
+    flock_size: int = Field(..., gt=0, description="Number of birds")
+    start_age_days: int = Field(1, gt=0, description="Age of the birds on the first day of the plan")
+    end_age_days: int = Field(..., gt=0, description="Age of the birds on the last day of the plan")
+    period_days: int = Field(7, gt=0, description="Days fed the same formula, unless the stage changes sooner")
+    target_nutrition: TargetNutrition = TargetNutrition.BALANCED
+    ingredients: List[InventoryIngredient]
+
+    @validator('end_age_days')
+    def end_age_must_not_precede_start(cls, v, values):
+        if 'start_age_days' in values and v < values['start_age_days']:
+            raise ValueError('end_age_days must not be before start_age_days')
+        return v
+
+
+class PlanSummary(BaseModel):
+    """First line of a lifecycle plan"""
+    kind: str = "summary"
+    bird_type: BirdType
+    flock_size: int
+    start_age_days: int
+    end_age_days: int
+    periods: int
+    total_feed_kg: float
+    total_cost: float
+    cost_per_bird: float
+    optimization_success: bool = True
+    optimization_message: Optional[str] = None
+
+
+class PlanPeriod(BaseModel):
+    """Formula fed over one period of a lifecycle plan"""
+    kind: str = "period"
+    period: int
+    start_age_days: int
+    end_age_days: int
+    production_stage: ProductionStage
+    feed_kg: float
+    formula: FormulaResponse
+
+
+class PlanInventory(BaseModel):
+    """Use of one stocked ingredient over a lifecycle plan"""
+    kind: str = "inventory"
+    name: str
+    stock_kg: float
+    used_kg: float
+    remaining_kg: float
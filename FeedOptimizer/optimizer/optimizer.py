@@ -1,275 +1,722 @@
-import pulp
 import logging
-from typing import Dict, Optional, List
+import math
+from typing import Dict, Optional, List, Tuple
+import numpy as np
 import pandas as pd
 
 from optimizer.models import (
+    BatchItemResult,
+    ComplianceReport,
+    ConstraintSensitivity,
+    FormulaParameters,
     FormulaRequest, 
     FormulaResponse, 
-    IngredientResult, 
+    FrontierPoint,
+    FrontierRequest,
+    FrontierResponse,
+    IngredientSensitivity,
+    LibraryFormulaRequest,
+    MipReport,
+    NutritionalRequirement,
     NutritionResult, 
     ProductionStage, 
+    Relaxation,
+    SensitivityReport,
     BirdType,
     TargetNutrition
 )
+from optimizer.library import IngredientLibrary
+from optimizer.matrix import (
+    NUTRIENT_NAMES,
+    NUTRIENTS,
+    ChanceProgram,
+    ElasticProgram,
+    IngredientMatrix,
+    LinearProgram,
+    MixedIntegerProgram,
+    PriorityProgram,
+    binding_constraints,
+    build_chance_program,
+    build_elastic_program,
+    build_linear_program,
+    build_mixed_integer_program,
+    build_priority_program
+)
+from optimizer.metrics import record_solve, stage
+from optimizer.solvers import SOLUTION_FOUND, ChanceSolve, PrioritySweep, SolverResult, get_solver
 from optimizer.utils import get_default_requirements
 
 # Configure logging
 logger = logging.getLogger("feed-optimizer.optimizer")
 
-def generate_feed_formula(request: FormulaRequest) -> FormulaResponse:
+# Relative tolerance, scaled by the size of each bound, within which a
+# nutrient level still meets its requirement
+NUTRITION_TOLERANCE = 1e-6
+
+# Nutrient levels are reported per kg of feed in the Ingredient field's
+# units, rounded to whole kcal for energy and 2 decimals otherwise; each
+# ingredient's kg, percentage, cost and contributions as in _RESULT_DECIMALS
+_NUTRIENT_FACTORS = np.array([factor for _, _, factor in NUTRIENTS])
+_NUTRITION_FIELDS = tuple(field for _, field, _ in NUTRIENTS)
+_LEVEL_DECIMALS = np.array([0 if name == "energy" else 2 for name in NUTRIENT_NAMES])
+_RESULT_DECIMALS = np.array([3, 2, 2] + [0 if name == "energy" else 3 for name in NUTRIENT_NAMES])
+_INGREDIENT_RESULT_FIELDS = (
+    "name", "quantity_kg", "percentage", "cost",
+    *(f"{name}_contribution" for name in NUTRIENT_NAMES),
+)
+
+# Seed of the compliance check's samples, so a formula always gets the same report
+COMPLIANCE_SEED = 0
+
+
+def generate_feed_formula(request: FormulaRequest, solver: Optional[str] = None) -> FormulaResponse:
     """
     Generate an optimized feed formula based on nutritional requirements
     and available ingredients
     
     Args:
         request: FormulaRequest object containing all parameters
+        solver: Solver name ("highs" or "cbc"); defaults to FEED_OPTIMIZER_SOLVER
         
     Returns:
         FormulaResponse object with the optimized formula
     """
-    logger.info(f"Starting feed formula optimization for {request.bird_type}")
+    response, _ = solve_feed_formula(request, solver)
+    return response
+
+
+def solve_feed_formula(
+    request: FormulaRequest,
+    solver: Optional[str] = None
+) -> Tuple[FormulaResponse, Optional[SolverResult]]:
+    """
+    generate_feed_formula, also returning the raw solve
     
-    # Get nutritional requirements based on bird type, age, stage
-    requirements = get_default_requirements(
-        request.bird_type, 
-        request.bird_age, 
-        request.production_stage,
-        request.target_nutrition
-    )
+    The SolverResult (quantities of the available ingredients, in request
+    order) is what the solution cache stores; it is None when there was
+    nothing to solve.
+    """
+    logger.info(f"Starting feed formula optimization for {request.bird_type}")
     
-    # Override with custom requirements if provided
-    if request.custom_requirements:
-        requirements = request.custom_requirements
+    requirements = request_requirements(request)
     
     # Filter available ingredients
     available_ingredients = [i for i in request.ingredients if i.available]
     
     if len(available_ingredients) == 0:
-        return FormulaResponse(
-            formula_name=f"{request.bird_type} {request.production_stage} Formula",
-            bird_type=request.bird_type,
-            production_stage=request.production_stage,
-            ingredients=[],
-            nutrition=NutritionResult(
-                protein_percentage=0,
-                energy_kcal_per_kg=0,
-                calcium_percentage=0,
-                phosphorus_percentage=0,
-                fiber_percentage=0,
-                meets_requirements=False
-            ),
-            total_cost=0,
-            cost_per_kg=0,
-            batch_size_kg=request.batch_size_kg,
-            optimization_success=False,
-            optimization_message="No available ingredients for optimization"
-        )
+        return failed_response(request, "No available ingredients for optimization"), None
     
     try:
-        # Create optimization model
-        model = pulp.LpProblem("FeedFormulaOptimization", pulp.LpMinimize)
-        
-        # Create decision variables for each ingredient (kg to include)
-        ingredient_vars = {
-            ingredient.name: pulp.LpVariable(
-                f"ingredient_{ingredient.name}", 
-                lowBound=ingredient.min_inclusion_percentage * request.batch_size_kg / 100,  
-                upBound=ingredient.max_inclusion_percentage * request.batch_size_kg / 100
-            ) 
-            for ingredient in available_ingredients
-        }
-        
-        # Objective function: minimize cost
-        model += pulp.lpSum([
-            ingredient_vars[ingredient.name] * ingredient.price_per_kg 
-            for ingredient in available_ingredients
-        ]), "Total_Cost"
-        
-        # Constraints
-        
-        # Total weight constraint
-        model += pulp.lpSum(list(ingredient_vars.values())) == request.batch_size_kg, "Total_Weight"
-        
-        # Protein constraints
-        protein_content = pulp.lpSum([
-            ingredient_vars[ingredient.name] * ingredient.protein_percentage / 100
-            for ingredient in available_ingredients
-        ])
-        
-        model += protein_content >= requirements.min_protein_percentage * request.batch_size_kg / 100, "Min_Protein"
-        
-        if requirements.max_protein_percentage:
-            model += protein_content <= requirements.max_protein_percentage * request.batch_size_kg / 100, "Max_Protein"
-        
-        # Energy constraints
-        energy_content = pulp.lpSum([
-            ingredient_vars[ingredient.name] * ingredient.energy_kcal_per_kg
-            for ingredient in available_ingredients
-        ])
-        
-        model += energy_content >= requirements.min_energy_kcal_per_kg * request.batch_size_kg, "Min_Energy"
-        
-        if requirements.max_energy_kcal_per_kg:
-            model += energy_content <= requirements.max_energy_kcal_per_kg * request.batch_size_kg, "Max_Energy"
-        
-        # Calcium constraints
-        if requirements.min_calcium_percentage > 0:
-            calcium_content = pulp.lpSum([
-                ingredient_vars[ingredient.name] * ingredient.calcium_percentage / 100
-                for ingredient in available_ingredients
-            ])
-            
-            model += calcium_content >= requirements.min_calcium_percentage * request.batch_size_kg / 100, "Min_Calcium"
-            
-            if requirements.max_calcium_percentage:
-                model += calcium_content <= requirements.max_calcium_percentage * request.batch_size_kg / 100, "Max_Calcium"
-        
-        # Phosphorus constraints
-        if requirements.min_phosphorus_percentage > 0:
-            phosphorus_content = pulp.lpSum([
-                ingredient_vars[ingredient.name] * ingredient.phosphorus_percentage / 100
-                for ingredient in available_ingredients
-            ])
-            
-            model += phosphorus_content >= requirements.min_phosphorus_percentage * request.batch_size_kg / 100, "Min_Phosphorus"
-            
-            if requirements.max_phosphorus_percentage:
-                model += phosphorus_content <= requirements.max_phosphorus_percentage * request.batch_size_kg / 100, "Max_Phosphorus"
-        
-        # Fiber constraint
-        if requirements.max_fiber_percentage:
-            fiber_content = pulp.lpSum([
-                ingredient_vars[ingredient.name] * ingredient.fiber_percentage / 100
-                for ingredient in available_ingredients
-            ])
-            
-            model += fiber_content <= requirements.max_fiber_percentage * request.batch_size_kg / 100, "Max_Fiber"
+        # Build the LP in matrix form from the ingredient columns
+        with stage("build"):
+            matrix = IngredientMatrix.from_ingredients(available_ingredients)
+            program = formulation_program(request, requirements, matrix)
         
         # Solve the model
-        logger.info("Running optimization solver")
-        result = model.solve()
+        logger.info(f"Running optimization solver {get_solver(solver).name}")
+        solution = solve_program(request, program, solver)
         
         # Check if the model was solved successfully
-        if result != pulp.LpStatusOptimal:
-            logger.warning(f"Optimization failed with status: {pulp.LpStatus[result]}")
-            return FormulaResponse(
-                formula_name=f"{request.bird_type} {request.production_stage} Formula",
-                bird_type=request.bird_type,
-                production_stage=request.production_stage,
-                ingredients=[],
-                nutrition=NutritionResult(
-                    protein_percentage=0,
-                    energy_kcal_per_kg=0,
-                    calcium_percentage=0,
-                    phosphorus_percentage=0,
-                    fiber_percentage=0,
-                    meets_requirements=False
-                ),
-                total_cost=0,
-                cost_per_kg=0,
-                batch_size_kg=request.batch_size_kg,
-                optimization_success=False,
-                optimization_message=f"Optimization failed: {pulp.LpStatus[result]}"
-            )
+        if not solution.has_solution:
+            logger.warning(f"Optimization failed with status: {solution.status}")
+            return failed_response(request, f"Optimization failed: {solution.status}"), solution
         
-        # Extract results
-        logger.info("Extracting optimization results")
-        ingredient_results = []
-        total_protein = 0
-        total_energy = 0
-        total_calcium = 0
-        total_phosphorus = 0
-        total_fiber = 0
-        total_cost = 0
+        response = optimal_response(request, requirements, matrix, program, solution)
+        logger.info(f"Optimization completed with {len(response.ingredients)} ingredients and total cost: {response.total_cost:.2f}")
+        return response, solution
         
-        for ingredient in available_ingredients:
-            quantity = ingredient_vars[ingredient.name].value()
-            
-            # Skip ingredients with zero or very small quantities
-            if quantity is None or quantity < 0.001:
-                continue
-                
-            percentage = (quantity / request.batch_size_kg) * 100
-            cost = quantity * ingredient.price_per_kg
-            
-            protein_contrib = quantity * ingredient.protein_percentage / 100
-            energy_contrib = quantity * ingredient.energy_kcal_per_kg
-            calcium_contrib = quantity * ingredient.calcium_percentage / 100
-            phosphorus_contrib = quantity * ingredient.phosphorus_percentage / 100
-            fiber_contrib = quantity * ingredient.fiber_percentage / 100
-            
-            total_protein += protein_contrib
-            total_energy += energy_contrib
-            total_calcium += calcium_contrib
-            total_phosphorus += phosphorus_contrib
-            total_fiber += fiber_contrib
-            total_cost += cost
-            
-            ingredient_results.append(
-                IngredientResult(
-                    name=ingredient.name,
-                    quantity_kg=round(quantity, 3),
-                    percentage=round(percentage, 2),
-                    cost=round(cost, 2),
-                    protein_contribution=round(protein_contrib, 3),
-                    energy_contribution=round(energy_contrib, 0),
-                    calcium_contribution=round(calcium_contrib, 3),
-                    phosphorus_contribution=round(phosphorus_contrib, 3),
-                    fiber_contribution=round(fiber_contrib, 3)
-                )
-            )
+    except Exception as e:
+        logger.error(f"Error in feed formula optimization: {str(e)}")
+        raise
+
+
+def generate_library_formula(
+    request: LibraryFormulaRequest,
+    library: IngredientLibrary,
+    solver: Optional[str] = None
+) -> FormulaResponse:
+    """
+    Generate an optimized feed formula from the ingredients of a library
+    
+    The LP columns are sliced from the library's matrix, and the response
+    is built from them too: no Ingredient model is rebuilt.
+    
+    Args:
+        request: LibraryFormulaRequest with ingredient ids and price overrides
+        library: Library the ids refer to
+        solver: Solver name ("highs" or "cbc"); defaults to FEED_OPTIMIZER_SOLVER
         
-        # Calculate final nutritional values
-        protein_percentage = (total_protein / request.batch_size_kg) * 100
-        energy_kcal_per_kg = total_energy / request.batch_size_kg
-        calcium_percentage = (total_calcium / request.batch_size_kg) * 100
-        phosphorus_percentage = (total_phosphorus / request.batch_size_kg) * 100
-        fiber_percentage = (total_fiber / request.batch_size_kg) * 100
+    Returns:
+        FormulaResponse object with the optimized formula
         
-        # Determine if formula meets all requirements
-        meets_requirements = (
-            protein_percentage >= requirements.min_protein_percentage and
-            (requirements.max_protein_percentage is None or protein_percentage <= requirements.max_protein_percentage) and
-            energy_kcal_per_kg >= requirements.min_energy_kcal_per_kg and
-            (requirements.max_energy_kcal_per_kg is None or energy_kcal_per_kg <= requirements.max_energy_kcal_per_kg) and
-            calcium_percentage >= requirements.min_calcium_percentage and
-            (requirements.max_calcium_percentage is None or calcium_percentage <= requirements.max_calcium_percentage) and
-            phosphorus_percentage >= requirements.min_phosphorus_percentage and
-            (requirements.max_phosphorus_percentage is None or phosphorus_percentage <= requirements.max_phosphorus_percentage) and
-            (requirements.max_fiber_percentage is None or fiber_percentage <= requirements.max_fiber_percentage)
-        )
+    Raises:
+        ValueError: If the request names an ingredient not in the library
+    """
+    logger.info(f"Starting feed formula optimization for {request.bird_type} from library {library.version}")
+    
+    requirements = request_requirements(request)
+    columns, prices = library.columns(request)
+    
+    if len(columns) == 0:
+        return failed_response(request, "No available ingredients for optimization")
+    
+    with stage("build"):
+        matrix = library.matrix.take(columns, prices)
+        program = formulation_program(request, requirements, matrix)
+    solution = solve_program(request, program, solver)
+    
+    if not solution.has_solution:
+        logger.warning(f"Optimization failed with status: {solution.status}")
+        return failed_response(request, f"Optimization failed: {solution.status}")
+    
+    response = optimal_response(request, requirements, matrix, program, solution)
+    logger.info(f"Optimization completed with {len(response.ingredients)} ingredients and total cost: {response.total_cost:.2f}")
+    return response
+
+
+def generate_feed_frontier(request: FrontierRequest, solver: Optional[str] = None) -> FrontierResponse:
+    """
+    Formulas along the trade-off between cost and nutrition for a request
+    
+    One model is built and swept over request.points cost priorities,
+    evenly spaced from 1 (least cost) to 0 (cheapest formula closest to
+    the midpoints of the nutrient ranges); see PrioritySweep. The
+    request's own cost_optimization_priority, include_sensitivity and
+    allow_relaxation do not apply.
+    
+    Args:
+        request: FrontierRequest with the formula request and number of points
+        solver: Solver name ("highs" or "cbc"); defaults to FEED_OPTIMIZER_SOLVER
         
-        # Sort ingredients by quantity in descending order
-        ingredient_results.sort(key=lambda x: x.quantity_kg, reverse=True)
+    Returns:
+        FrontierResponse with one formula per priority
+    """
+    logger.info(f"Starting cost/nutrition frontier of {request.points} points for {request.bird_type}")
+    frontier = FrontierResponse(
+        bird_type=request.bird_type,
+        production_stage=request.production_stage,
+        batch_size_kg=request.batch_size_kg,
+        points=[]
+    )
+    
+    requirements = request_requirements(request)
+    available_ingredients = [i for i in request.ingredients if i.available]
+    if len(available_ingredients) == 0:
+        frontier.optimization_success = False
+        frontier.optimization_message = "No available ingredients for optimization"
+        return frontier
+    
+    with stage("build"):
+        matrix = IngredientMatrix.from_ingredients(available_ingredients)
+        program = build_priority_program(build_linear_program(matrix, requirements, request.batch_size_kg))
+    sweep = PrioritySweep(program, solver)
+    priorities = np.linspace(1.0, 0.0, request.points).tolist()
+    with stage("solve"):
+        results = sweep.solve(priorities)
+    for solution, _ in results:
+        record_solve(get_solver(solver).name, solution.status, program.num_cols, program.num_rows)
+    frontier.solves = sweep.solves
+    frontier.simplex_iterations = sweep.simplex_iterations
+    
+    for priority, (solution, deviation) in zip(priorities, results):
+        if not solution.optimal:
+            logger.warning(f"Frontier failed with status: {solution.status}")
+            frontier.optimization_success = False
+            frontier.optimization_message = f"Optimization failed: {solution.status}"
+            frontier.points = []
+            return frontier
+        with stage("extract"):
+            formula = build_formula_response(request, requirements, matrix, solution.x)
+        formula.nutrition_deviation = round(deviation, 6)
+        frontier.points.append(FrontierPoint(
+            cost_optimization_priority=round(priority, 6),
+            total_cost=formula.total_cost,
+            nutrition_deviation=formula.nutrition_deviation,
+            formula=formula
+        ))
+    
+    frontier.optimization_message = "Optimization completed successfully"
+    logger.info(f"Frontier completed in {sweep.solves} solves, cost {frontier.points[0].total_cost:.2f} "
+                f"to {frontier.points[-1].total_cost:.2f}")
+    return frontier
+
+
+def request_requirements(request: FormulaParameters) -> NutritionalRequirement:
+    """Requirements for a request: its custom requirements, or the defaults for its birds"""
+    # Override with custom requirements if provided
+    if request.custom_requirements:
+        return request.custom_requirements
+    
+    # Get nutritional requirements based on bird type, age, stage
+    return get_default_requirements(
+        request.bird_type, 
+        request.bird_age, 
+        request.production_stage,
+        request.target_nutrition
+    )
+
+
+def formulation_program(
+    request: FormulaParameters,
+    requirements: NutritionalRequirement,
+    matrix: IngredientMatrix
+) -> LinearProgram:
+    """
+    The LP to solve for a request: elastic when it allows relaxation, with
+    the nutrition deviation when its cost priority is below 1,
+    chance-constrained when it asks for a compliance probability, and a
+    MIP when it limits the ingredient count or sets a bag size
+    """
+    program = build_linear_program(matrix, requirements, request.batch_size_kg)
+    if request.allow_relaxation:
+        program = build_elastic_program(program, matrix.names, request.batch_size_kg)
+    elif request.cost_optimization_priority < 1:
+        program = build_priority_program(program)
+    elif request.compliance_probability is not None:
+        program = build_chance_program(program, matrix, request.compliance_probability)
+    elif request.max_ingredients is not None or request.bag_size_kg is not None:
+        # An ingredient's own bag size wins over the request's
+        bag_size = np.where(np.isnan(matrix.bag_size), request.bag_size_kg or 0.0, matrix.bag_size)
+        program = build_mixed_integer_program(program, bag_size, request.max_ingredients)
+    return program
+
+
+def solve_program(request: FormulaParameters, program: LinearProgram, solver: Optional[str] = None) -> SolverResult:
+    """Solve the LP from formulation_program for a request"""
+    with stage("solve"):
+        if isinstance(program, PriorityProgram):
+            solution, _ = PrioritySweep(program, solver).solve([request.cost_optimization_priority])[0]
+        elif isinstance(program, ChanceProgram):
+            solution = ChanceSolve(program, solver).solve()
+        elif isinstance(program, MixedIntegerProgram):
+            solution = get_solver(solver).solve_mip(program, request.time_limit_seconds, request.mip_gap)
+        else:
+            solution = get_solver(solver).solve(program, sensitivity=request.include_sensitivity)
+    record_solve(get_solver(solver).name, solution.status, program.num_cols, program.num_rows)
+    return solution
+
+
+def optimal_response(
+    request: FormulaParameters,
+    requirements: NutritionalRequirement,
+    matrix: IngredientMatrix,
+    program: LinearProgram,
+    solution: SolverResult
+) -> FormulaResponse:
+    """Response for a solve of the LP from formulation_program, with what the request asked to report"""
+    with stage("extract"):
+        if isinstance(program, MixedIntegerProgram):
+            quantities = program.quantities(solution.x)
+        else:
+            quantities = solution.x[:len(matrix)]
+        response = build_formula_response(request, requirements, matrix, quantities)
+        if request.include_sensitivity:
+            response.sensitivity = build_sensitivity_report(request, program, matrix, solution)
+        if request.allow_relaxation:
+            report_relaxations(response, program, solution.x)
+        if isinstance(program, PriorityProgram):
+            response.nutrition_deviation = round(program.deviation(solution.x), 6)
+        if request.compliance_probability is not None:
+            response.compliance = simulate_compliance(request, requirements, matrix, quantities)
+        if isinstance(program, MixedIntegerProgram):
+            report_mip(response, program, matrix, solution)
+        return response
+
+
+def failed_response(request: FormulaParameters, message: str) -> FormulaResponse:
+    """Empty formula reporting why optimization did not succeed"""
+    return FormulaResponse(
+        formula_name=f"{request.bird_type} {request.production_stage} Formula",
+        bird_type=request.bird_type,
+        production_stage=request.production_stage,
+        ingredients=[],
+        nutrition=NutritionResult(
+            protein_percentage=0,
+            energy_kcal_per_kg=0,
+            calcium_percentage=0,
+            phosphorus_percentage=0,
+            fiber_percentage=0,
+            meets_requirements=False
+        ),
+        total_cost=0,
+        cost_per_kg=0,
+        batch_size_kg=request.batch_size_kg,
+        optimization_success=False,
+        optimization_message=message
+    )
+
+
+def build_formula_response(
+    request: FormulaParameters,
+    requirements: NutritionalRequirement,
+    matrix: IngredientMatrix,
+    quantities: np.ndarray
+) -> FormulaResponse:
+    """
+    Build the response for an optimal solution
+    
+    Contributions, totals and requirement checks are computed for all
+    ingredients and nutrients at once from the matrix; Python only touches
+    the ingredients that end up in the formula.
+    
+    Args:
+        request: The request that was solved
+        requirements: Requirements the formula was solved against
+        matrix: Ingredients in LP column order
+        quantities: kg of each ingredient
         
-        # Generate formula name
-        formula_name = f"{request.bird_type.value} {request.production_stage.value} Formula"
+    Returns:
+        FormulaResponse object with the optimized formula
+    """
+    logger.info("Extracting optimization results")
+    batch_size_kg = request.batch_size_kg
+    
+    # Skip ingredients with zero or very small quantities
+    used = np.flatnonzero(quantities >= 0.001)
+    kg = quantities[used]
+    cost = kg * matrix.prices[used]
+    # kg (kcal for energy) of each nutrient from each ingredient, shape (5, k)
+    contributions = matrix.nutrients[:, used] * kg
+    
+    # Nutrient levels per kg of feed, in requirement units
+    levels = contributions.sum(axis=1) / (batch_size_kg * _NUTRIENT_FACTORS)
+    total_cost = float(cost.sum())
+    checks = check_nutrients(requirements, levels)
+    
+    # One row per IngredientResult field after the name, rounded together,
+    # then sorted by quantity in descending order
+    results = np.empty((len(_RESULT_DECIMALS), len(used)))
+    results[0] = kg
+    results[1] = kg * (100 / batch_size_kg)
+    results[2] = cost
+    results[3:] = contributions
+    results = _round_rows(results, _RESULT_DECIMALS)
+    order = np.argsort(-results[0], kind="stable")
+    columns = zip([matrix.names[j] for j in used[order].tolist()], *results[:, order].tolist())
+    
+    # Validating one nested dict is much cheaper than building each model
+    return FormulaResponse.model_validate({
+        "formula_name": f"{request.bird_type.value} {request.production_stage.value} Formula",
+        "bird_type": request.bird_type,
+        "production_stage": request.production_stage,
+        "ingredients": [dict(zip(_INGREDIENT_RESULT_FIELDS, values)) for values in columns],
+        "nutrition": {
+            **dict(zip(_NUTRITION_FIELDS, _round_rows(levels, _LEVEL_DECIMALS).tolist())),
+            "meets_requirements": all(check["satisfied"] for check in checks),
+            "checks": checks,
+        },
+        "total_cost": round(total_cost, 2),
+        "cost_per_kg": round(total_cost / batch_size_kg, 2),
+        "batch_size_kg": batch_size_kg,
+        "optimization_success": True,
+        "optimization_message": "Optimization completed successfully",
+    })
+
+
+def _round_rows(values: np.ndarray, decimals: np.ndarray) -> np.ndarray:
+    # np.round with a number of decimals per row (first axis)
+    scale = (10.0 ** decimals).reshape((-1,) + (1,) * (values.ndim - 1))
+    return np.rint(values * scale) / scale
+
+
+def check_nutrients(requirements: NutritionalRequirement, levels: np.ndarray) -> List[dict]:
+    """
+    Check nutrient levels against requirements, all nutrients at once
+    
+    A level counts as meeting a bound when it is within NUTRITION_TOLERANCE
+    of it (scaled by the size of the bound), so solutions the solver left
+    exactly on a bound are not failed over rounding error.
+    
+    Args:
+        requirements: Requirements to check against
+        levels: Level of each nutrient in NUTRIENTS order, in requirement units
+        
+    Returns:
+        NutrientCheck fields for each nutrient, in NUTRIENTS order
+    """
+    minimum, maximum = requirement_limits(requirements)
+    # NaN marks a missing bound; fmax and fmin ignore it
+    below = minimum - levels
+    above = levels - maximum
+    violation = np.fmax(np.fmax(below, above), 0.0)
+    slack = np.fmax(np.fmin(-below, -above), 0.0)
+    tolerance = NUTRITION_TOLERANCE * np.fmax(np.fmax(np.abs(minimum), np.abs(maximum)), 1.0)
+    satisfied = (violation <= tolerance).tolist()
+    
+    return [
+        {
+            "nutrient": nutrient,
+            "minimum": None if math.isnan(low) else low,
+            "maximum": None if math.isnan(high) else high,
+            "value": value,
+            "slack": None if math.isnan(room) else room,
+            "violation": excess,
+            "satisfied": ok,
+        }
+        for nutrient, low, high, value, room, excess, ok in zip(
+            NUTRIENT_NAMES,
+            minimum.tolist(),
+            maximum.tolist(),
+            *np.round(np.array([levels, slack, violation]), 6).tolist(),
+            satisfied,
+        )
+    ]
+
+
+def requirement_limits(requirements: NutritionalRequirement) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (minimum, maximum) of each nutrient in NUTRIENTS order, in requirement
+    units, with NaN where there is no bound
+    
+    These are the requirements as stated: unlike the LP (see
+    nutrient_bounds), a maximum of 0 or a zero minimum still counts.
+    """
+    minimum = [
+        requirements.min_protein_percentage,
+        requirements.min_energy_kcal_per_kg,
+        requirements.min_calcium_percentage,
+        requirements.min_phosphorus_percentage,
+        None,
+    ]
+    maximum = [
+        requirements.max_protein_percentage,
+        requirements.max_energy_kcal_per_kg,
+        requirements.max_calcium_percentage,
+        requirements.max_phosphorus_percentage,
+        requirements.max_fiber_percentage,
+    ]
+    return (
+        np.array([np.nan if value is None else value for value in minimum], dtype=np.float64),
+        np.array([np.nan if value is None else value for value in maximum], dtype=np.float64),
+    )
+
+
+def report_mip(
+    response: FormulaResponse,
+    program: MixedIntegerProgram,
+    matrix: IngredientMatrix,
+    solution: SolverResult
+) -> None:
+    """Record on a response how its MIP solve ended, and the bags of each bagged ingredient"""
+    response.mip = MipReport(
+        status=solution.status,
+        gap=None if solution.mip_gap is None else round(solution.mip_gap, 6),
+        best_bound=None if solution.best_bound is None else round(solution.best_bound, 6),
+        nodes=solution.nodes,
+        solve_seconds=round(solution.seconds, 3)
+    )
+    bagged = np.flatnonzero(program.integrality[:program.num_ingredients])
+    bags = dict(zip([matrix.names[j] for j in bagged.tolist()], np.rint(solution.x[bagged]).astype(int).tolist()))
+    for item in response.ingredients:
+        item.bags = bags.get(item.name)
+    if solution.status == SOLUTION_FOUND:
+        gap = "" if solution.mip_gap is None else f", within {solution.mip_gap:.2%} of the best possible cost"
+        response.optimization_message = f"Optimization stopped at the time limit with the best formula found{gap}"
+
+
+def simulate_compliance(
+    request: FormulaParameters,
+    requirements: NutritionalRequirement,
+    matrix: IngredientMatrix,
+    quantities: np.ndarray
+) -> ComplianceReport:
+    """
+    Monte Carlo check of a formula against lot-to-lot nutrient variation
+    
+    Each sample is one lot of every ingredient, with each nutrient content
+    drawn independently from a normal distribution (matrix.nutrient_sd).
+    A sample's nutrient level is then normal too, with variance
+    sum((sd_j * x_j) ** 2), so it is drawn directly: one draw per
+    constrained nutrient per sample instead of one per ingredient, all in
+    one array. Levels are checked against the stated requirements with
+    the tolerance of check_nutrients.
+    
+    Args:
+        request: The request that was solved, with compliance_probability
+            and compliance_samples
+        requirements: Requirements the formula was solved against
+        matrix: Ingredients in LP column order
+        quantities: kg of each ingredient
         
-        # Create response
-        response = FormulaResponse(
-            formula_name=formula_name,
-            bird_type=request.bird_type,
-            production_stage=request.production_stage,
-            ingredients=ingredient_results,
-            nutrition=NutritionResult(
-                protein_percentage=round(protein_percentage, 2),
-                energy_kcal_per_kg=round(energy_kcal_per_kg, 0),
-                calcium_percentage=round(calcium_percentage, 2),
-                phosphorus_percentage=round(phosphorus_percentage, 2),
-                fiber_percentage=round(fiber_percentage, 2),
-                meets_requirements=meets_requirements
-            ),
-            total_cost=round(total_cost, 2),
-            cost_per_kg=round(total_cost / request.batch_size_kg, 2),
-            batch_size_kg=request.batch_size_kg,
-            optimization_success=True,
-            optimization_message="Optimization completed successfully"
+    Returns:
+        ComplianceReport for the constrained nutrients
+    """
+    minimum, maximum = requirement_limits(requirements)
+    constrained = np.flatnonzero(~(np.isnan(minimum) & np.isnan(maximum)))
+    scale = request.batch_size_kg * _NUTRIENT_FACTORS[constrained]
+    mean = matrix.nutrients[constrained] @ quantities / scale
+    sd = np.sqrt(np.square(matrix.nutrient_sd[constrained]) @ np.square(quantities)) / scale
+    
+    # One row per nutrient, so every reduction below runs along contiguous memory
+    samples = request.compliance_samples
+    levels = np.random.default_rng(COMPLIANCE_SEED).standard_normal((len(constrained), samples), dtype=np.float32)
+    levels *= sd.astype(np.float32)[:, np.newaxis]
+    levels += mean.astype(np.float32)[:, np.newaxis]
+    
+    low, high = minimum[constrained], maximum[constrained]
+    tolerance = NUTRITION_TOLERANCE * np.fmax(np.fmax(np.abs(low), np.abs(high)), 1.0)
+    # Comparisons with NaN (no bound) are False
+    below = levels < (low - tolerance).astype(np.float32)[:, np.newaxis]
+    above = levels > (high + tolerance).astype(np.float32)[:, np.newaxis]
+    failed = below | above
+    
+    summary = np.round(np.array([
+        levels.mean(axis=1),
+        levels.std(axis=1),
+        np.count_nonzero(below, axis=1) / samples,
+        np.count_nonzero(above, axis=1) / samples,
+        1 - np.count_nonzero(failed, axis=1) / samples,
+    ]), 6)
+    return ComplianceReport.model_validate({
+        "probability": request.compliance_probability,
+        "samples": samples,
+        "compliance_rate": round(1 - np.count_nonzero(failed.any(axis=0)) / samples, 6),
+        "nutrients": [
+            {
+                "nutrient": NUTRIENT_NAMES[i],
+                "mean": level,
+                "sd": spread,
+                "below_minimum": None if math.isnan(bound_low) else short,
+                "above_maximum": None if math.isnan(bound_high) else excess,
+                "compliance_rate": rate,
+            }
+            for i, bound_low, bound_high, level, spread, short, excess, rate in zip(
+                constrained.tolist(), low.tolist(), high.tolist(), *summary.tolist()
+            )
+        ],
+    })
+
+
+def report_relaxations(response: FormulaResponse, program: ElasticProgram, x: np.ndarray) -> None:
+    """
+    Record on a response which requirements the solution x of an elastic
+    program relaxed, and by how much
+    
+    Relaxations within NUTRITION_TOLERANCE of the bound are not reported.
+    """
+    amounts = program.relaxed(x)
+    required = program.slack_required
+    relaxed = np.flatnonzero(amounts > NUTRITION_TOLERANCE * np.maximum(np.abs(required), 1.0))
+    
+    response.relaxations = []
+    for k in relaxed.tolist():
+        constraint, bound = program.slack_constraints[k]
+        amount = float(amounts[k])
+        relaxed_to = required[k] - amount if bound.startswith("min") else required[k] + amount
+        response.relaxations.append(Relaxation(
+            constraint=constraint,
+            bound=bound,
+            required=round(float(required[k]), 6),
+            relaxed_to=round(float(relaxed_to), 6),
+            amount=round(amount, 6)
+        ))
+    if response.relaxations:
+        relaxations = ", ".join(
+            f"{item.constraint} {item.bound} {item.required:g} -> {item.relaxed_to:g}" for item in response.relaxations
         )
+        response.optimization_message = f"Optimization completed with relaxed requirements: {relaxations}"
+
+
+def build_sensitivity_report(
+    request: FormulaParameters,
+    program: LinearProgram,
+    matrix: IngredientMatrix,
+    solution: SolverResult
+) -> SensitivityReport:
+    """
+    Shadow prices, reduced costs and price ranges of an optimal solve
+    
+    Everything comes from the optimal basis of the one solve: no
+    ingredient or requirement is re-solved.
+    
+    Args:
+        request: The request that was solved
+        program: The LP that was solved
+        matrix: Ingredients in LP column order
+        solution: Optimal result, solved with sensitivity=True
         
-        logger.info(f"Optimization completed with {len(ingredient_results)} ingredients and total cost: {total_cost:.2f}")
-        return response
+    Returns:
+        SensitivityReport with one entry per constraint and per ingredient
+    """
+    factors = {name: factor for name, _, factor in NUTRIENTS}
+    binding = set(binding_constraints(program, solution.x, matrix.names))
+    activity = program.activity(solution.x)
+    
+    constraints = []
+    for row, name in enumerate(program.row_names):
+        # Rows hold kg (or kcal) in the whole batch; requirements are per kg
+        # of feed, in percent for everything but energy
+        scale = request.batch_size_kg * factors[name] if name in factors else 1.0
+        low, high = program.row_lower[row], program.row_upper[row]
+        if name in binding:
+            bound = "fixed"
+        elif f"min_{name}" in binding:
+            bound = "min"
+        elif f"max_{name}" in binding:
+            bound = "max"
+        else:
+            bound = None
+        constraints.append(ConstraintSensitivity(
+            constraint=name,
+            minimum=round(low / scale, 6) if np.isfinite(low) else None,
+            maximum=round(high / scale, 6) if np.isfinite(high) else None,
+            value=round(activity[row] / scale, 6),
+            binding=bound,
+            dual=round(float(solution.row_dual[row]), 6),
+            shadow_price=round(float(solution.row_dual[row]) * scale, 6)
+        ))
+    
+    ranging = solution.cost_lower is not None
+    ingredient_results = []
+    for j, (name, price) in enumerate(zip(matrix.names, matrix.prices.tolist())):
+        price_lower = price_upper = None
+        if ranging and np.isfinite(solution.cost_lower[j]):
+            price_lower = round(float(solution.cost_lower[j]), 6)
+        if ranging and np.isfinite(solution.cost_upper[j]):
+            price_upper = round(float(solution.cost_upper[j]), 6)
+        ingredient_results.append(IngredientSensitivity(
+            name=name,
+            quantity_kg=round(float(solution.x[j]), 3),
+            price_per_kg=price,
+            reduced_cost=round(float(solution.col_dual[j]), 6),
+            price_lower=price_lower,
+            price_upper=price_upper
+        ))
+    
+    return SensitivityReport(constraints=constraints, ingredients=ingredient_results, ranging_available=ranging)
+
+
+def generate_feed_formulas(requests: List[FormulaRequest], solver: Optional[str] = None) -> List[BatchItemResult]:
+    """
+    Generate formulas for several requests, in order
+    
+    An exception from one request is reported in its own result and does
+    not stop the others.
+    
+    Args:
+        requests: FormulaRequest objects to solve
+        solver: Solver name ("highs" or "cbc"); defaults to FEED_OPTIMIZER_SOLVER
         
-    except Exception as e:
-        logger.error(f"Error in feed formula optimization: {str(e)}")
-        raise
\ No newline at end of file
+    Returns:
+        One BatchItemResult per request
+    """
+    return [result for result, _ in solve_feed_formulas(requests, solver)]
+
+
+def solve_feed_formulas(
+    requests: List[FormulaRequest],
+    solver: Optional[str] = None
+) -> List[Tuple[BatchItemResult, Optional[SolverResult]]]:
+    """
+    generate_feed_formulas, also returning each raw solve
+    
+    Runs in a worker process for /optimize/batch.
+    """
+    results = []
+    for request in requests:
+        try:
+            response, solution = solve_feed_formula(request, solver)
+            results.append((BatchItemResult(success=True, result=response), solution))
+        except Exception as e:
+            results.append((BatchItemResult(success=False, error=str(e)), None))
+    return results
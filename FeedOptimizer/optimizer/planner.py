@@ -0,0 +1,271 @@
+import bisect
+import logging
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from optimizer.matrix import IngredientMatrix, LinearProgram, SparseLinearProgram, build_linear_program
+from optimizer.metrics import record_solve, stage
+from optimizer.models import (
+    FormulaRequest,
+    InventoryIngredient,
+    LifecyclePlanRequest,
+    NutritionalRequirement,
+    PlanInventory,
+    PlanPeriod,
+    PlanSummary,
+    ProductionStage,
+)
+from optimizer.optimizer import build_formula_response
+from optimizer.solvers import get_solver
+from optimizer.utils import (
+    age_bucket,
+    daily_feed_intake_g,
+    production_stage_for_age,
+    resolve_requirements,
+    stage_boundaries,
+)
+
+# Configure logging
+logger = logging.getLogger("feed-optimizer.planner")
+
+
+class PeriodSpec:
+    """Days of a lifecycle plan fed one formula, with the feed they need"""
+
+    def __init__(
+        self,
+        period: int,
+        start_age: int,
+        end_age: int,
+        production_stage: ProductionStage,
+        feed_kg: float,
+        requirements: NutritionalRequirement
+    ):
+        self.period = period
+        self.start_age = start_age
+        self.end_age = end_age
+        self.production_stage = production_stage
+        self.feed_kg = feed_kg
+        self.requirements = requirements
+
+
+class LifecyclePlan:
+    """
+    Solved lifecycle plan; turned into response lines by plan_lines()
+
+    Attributes:
+        request: The plan request
+        ingredients: Available ingredients, in LP column order
+        periods: PeriodSpec for each period
+        success: Whether an optimal plan was found
+        message: Outcome of the solve
+        quantities: kg of each ingredient in each period, shape
+            (periods, ingredients), or None when not optimal
+        total_cost: Cost of the whole plan
+    """
+
+    def __init__(
+        self,
+        request: LifecyclePlanRequest,
+        ingredients: List[InventoryIngredient],
+        periods: List[PeriodSpec],
+        success: bool,
+        message: str,
+        quantities: Optional[np.ndarray] = None,
+        total_cost: float = 0.0
+    ):
+        self.request = request
+        self.ingredients = ingredients
+        self.periods = periods
+        self.success = success
+        self.message = message
+        self.quantities = quantities
+        self.total_cost = total_cost
+
+
+def plan_periods(request: LifecyclePlanRequest) -> List[PeriodSpec]:
+    """
+    Split the plan's age range into periods of request.period_days
+
+    A period never spans a change of production stage or of the age-based
+    requirement adjustments, so each one has a single set of requirements.
+    """
+    boundaries = stage_boundaries(request.bird_type)
+    intake = daily_feed_intake_g(request.bird_type, np.arange(request.start_age_days, request.end_age_days + 1))
+
+    periods = []
+    age = request.start_age_days
+    while age <= request.end_age_days:
+        last = min(age + request.period_days - 1, request.end_age_days)
+        # First age at which the requirements change after this period starts
+        boundary = bisect.bisect_left(boundaries, age)
+        if boundary < len(boundaries):
+            last = min(last, boundaries[boundary])
+
+        stage = production_stage_for_age(request.bird_type, age)
+        days = intake[age - request.start_age_days:last - request.start_age_days + 1]
+        periods.append(PeriodSpec(
+            period=len(periods) + 1,
+            start_age=age,
+            end_age=last,
+            production_stage=stage,
+            feed_kg=request.flock_size * float(days.sum()) / 1000,
+            requirements=resolve_requirements(request.bird_type, stage, age_bucket(age), request.target_nutrition),
+        ))
+        age = last + 1
+    return periods
+
+
+def build_lifecycle_program(periods: List[PeriodSpec], ingredients: List[InventoryIngredient]) -> LinearProgram:
+    """
+    One LP for every period of a plan
+
+    Each period has its own copy of the single-formula LP (one column per
+    ingredient, with its batch weight and nutrient rows); these blocks are
+    independent except for one row per stocked ingredient that caps its
+    use summed over all periods.
+
+    Args:
+        periods: Periods of the plan
+        ingredients: Available ingredients
+
+    Returns:
+        SparseLinearProgram with columns ordered period by period
+    """
+    matrix = IngredientMatrix.from_ingredients(ingredients)
+    n = len(matrix)
+    blocks = [build_linear_program(matrix, period.requirements, period.feed_kg) for period in periods]
+    offsets = np.cumsum([0] + [block.num_rows for block in blocks])
+    stocked = np.array([j for j, ingredient in enumerate(ingredients) if ingredient.stock_kg is not None], dtype=np.int64)
+
+    # Non-zeros as (column, row, value) triplets: every block's, shifted to
+    # its columns and rows, then a 1 in each stock row for every period
+    columns, rows, values = [], [], []
+    for p, block in enumerate(blocks):
+        start, index, value = block.columnwise()
+        columns.append(np.repeat(np.arange(n), np.diff(start)) + p * n)
+        rows.append(index + offsets[p])
+        values.append(value)
+    if len(stocked):
+        columns.append((np.arange(len(periods))[:, np.newaxis] * n + stocked).ravel())
+        rows.append(np.tile(offsets[-1] + np.arange(len(stocked)), len(periods)))
+        values.append(np.ones(len(periods) * len(stocked)))
+    columns, rows, values = np.concatenate(columns), np.concatenate(rows), np.concatenate(values)
+
+    # Stable, so rows stay in order within each column
+    order = np.argsort(columns, kind="stable")
+    stock = np.array([ingredients[j].stock_kg for j in stocked], dtype=np.float64)
+
+    return SparseLinearProgram(
+        cost=np.tile(matrix.prices, len(periods)),
+        col_lower=np.concatenate([block.col_lower for block in blocks]),
+        col_upper=np.concatenate([block.col_upper for block in blocks]),
+        start=np.searchsorted(columns[order], np.arange(len(periods) * n + 1)).astype(np.int32),
+        index=rows[order].astype(np.int32),
+        value=values[order],
+        row_lower=np.concatenate([block.row_lower for block in blocks] + [np.full(len(stocked), -np.inf)]),
+        row_upper=np.concatenate([block.row_upper for block in blocks] + [stock]),
+        row_names=[
+            f"period{period.period}_{name}" for period, block in zip(periods, blocks) for name in block.row_names
+        ] + [f"stock{j}" for j in stocked],
+    )
+
+
+def plan_lifecycle(request: LifecyclePlanRequest, solver: Optional[str] = None) -> LifecyclePlan:
+    """
+    Least-cost feeding plan for a flock over an age range
+
+    All periods are solved together, so stocked ingredients go to the
+    periods where they save the most rather than to whichever comes first.
+
+    Args:
+        request: LifecyclePlanRequest with the flock, age range and inventory
+        solver: Solver name ("highs" or "cbc"); defaults to FEED_OPTIMIZER_SOLVER
+
+    Returns:
+        LifecyclePlan; stream it with plan_lines()
+    """
+    logger.info(f"Planning {request.flock_size} {request.bird_type} from day {request.start_age_days} "
+                f"to day {request.end_age_days}")
+
+    ingredients = [i for i in request.ingredients if i.available]
+    periods = plan_periods(request)
+    if len(ingredients) == 0:
+        return LifecyclePlan(request, ingredients, periods, False, "No available ingredients for optimization")
+
+    with stage("build"):
+        program = build_lifecycle_program(periods, ingredients)
+    backend = get_solver(solver)
+    logger.info(f"Running {backend.name} on {program.num_cols} columns and {program.num_rows} rows")
+    with stage("solve"):
+        solution = backend.solve(program)
+    record_solve(backend.name, solution.status, program.num_cols, program.num_rows)
+
+    if not solution.optimal:
+        logger.warning(f"Lifecycle plan failed with status: {solution.status}")
+        return LifecyclePlan(request, ingredients, periods, False, f"Optimization failed: {solution.status}")
+
+    quantities = solution.x.reshape(len(periods), len(ingredients))
+    logger.info(f"Lifecycle plan completed over {len(periods)} periods, total cost: {solution.objective:.2f}")
+    return LifecyclePlan(
+        request, ingredients, periods, True, "Optimization completed successfully", quantities, solution.objective
+    )
+
+
+def plan_lines(plan: LifecyclePlan) -> Iterator[str]:
+    """
+    A lifecycle plan as newline-delimited JSON
+
+    A PlanSummary line comes first, then, when the plan succeeded, one
+    PlanPeriod line per period and one PlanInventory line per stocked
+    ingredient. Lines are built as they are consumed.
+    """
+    request = plan.request
+    total_feed_kg = sum(period.feed_kg for period in plan.periods)
+    yield PlanSummary(
+        bird_type=request.bird_type,
+        flock_size=request.flock_size,
+        start_age_days=request.start_age_days,
+        end_age_days=request.end_age_days,
+        periods=len(plan.periods),
+        total_feed_kg=round(total_feed_kg, 3),
+        total_cost=round(plan.total_cost, 2),
+        cost_per_bird=round(plan.total_cost / request.flock_size, 4),
+        optimization_success=plan.success,
+        optimization_message=plan.message,
+    ).model_dump_json() + "\n"
+    if not plan.success:
+        return
+
+    matrix = IngredientMatrix.from_ingredients(plan.ingredients)
+    for period, quantities in zip(plan.periods, plan.quantities):
+        # build_formula_response only reads the request's bird, stage and batch size
+        period_request = FormulaRequest.model_construct(
+            bird_type=request.bird_type,
+            bird_age=period.start_age,
+            production_stage=period.production_stage,
+            target_nutrition=request.target_nutrition,
+            batch_size_kg=period.feed_kg,
+            ingredients=[],
+        )
+        formula = build_formula_response(period_request, period.requirements, matrix, quantities)
+        yield PlanPeriod(
+            period=period.period,
+            start_age_days=period.start_age,
+            end_age_days=period.end_age,
+            production_stage=period.production_stage,
+            feed_kg=round(period.feed_kg, 3),
+            formula=formula,
+        ).model_dump_json() + "\n"
+
+    used = plan.quantities.sum(axis=0)
+    for ingredient, used_kg in zip(plan.ingredients, used.tolist()):
+        if ingredient.stock_kg is None:
+            continue
+        yield PlanInventory(
+            name=ingredient.name,
+            stock_kg=ingredient.stock_kg,
+            used_kg=round(used_kg, 3),
+            remaining_kg=round(max(ingredient.stock_kg - used_kg, 0.0), 3),
+        ).model_dump_json() + "\n"
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from optimizer.matrix import IngredientMatrix, binding_constraints, build_linear_program
+from optimizer.metrics import record_solve, stage
+from optimizer.models import FormulaDelta, FormulaRequest, SessionFormulaResponse
+from optimizer.optimizer import build_formula_response, build_sensitivity_report, failed_response, request_requirements
+from optimizer.solvers import highs_result, to_highs_lp
+
+# Configure logging
+logger = logging.getLogger("feed-optimizer.session")
+
+# Sessions hold a HiGHS model each; idle ones are dropped after the TTL and
+# the least recently used ones once there are more than MAX_FORMULA_SESSIONS
+MAX_FORMULA_SESSIONS = int(os.getenv("MAX_FORMULA_SESSIONS", "256"))
+FORMULA_SESSION_TTL = float(os.getenv("FORMULA_SESSION_TTL", "1800"))
+
+
+class FormulaSession:
+    """
+    A formula request kept loaded in HiGHS so it can be re-solved cheaply
+
+    Every ingredient of the request gets a column, unavailable ones with
+    bounds of 0, so price and availability changes only touch costs and
+    column bounds. HiGHS keeps the optimal basis of the previous solve
+    and re-solves from it, which usually takes a handful of simplex
+    iterations instead of a solve from scratch.
+
+    Requires highspy; construction raises ImportError without it.
+    """
+
+    def __init__(self, request: FormulaRequest):
+        import highspy
+
+        names = [ingredient.name for ingredient in request.ingredients]
+        if len(set(names)) != len(names):
+            raise ValueError("Ingredient names must be unique in a formula session")
+        if (request.allow_relaxation or request.cost_optimization_priority < 1 or request.compliance_probability is not None
+                or request.max_ingredients is not None or request.bag_size_kg is not None):
+            raise ValueError("Formula sessions only solve the plain least-cost LP: allow_relaxation, "
+                             "compliance_probability, max_ingredients, bag_size_kg and cost_optimization_priority "
+                             "below 1 are not supported")
+
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.requirements = request_requirements(request)
+        self.ingredients = list(request.ingredients)
+        self.index: Dict[str, int] = {name: j for j, name in enumerate(names)}
+
+        # program.cost is matrix.prices, so price changes reach both
+        self.matrix = IngredientMatrix.from_ingredients(self.ingredients)
+        self.program = build_linear_program(self.matrix, self.requirements, request.batch_size_kg)
+        # Inclusion bounds to restore when an ingredient becomes available again
+        self.inclusion_lower = self.program.col_lower.copy()
+        self.inclusion_upper = self.program.col_upper.copy()
+        unavailable = np.array([not ingredient.available for ingredient in self.ingredients], dtype=bool)
+        self.program.col_lower[unavailable] = 0.0
+        self.program.col_upper[unavailable] = 0.0
+
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        self.highs.passModel(to_highs_lp(self.program))
+
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.last_response: Optional[SessionFormulaResponse] = None
+
+    def solve(self) -> SessionFormulaResponse:
+        """Solve the current model, starting from the last optimal basis if there is one"""
+        with self.lock:
+            return self._solve()
+
+    def apply(self, delta: FormulaDelta) -> SessionFormulaResponse:
+        """
+        Apply price and availability changes, then re-solve
+
+        Args:
+            delta: New prices and availability, by ingredient name
+
+        Returns:
+            SessionFormulaResponse for the updated formula
+
+        Raises:
+            ValueError: If the delta names an ingredient not in the session
+        """
+        unknown = sorted((set(delta.prices) | set(delta.availability)) - set(self.index))
+        if unknown:
+            raise ValueError(f"Unknown ingredients: {', '.join(unknown)}")
+
+        with self.lock:
+            if delta.prices:
+                columns = np.array([self.index[name] for name in delta.prices], dtype=np.int32)
+                prices = np.array(list(delta.prices.values()), dtype=np.float64)
+                self.program.cost[columns] = prices
+                self.highs.changeColsCost(len(columns), columns, prices)
+
+            if delta.availability:
+                columns = np.array([self.index[name] for name in delta.availability], dtype=np.int32)
+                available = np.array(list(delta.availability.values()), dtype=bool)
+                self.program.col_lower[columns] = np.where(available, self.inclusion_lower[columns], 0.0)
+                self.program.col_upper[columns] = np.where(available, self.inclusion_upper[columns], 0.0)
+                self.highs.changeColsBounds(
+                    len(columns), columns, self.program.col_lower[columns], self.program.col_upper[columns]
+                )
+
+            for name in set(delta.prices) | set(delta.availability):
+                j = self.index[name]
+                update = {}
+                if name in delta.prices:
+                    update["price_per_kg"] = delta.prices[name]
+                if name in delta.availability:
+                    update["available"] = delta.availability[name]
+                self.ingredients[j] = self.ingredients[j].model_copy(update=update)
+
+            return self._solve()
+
+    def _solve(self) -> SessionFormulaResponse:
+        self.last_used = time.monotonic()
+        if not any(ingredient.available for ingredient in self.ingredients):
+            formula = failed_response(self.request, "No available ingredients for optimization")
+            self.last_response = SessionFormulaResponse(session_id=self.id, formula=formula)
+            return self.last_response
+
+        warm_start = self.highs.getBasis().valid
+        with stage("solve"):
+            self.highs.run()
+        info = self.highs.getInfo()
+        solution = highs_result(self.highs, self.request.include_sensitivity)
+        record_solve("highs", solution.status, self.program.num_cols, self.program.num_rows)
+        logger.info(f"Session {self.id} solved: {solution.status} in {info.simplex_iteration_count} iterations "
+                    f"({'warm' if warm_start else 'cold'} start)")
+
+        if not solution.optimal:
+            formula = failed_response(self.request, f"Optimization failed: {solution.status}")
+            binding: List[str] = []
+        else:
+            with stage("extract"):
+                formula = build_formula_response(self.request, self.requirements, self.matrix, solution.x)
+                if self.request.include_sensitivity:
+                    formula.sensitivity = build_sensitivity_report(self.request, self.program, self.matrix, solution)
+                binding = binding_constraints(self.program, solution.x, list(self.index))
+
+        self.last_response = SessionFormulaResponse(
+            session_id=self.id,
+            formula=formula,
+            binding_constraints=binding,
+            simplex_iterations=info.simplex_iteration_count,
+            warm_start=warm_start,
+        )
+        return self.last_response
+
+
+class SessionStore:
+    """Formula sessions by id, bounded in number and idle time"""
+
+    def __init__(self, max_sessions: int = MAX_FORMULA_SESSIONS, ttl_seconds: float = FORMULA_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, FormulaSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: FormulaSession) -> FormulaSession:
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                logger.info(f"Evicted formula session {evicted}")
+        return session
+
+    def get(self, session_id: str) -> FormulaSession:
+        """Session by id; raises KeyError if it does not exist or has expired"""
+        with self._lock:
+            self._expire()
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+        return session
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            del self._sessions[session_id]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Sessions are kept in order of last access, so expired ones come first
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+            logger.info(f"Expired formula session {session_id}")
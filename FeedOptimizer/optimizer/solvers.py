@@ -0,0 +1,472 @@
+import copy
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from optimizer.matrix import ChanceProgram, LinearProgram, MixedIntegerProgram, PriorityProgram
+
+# Configure logging
+logger = logging.getLogger("feed-optimizer.solvers")
+
+# "highs" solves in-process through highspy; "cbc" writes the model out
+# through PuLP and runs the CBC binary. HiGHS is used whenever highspy is
+# installed, unless FEED_OPTIMIZER_SOLVER says otherwise.
+DEFAULT_SOLVER = os.getenv("FEED_OPTIMIZER_SOLVER", "highs").lower()
+
+# Status names follow pulp.LpStatus, which responses have always reported
+OPTIMAL = "Optimal"
+INFEASIBLE = "Infeasible"
+UNBOUNDED = "Unbounded"
+NOT_SOLVED = "Not Solved"
+# A MIP stopped (by its time limit) with a formula that may not be optimal;
+# named after pulp.LpSolution
+SOLUTION_FOUND = "Solution Found"
+
+# A ChanceSolve stops once every chance constraint holds within this many
+# standard deviations of the blend's level (moving the probability by less
+# than 0.0004), or gives up after MAX_CHANCE_ROUNDS solves
+CHANCE_TOLERANCE = 1e-3
+MAX_CHANCE_ROUNDS = 200
+
+# Relative room given to each deviation cap in a PrioritySweep, so a cap is
+# never tighter than the deviation its anchor solve reached
+DEVIATION_TOLERANCE = 1e-7
+
+
+class SolverResult:
+    """
+    Outcome of one LP solve
+
+    Attributes:
+        status: One of OPTIMAL, SOLUTION_FOUND, INFEASIBLE, UNBOUNDED, NOT_SOLVED
+        x: kg of each ingredient, or None without a solution
+        objective: Total cost, or None without a solution
+        solver: Name of the solver that produced the result
+        row_dual: Change in total cost per unit increase of each row's
+            bound, when sensitivity was requested
+        col_dual: Reduced cost of each ingredient, when sensitivity was requested
+        cost_lower: Lowest price per kg of each ingredient at which the
+            solution stays optimal (-inf if none), when the solver supports ranging
+        cost_upper: Highest such price (inf if none)
+        mip_gap: Relative gap between objective and best_bound, for MIPs
+            when the solver reports it
+        best_bound: Lowest objective any solution could have, likewise
+        nodes: Branch-and-bound nodes explored, likewise
+        seconds: Wall-clock time of a MIP solve
+    """
+
+    def __init__(self, status: str, x: Optional[np.ndarray] = None, objective: Optional[float] = None, solver: str = ""):
+        self.status = status
+        self.x = x
+        self.objective = objective
+        self.solver = solver
+        self.row_dual: Optional[np.ndarray] = None
+        self.col_dual: Optional[np.ndarray] = None
+        self.cost_lower: Optional[np.ndarray] = None
+        self.cost_upper: Optional[np.ndarray] = None
+        self.mip_gap: Optional[float] = None
+        self.best_bound: Optional[float] = None
+        self.nodes: Optional[int] = None
+        self.seconds: Optional[float] = None
+
+    @property
+    def optimal(self) -> bool:
+        return self.status == OPTIMAL
+
+    @property
+    def has_solution(self) -> bool:
+        return self.status in (OPTIMAL, SOLUTION_FOUND)
+
+
+def to_highs_lp(program: LinearProgram):
+    """Convert a LinearProgram to a highspy.HighsLp with a column-wise sparse matrix"""
+    import highspy
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = program.num_cols
+    lp.num_row_ = program.num_rows
+    lp.col_cost_ = program.cost
+    lp.col_lower_ = program.col_lower
+    lp.col_upper_ = program.col_upper
+    lp.row_lower_ = np.where(np.isfinite(program.row_lower), program.row_lower, -highspy.kHighsInf)
+    lp.row_upper_ = np.where(np.isfinite(program.row_upper), program.row_upper, highspy.kHighsInf)
+
+    start, index, value = program.columnwise()
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = start
+    lp.a_matrix_.index_ = index
+    lp.a_matrix_.value_ = value
+    return lp
+
+
+def highs_status(model_status) -> str:
+    import highspy
+
+    statuses = {
+        highspy.HighsModelStatus.kOptimal: OPTIMAL,
+        highspy.HighsModelStatus.kInfeasible: INFEASIBLE,
+        highspy.HighsModelStatus.kUnboundedOrInfeasible: INFEASIBLE,
+        highspy.HighsModelStatus.kUnbounded: UNBOUNDED,
+    }
+    return statuses.get(model_status, NOT_SOLVED)
+
+
+def highs_result(highs, sensitivity: bool = False, solver: str = "highs") -> SolverResult:
+    """SolverResult for a Highs instance that has just run"""
+    status = highs_status(highs.getModelStatus())
+    if status != OPTIMAL:
+        return SolverResult(status, solver=solver)
+
+    solution = highs.getSolution()
+    num_cols = highs.getNumCol()
+    result = SolverResult(status, np.asarray(solution.col_value), highs.getInfo().objective_function_value, solver)
+    if sensitivity:
+        result.row_dual = np.asarray(solution.row_dual)
+        result.col_dual = np.asarray(solution.col_dual)
+        # Ranging reuses the factorization of the optimal basis; no re-solve
+        _, ranging = highs.getRanging()
+        if ranging.valid:
+            result.cost_lower = np.asarray(ranging.col_cost_dn.value_)[:num_cols]
+            result.cost_upper = np.asarray(ranging.col_cost_up.value_)[:num_cols]
+    return result
+
+
+class HighsSolver:
+    """Solves in-process with HiGHS; no files and no subprocess"""
+
+    name = "highs"
+
+    def __init__(self):
+        import highspy  # noqa: F401 - fail at construction if it is missing
+
+    def solve(self, program: LinearProgram, sensitivity: bool = False) -> SolverResult:
+        import highspy
+
+        highs = highspy.Highs()
+        highs.setOptionValue("output_flag", False)
+        highs.passModel(to_highs_lp(program))
+        highs.run()
+        return highs_result(highs, sensitivity, self.name)
+
+    def solve_mip(self, program: MixedIntegerProgram, time_limit: float, mip_gap: float) -> SolverResult:
+        """Best solution of a MIP found within time_limit seconds, stopping early within mip_gap"""
+        import highspy
+
+        highs = highspy.Highs()
+        highs.setOptionValue("output_flag", False)
+        highs.setOptionValue("time_limit", float(time_limit))
+        highs.setOptionValue("mip_rel_gap", float(mip_gap))
+        lp = to_highs_lp(program)
+        lp.integrality_ = [highspy.HighsVarType.kInteger if flag else highspy.HighsVarType.kContinuous
+                           for flag in program.integrality.tolist()]
+        highs.passModel(lp)
+        start = time.perf_counter()
+        highs.run()
+        seconds = time.perf_counter() - start
+
+        info = highs.getInfo()
+        status = highs_status(highs.getModelStatus())
+        if status == NOT_SOLVED and info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+            status = SOLUTION_FOUND
+        if status not in (OPTIMAL, SOLUTION_FOUND):
+            result = SolverResult(status, solver=self.name)
+        else:
+            result = SolverResult(status, np.asarray(highs.getSolution().col_value), info.objective_function_value, self.name)
+            result.mip_gap = info.mip_gap
+            result.best_bound = info.mip_dual_bound
+            result.nodes = info.mip_node_count
+        result.seconds = seconds
+        return result
+
+
+class PulpSolver:
+    """
+    Builds the model with PuLP and runs the bundled CBC binary
+
+    CBC reports duals and reduced costs but no cost ranging.
+    """
+
+    name = "cbc"
+
+    def solve(self, program: LinearProgram, sensitivity: bool = False) -> SolverResult:
+        import pulp
+
+        model, x = self._model(program)
+        status = pulp.LpStatus[model.solve(pulp.PULP_CBC_CMD(msg=False))]
+        if status != OPTIMAL:
+            return SolverResult(status, solver=self.name)
+        values = np.array([variable.value() or 0.0 for variable in x])
+        result = SolverResult(status, values, pulp.value(model.objective), self.name)
+        if sensitivity:
+            # A two-sided row was split into min_/max_ constraints; at most
+            # one of them is binding, so their duals add up to the row's
+            constraints = model.constraints
+            result.row_dual = np.array([
+                sum(constraints[key].pi or 0.0 for key in (name, f"min_{name}", f"max_{name}") if key in constraints)
+                for name in program.row_names
+            ])
+            result.col_dual = np.array([variable.dj or 0.0 for variable in x])
+        return result
+
+    def solve_mip(self, program: MixedIntegerProgram, time_limit: float, mip_gap: float) -> SolverResult:
+        """
+        Best solution of a MIP found within time_limit seconds, stopping
+        early within mip_gap; CBC's gap and bound are not reported
+        """
+        import pulp
+
+        model, x = self._model(program, program.integrality)
+        start = time.perf_counter()
+        model.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapRel=mip_gap))
+        seconds = time.perf_counter() - start
+
+        if model.sol_status == pulp.LpSolutionOptimal:
+            result = SolverResult(OPTIMAL, solver=self.name)
+        elif model.sol_status == pulp.LpSolutionIntegerFeasible:
+            result = SolverResult(SOLUTION_FOUND, solver=self.name)
+        else:
+            result = SolverResult(INFEASIBLE if model.status == pulp.LpStatusInfeasible else NOT_SOLVED, solver=self.name)
+        if result.has_solution:
+            result.x = np.array([variable.value() or 0.0 for variable in x])
+            result.objective = pulp.value(model.objective)
+        result.seconds = seconds
+        return result
+
+    @staticmethod
+    def _model(program: LinearProgram, integrality: Optional[np.ndarray] = None):
+        """PuLP model of a program, and its variables in column order"""
+        import pulp
+
+        model = pulp.LpProblem("FeedFormulaOptimization", pulp.LpMinimize)
+        # Columns are named by index: ingredient names may not be valid LP names
+        x = [
+            pulp.LpVariable(
+                f"x{j}", lowBound=float(low), upBound=float(high),
+                cat=pulp.LpInteger if integrality is not None and integrality[j] else pulp.LpContinuous,
+            )
+            for j, (low, high) in enumerate(zip(program.col_lower, program.col_upper))
+        ]
+        model += pulp.LpAffineExpression(zip(x, program.cost.tolist())), "Total_Cost"
+
+        # Gather each row's terms from the column-wise non-zeros
+        start, index, value = program.columnwise()
+        terms = [[] for _ in range(program.num_rows)]
+        for j in range(program.num_cols):
+            for row, coefficient in zip(index[start[j]:start[j + 1]].tolist(), value[start[j]:start[j + 1]].tolist()):
+                terms[row].append((x[j], coefficient))
+
+        for row, name in enumerate(program.row_names):
+            expression = pulp.LpAffineExpression(terms[row])
+            low, high = program.row_lower[row], program.row_upper[row]
+            if low == high:
+                model += expression == float(low), name
+                continue
+            if np.isfinite(low):
+                model += expression >= float(low), f"min_{name}"
+            if np.isfinite(high):
+                model += expression <= float(high), f"max_{name}"
+
+        return model, x
+
+
+SOLVERS = {"highs": HighsSolver, "cbc": PulpSolver}
+_instances: Dict[str, object] = {}
+
+
+def get_solver(name: Optional[str] = None):
+    """
+    Solver by name ("highs" or "cbc"), defaulting to FEED_OPTIMIZER_SOLVER
+
+    Falls back to CBC when HiGHS is requested but highspy is not installed.
+    """
+    name = (name or DEFAULT_SOLVER).lower()
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver '{name}', expected one of: {', '.join(SOLVERS)}")
+    if name not in _instances:
+        try:
+            _instances[name] = SOLVERS[name]()
+        except ImportError:
+            logger.warning(f"Solver '{name}' is not installed, falling back to CBC")
+            _instances[name] = get_solver("cbc")
+    return _instances[name]
+
+
+class PrioritySweep:
+    """
+    Solves a PriorityProgram for any number of cost priorities
+
+    A priority p in [0, 1] asks for the cheapest formula whose nutrition
+    deviation is at most least + p * (cheapest - least), where "cheapest"
+    is the deviation of the least-cost formula and "least" the smallest
+    deviation possible (epsilon constraint): p = 1 is the plain least-cost
+    formula, p = 0 the cheapest of the formulas closest to the targets.
+    Two anchor solves find both ends, then each priority is one more solve.
+
+    With HiGHS the program is loaded once and every solve only changes
+    costs or the deviation row's bound, starting from the previous optimal
+    basis; other solvers solve the program from scratch each time.
+
+    Attributes:
+        solves: LP solves run so far
+        simplex_iterations: Simplex iterations over those solves (HiGHS only)
+    """
+
+    def __init__(self, program: PriorityProgram, solver: Optional[str] = None):
+        self.program = program
+        self.backend = get_solver(solver)
+        self.solves = 0
+        self.simplex_iterations: Optional[int] = None
+        self._highs = None
+        self._cost = None
+        if self.backend.name == "highs":
+            import highspy
+
+            self._highs = highspy.Highs()
+            self._highs.setOptionValue("output_flag", False)
+            self._highs.passModel(to_highs_lp(program))
+            self.simplex_iterations = 0
+
+    def solve(self, priorities: List[float]) -> List[Tuple[SolverResult, Optional[float]]]:
+        """
+        (result, deviation) for each priority, in order
+
+        Results hold the ingredient quantities only, and their objective is
+        the ingredient cost. If the program is infeasible every result is
+        that failure, with a deviation of None.
+        """
+        program = self.program
+        cheapest = self._run(program.ingredient_cost(), np.inf)
+        if not cheapest.optimal:
+            return [(cheapest, None)] * len(priorities)
+        most = program.deviation(cheapest.x)
+
+        least = most
+        if any(priority < 1 for priority in priorities):
+            closest = self._run(program.deviation_cost(), np.inf)
+            if closest.optimal:
+                least = min(program.deviation(closest.x), most)
+
+        # From the closest formula towards the cheapest, so that each solve
+        # starts from a basis near its own optimum
+        results: Dict[int, Tuple[SolverResult, Optional[float]]] = {}
+        cost = program.ingredient_cost()
+        for index in sorted(range(len(priorities)), key=lambda i: priorities[i]):
+            priority = priorities[index]
+            if priority >= 1:
+                result = cheapest
+            else:
+                cap = least + priority * (most - least)
+                result = self._run(cost, cap + DEVIATION_TOLERANCE * max(cap, 1.0))
+            results[index] = (result, program.deviation(result.x) if result.optimal else None)
+        return [results[index] for index in range(len(priorities))]
+
+    def _run(self, cost: np.ndarray, cap: float) -> SolverResult:
+        program = self.program
+        self.solves += 1
+        if self._highs is None:
+            capped = copy.copy(program)
+            capped.cost = cost
+            capped.row_upper = program.row_upper.copy()
+            capped.row_upper[program.deviation_row] = cap
+            result = self.backend.solve(capped)
+        else:
+            import highspy
+
+            if cost is not self._cost:
+                columns = np.arange(program.num_cols, dtype=np.int32)
+                self._highs.changeColsCost(program.num_cols, columns, cost)
+                self._cost = cost
+            upper = cap if np.isfinite(cap) else highspy.kHighsInf
+            self._highs.changeRowBounds(program.deviation_row, -highspy.kHighsInf, upper)
+            self._highs.run()
+            self.simplex_iterations += self._highs.getInfo().simplex_iteration_count
+            result = highs_result(self._highs, False, self.backend.name)
+
+        if result.optimal:
+            n = program.num_ingredients
+            result.x = result.x[:n]
+            result.objective = float(program.cost[:n] @ result.x)
+        return result
+
+
+class ChanceSolve:
+    """
+    Solves a ChanceProgram by cutting planes
+
+    Each round solves the LP, then adds a cut (see ChanceProgram.cuts) for
+    every chance constraint the solution violates, until none is violated
+    by more than CHANCE_TOLERANCE. Cuts only remove blends that fail a
+    chance constraint, so the result is the least-cost formula meeting
+    them all. With HiGHS the cuts are added to one model, each round
+    starting from the previous optimal basis; other solvers solve the
+    program and its cuts from scratch each round.
+
+    Attributes:
+        solves: LP solves run so far
+        cuts: Cuts added so far
+    """
+
+    def __init__(self, program: ChanceProgram, solver: Optional[str] = None):
+        self.program = program
+        self.backend = get_solver(solver)
+        self.solves = 0
+        self.cuts = 0
+        self._highs = None
+        self._program = program
+        if self.backend.name == "highs":
+            import highspy
+
+            self._highs = highspy.Highs()
+            self._highs.setOptionValue("output_flag", False)
+            self._highs.passModel(to_highs_lp(program))
+
+    def solve(self) -> SolverResult:
+        program = self.program
+        for _ in range(MAX_CHANCE_ROUNDS):
+            result = self._run()
+            if not result.optimal:
+                return result
+            violated = np.flatnonzero(program.violation(result.x) > CHANCE_TOLERANCE)
+            if len(violated) == 0:
+                return result
+            self._add(*program.cuts(result.x, violated))
+
+        logger.warning(f"Chance constraints still violated after {MAX_CHANCE_ROUNDS} solves")
+        return SolverResult(NOT_SOLVED, solver=self.backend.name)
+
+    def _run(self) -> SolverResult:
+        self.solves += 1
+        if self._highs is None:
+            return self.backend.solve(self._program)
+        self._highs.run()
+        return highs_result(self._highs, False, self.backend.name)
+
+    def _add(self, A: np.ndarray, row_lower: np.ndarray, row_upper: np.ndarray) -> None:
+        self.cuts += len(A)
+        if self._highs is None:
+            program = self._program
+            self._program = LinearProgram(
+                program.cost, program.col_lower, program.col_upper,
+                np.vstack([program.A, A]),
+                np.concatenate([program.row_lower, row_lower]),
+                np.concatenate([program.row_upper, row_upper]),
+                program.row_names + [f"cut_{self.cuts - len(A) + k}" for k in range(len(A))],
+            )
+            return
+
+        import highspy
+
+        # Row-wise non-zeros: np.nonzero walks A row by row
+        rows, cols = np.nonzero(A)
+        self._highs.addRows(
+            len(A),
+            np.where(np.isfinite(row_lower), row_lower, -highspy.kHighsInf),
+            np.where(np.isfinite(row_upper), row_upper, highspy.kHighsInf),
+            len(cols),
+            np.searchsorted(rows, np.arange(len(A))).astype(np.int32),
+            cols.astype(np.int32),
+            A[rows, cols],
+        )
@@ -1,5 +1,12 @@
+import bisect
 import logging
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Dict, Any
+
+import numpy as np
+
+from optimizer.metrics import stage
 from optimizer.models import (
     NutritionalRequirement, 
     BirdType, 
@@ -10,6 +17,245 @@ from optimizer.models import (
 # Configure logging
 logger = logging.getLogger("feed-optimizer.utils")
 
+# Base requirements by bird type and production stage. Built once at import
+# and never modified: lookups hand out copies.
+DEFAULT_REQUIREMENTS = MappingProxyType({
+    BirdType.LAYER: MappingProxyType({
+        ProductionStage.STARTER: NutritionalRequirement(
+            min_protein_percentage=20.0,
+            max_protein_percentage=22.0,
+            min_energy_kcal_per_kg=2900,
+            max_energy_kcal_per_kg=3100,
+            min_calcium_percentage=1.0,
+            max_calcium_percentage=1.2,
+            min_phosphorus_percentage=0.45,
+            max_phosphorus_percentage=0.55,
+            max_fiber_percentage=4.0
+        ),
+        ProductionStage.GROWER: NutritionalRequirement(
+            min_protein_percentage=16.0,
+            max_protein_percentage=18.0,
+            min_energy_kcal_per_kg=2800,
+            max_energy_kcal_per_kg=3000,
+            min_calcium_percentage=0.9,
+            max_calcium_percentage=1.1,
+            min_phosphorus_percentage=0.4,
+            max_phosphorus_percentage=0.5,
+            max_fiber_percentage=5.0
+        ),
+        ProductionStage.PRE_LAY: NutritionalRequirement(
+            min_protein_percentage=17.0,
+            max_protein_percentage=19.0,
+            min_energy_kcal_per_kg=2850,
+            max_energy_kcal_per_kg=3050,
+            min_calcium_percentage=2.0,
+            max_calcium_percentage=2.5,
+            min_phosphorus_percentage=0.42,
+            max_phosphorus_percentage=0.52,
+            max_fiber_percentage=5.0
+        ),
+        ProductionStage.LAYER: NutritionalRequirement(
+            min_protein_percentage=16.0,
+            max_protein_percentage=18.0,
+            min_energy_kcal_per_kg=2750,
+            max_energy_kcal_per_kg=2950,
+            min_calcium_percentage=3.5,
+            max_calcium_percentage=4.2,
+            min_phosphorus_percentage=0.32,
+            max_phosphorus_percentage=0.45,
+            max_fiber_percentage=5.0
+        ),
+    }),
+    BirdType.BROILER: MappingProxyType({
+        ProductionStage.STARTER: NutritionalRequirement(
+            min_protein_percentage=22.0,
+            max_protein_percentage=24.0,
+            min_energy_kcal_per_kg=3000,
+            max_energy_kcal_per_kg=3200,
+            min_calcium_percentage=0.9,
+            max_calcium_percentage=1.1,
+            min_phosphorus_percentage=0.45,
+            max_phosphorus_percentage=0.55,
+            max_fiber_percentage=3.5
+        ),
+        ProductionStage.GROWER: NutritionalRequirement(
+            min_protein_percentage=20.0,
+            max_protein_percentage=22.0,
+            min_energy_kcal_per_kg=3100,
+            max_energy_kcal_per_kg=3300,
+            min_calcium_percentage=0.85,
+            max_calcium_percentage=1.0,
+            min_phosphorus_percentage=0.42,
+            max_phosphorus_percentage=0.52,
+            max_fiber_percentage=4.0
+        ),
+        ProductionStage.FINISHER: NutritionalRequirement(
+            min_protein_percentage=18.0,
+            max_protein_percentage=20.0,
+            min_energy_kcal_per_kg=3150,
+            max_energy_kcal_per_kg=3350,
+            min_calcium_percentage=0.8,
+            max_calcium_percentage=0.95,
+            min_phosphorus_percentage=0.38,
+            max_phosphorus_percentage=0.48,
+            max_fiber_percentage=4.5
+        ),
+    }),
+    BirdType.DUAL_PURPOSE: MappingProxyType({
+        ProductionStage.STARTER: NutritionalRequirement(
+            min_protein_percentage=20.0,
+            max_protein_percentage=22.0,
+            min_energy_kcal_per_kg=2950,
+            max_energy_kcal_per_kg=3150,
+            min_calcium_percentage=0.95,
+            max_calcium_percentage=1.15,
+            min_phosphorus_percentage=0.45,
+            max_phosphorus_percentage=0.55,
+            max_fiber_percentage=4.0
+        ),
+        ProductionStage.GROWER: NutritionalRequirement(
+            min_protein_percentage=18.0,
+            max_protein_percentage=20.0,
+            min_energy_kcal_per_kg=2900,
+            max_energy_kcal_per_kg=3100,
+            min_calcium_percentage=0.85,
+            max_calcium_percentage=1.05,
+            min_phosphorus_percentage=0.4,
+            max_phosphorus_percentage=0.5,
+            max_fiber_percentage=4.5
+        ),
+        ProductionStage.LAYER: NutritionalRequirement(
+            min_protein_percentage=16.0,
+            max_protein_percentage=18.0,
+            min_energy_kcal_per_kg=2800,
+            max_energy_kcal_per_kg=3000,
+            min_calcium_percentage=3.3,
+            max_calcium_percentage=4.0,
+            min_phosphorus_percentage=0.35,
+            max_phosphorus_percentage=0.45,
+            max_fiber_percentage=5.0
+        ),
+    }),
+    BirdType.BREEDER: MappingProxyType({
+        ProductionStage.STARTER: NutritionalRequirement(
+            min_protein_percentage=19.0,
+            max_protein_percentage=21.0,
+            min_energy_kcal_per_kg=2900,
+            max_energy_kcal_per_kg=3100,
+            min_calcium_percentage=1.0,
+            max_calcium_percentage=1.2,
+            min_phosphorus_percentage=0.45,
+            max_phosphorus_percentage=0.55,
+            max_fiber_percentage=4.0
+        ),
+        ProductionStage.GROWER: NutritionalRequirement(
+            min_protein_percentage=15.0,
+            max_protein_percentage=17.0,
+            min_energy_kcal_per_kg=2750,
+            max_energy_kcal_per_kg=2950,
+            min_calcium_percentage=0.9,
+            max_calcium_percentage=1.1,
+            min_phosphorus_percentage=0.4,
+            max_phosphorus_percentage=0.5,
+            max_fiber_percentage=5.0
+        ),
+        ProductionStage.LAYER: NutritionalRequirement(
+            min_protein_percentage=16.0,
+            max_protein_percentage=18.0,
+            min_energy_kcal_per_kg=2800,
+            max_energy_kcal_per_kg=3000,
+            min_calcium_percentage=3.0,
+            max_calcium_percentage=3.8,
+            min_phosphorus_percentage=0.35,
+            max_phosphorus_percentage=0.45,
+            max_fiber_percentage=5.0
+        ),
+    }),
+})
+
+# Used for any combination missing from DEFAULT_REQUIREMENTS
+GENERIC_REQUIREMENTS = NutritionalRequirement(
+    min_protein_percentage=18.0,
+    max_protein_percentage=22.0,
+    min_energy_kcal_per_kg=2800,
+    max_energy_kcal_per_kg=3200,
+    min_calcium_percentage=1.0,
+    max_calcium_percentage=1.5,
+    min_phosphorus_percentage=0.4,
+    max_phosphorus_percentage=0.5,
+    max_fiber_percentage=5.0
+)
+
+# Ages in days past which adjust_for_age changes the requirements
+BROILER_FINISHER_LATE_AGE = 35
+LAYER_OLD_AGE = 365
+LAYER_VERY_OLD_AGE = 500
+AGE_THRESHOLDS = (BROILER_FINISHER_LATE_AGE, LAYER_OLD_AGE, LAYER_VERY_OLD_AGE)
+
+# One age inside each bucket, as seen by adjust_for_age
+_BUCKET_AGES = (1,) + tuple(threshold + 1 for threshold in AGE_THRESHOLDS)
+
+
+# Stage each bird type is fed in by age: (last day of the stage, stage),
+# with the final stage lasting for the rest of the bird's life
+STAGE_SCHEDULE = MappingProxyType({
+    BirdType.LAYER: (
+        (56, ProductionStage.STARTER),
+        (112, ProductionStage.GROWER),
+        (126, ProductionStage.PRE_LAY),
+        (None, ProductionStage.LAYER),
+    ),
+    BirdType.BROILER: (
+        (21, ProductionStage.STARTER),
+        (35, ProductionStage.GROWER),
+        (None, ProductionStage.FINISHER),
+    ),
+    BirdType.DUAL_PURPOSE: (
+        (56, ProductionStage.STARTER),
+        (140, ProductionStage.GROWER),
+        (None, ProductionStage.LAYER),
+    ),
+    BirdType.BREEDER: (
+        (42, ProductionStage.STARTER),
+        (147, ProductionStage.GROWER),
+        (None, ProductionStage.LAYER),
+    ),
+})
+
+# Typical daily feed intake in grams per bird: (age in days, grams) points,
+# interpolated linearly in between and held flat past the last point
+FEED_INTAKE_CURVES = MappingProxyType({
+    BirdType.LAYER: ((1, 10), (7, 15), (28, 35), (56, 50), (84, 60), (112, 70), (126, 80), (140, 100), (200, 112), (500, 115)),
+    BirdType.BROILER: ((1, 15), (7, 30), (14, 60), (21, 90), (28, 120), (35, 150), (42, 170), (49, 185), (56, 190)),
+    BirdType.DUAL_PURPOSE: ((1, 12), (28, 40), (56, 60), (112, 80), (140, 105), (500, 120)),
+    BirdType.BREEDER: ((1, 12), (28, 35), (56, 55), (112, 75), (147, 110), (200, 165), (500, 160)),
+})
+
+
+def production_stage_for_age(bird_type: BirdType, bird_age: int) -> ProductionStage:
+    """Stage a bird of this type is normally fed in at bird_age"""
+    for last_day, stage in STAGE_SCHEDULE[bird_type]:
+        if last_day is None or bird_age <= last_day:
+            return stage
+
+
+def stage_boundaries(bird_type: BirdType) -> tuple:
+    """Ages at which requirements change: stage ends and AGE_THRESHOLDS"""
+    stage_ends = tuple(last_day for last_day, _ in STAGE_SCHEDULE[bird_type] if last_day is not None)
+    return tuple(sorted(set(stage_ends + AGE_THRESHOLDS)))
+
+
+def daily_feed_intake_g(bird_type: BirdType, bird_ages: np.ndarray) -> np.ndarray:
+    """Daily feed intake in grams per bird for each age in bird_ages"""
+    ages, grams = zip(*FEED_INTAKE_CURVES[bird_type])
+    return np.interp(bird_ages, ages, grams)
+
+
+def age_bucket(bird_age: int) -> int:
+    """Index of the age range between AGE_THRESHOLDS that bird_age falls in"""
+    return bisect.bisect_left(AGE_THRESHOLDS, bird_age)
+
+
 def get_default_requirements(
     bird_type: BirdType, 
     bird_age: int, 
@@ -19,6 +265,9 @@ def get_default_requirements(
     """
     Get default nutritional requirements based on bird type, age, and production stage
     
+    Requirements only change at the ages in AGE_THRESHOLDS, so the result
+    is cached per age bucket; callers get their own copy to modify.
+    
     Args:
         bird_type: Type of poultry
         bird_age: Age of birds in days
@@ -30,182 +279,38 @@ def get_default_requirements(
     """
     logger.info(f"Getting default requirements for {bird_type} at age {bird_age} in {production_stage} stage")
     
-    # Base requirements by bird type and production stage
-    requirements = {
-        BirdType.LAYER: {
-            ProductionStage.STARTER: NutritionalRequirement(
-                min_protein_percentage=20.0,
-                max_protein_percentage=22.0,
-                min_energy_kcal_per_kg=2900,
-                max_energy_kcal_per_kg=3100,
-                min_calcium_percentage=1.0,
-                max_calcium_percentage=1.2,
-                min_phosphorus_percentage=0.45,
-                max_phosphorus_percentage=0.55,
-                max_fiber_percentage=4.0
-            ),
-            ProductionStage.GROWER: NutritionalRequirement(
-                min_protein_percentage=16.0,
-                max_protein_percentage=18.0,
-                min_energy_kcal_per_kg=2800,
-                max_energy_kcal_per_kg=3000,
-                min_calcium_percentage=0.9,
-                max_calcium_percentage=1.1,
-                min_phosphorus_percentage=0.4,
-                max_phosphorus_percentage=0.5,
-                max_fiber_percentage=5.0
-            ),
-            ProductionStage.PRE_LAY: NutritionalRequirement(
-                min_protein_percentage=17.0,
-                max_protein_percentage=19.0,
-                min_energy_kcal_per_kg=2850,
-                max_energy_kcal_per_kg=3050,
-                min_calcium_percentage=2.0,
-                max_calcium_percentage=2.5,
-                min_phosphorus_percentage=0.42,
-                max_phosphorus_percentage=0.52,
-                max_fiber_percentage=5.0
-            ),
-            ProductionStage.LAYER: NutritionalRequirement(
-                min_protein_percentage=16.0,
-                max_protein_percentage=18.0,
-                min_energy_kcal_per_kg=2750,
-                max_energy_kcal_per_kg=2950,
-                min_calcium_percentage=3.5,
-                max_calcium_percentage=4.2,
-                min_phosphorus_percentage=0.32,
-                max_phosphorus_percentage=0.45,
-                max_fiber_percentage=5.0
-            ),
-        },
-        BirdType.BROILER: {
-            ProductionStage.STARTER: NutritionalRequirement(
-                min_protein_percentage=22.0,
-                max_protein_percentage=24.0,
-                min_energy_kcal_per_kg=3000,
-                max_energy_kcal_per_kg=3200,
-                min_calcium_percentage=0.9,
-                max_calcium_percentage=1.1,
-                min_phosphorus_percentage=0.45,
-                max_phosphorus_percentage=0.55,
-                max_fiber_percentage=3.5
-            ),
-            ProductionStage.GROWER: NutritionalRequirement(
-                min_protein_percentage=20.0,
-                max_protein_percentage=22.0,
-                min_energy_kcal_per_kg=3100,
-                max_energy_kcal_per_kg=3300,
-                min_calcium_percentage=0.85,
-                max_calcium_percentage=1.0,
-                min_phosphorus_percentage=0.42,
-                max_phosphorus_percentage=0.52,
-                max_fiber_percentage=4.0
-            ),
-            ProductionStage.FINISHER: NutritionalRequirement(
-                min_protein_percentage=18.0,
-                max_protein_percentage=20.0,
-                min_energy_kcal_per_kg=3150,
-                max_energy_kcal_per_kg=3350,
-                min_calcium_percentage=0.8,
-                max_calcium_percentage=0.95,
-                min_phosphorus_percentage=0.38,
-                max_phosphorus_percentage=0.48,
-                max_fiber_percentage=4.5
-            ),
-        },
-        BirdType.DUAL_PURPOSE: {
-            ProductionStage.STARTER: NutritionalRequirement(
-                min_protein_percentage=20.0,
-                max_protein_percentage=22.0,
-                min_energy_kcal_per_kg=2950,
-                max_energy_kcal_per_kg=3150,
-                min_calcium_percentage=0.95,
-                max_calcium_percentage=1.15,
-                min_phosphorus_percentage=0.45,
-                max_phosphorus_percentage=0.55,
-                max_fiber_percentage=4.0
-            ),
-            ProductionStage.GROWER: NutritionalRequirement(
-                min_protein_percentage=18.0,
-                max_protein_percentage=20.0,
-                min_energy_kcal_per_kg=2900,
-                max_energy_kcal_per_kg=3100,
-                min_calcium_percentage=0.85,
-                max_calcium_percentage=1.05,
-                min_phosphorus_percentage=0.4,
-                max_phosphorus_percentage=0.5,
-                max_fiber_percentage=4.5
-            ),
-            ProductionStage.LAYER: NutritionalRequirement(
-                min_protein_percentage=16.0,
-                max_protein_percentage=18.0,
-                min_energy_kcal_per_kg=2800,
-                max_energy_kcal_per_kg=3000,
-                min_calcium_percentage=3.3,
-                max_calcium_percentage=4.0,
-                min_phosphorus_percentage=0.35,
-                max_phosphorus_percentage=0.45,
-                max_fiber_percentage=5.0
-            ),
-        },
-        BirdType.BREEDER: {
-            ProductionStage.STARTER: NutritionalRequirement(
-                min_protein_percentage=19.0,
-                max_protein_percentage=21.0,
-                min_energy_kcal_per_kg=2900,
-                max_energy_kcal_per_kg=3100,
-                min_calcium_percentage=1.0,
-                max_calcium_percentage=1.2,
-                min_phosphorus_percentage=0.45,
-                max_phosphorus_percentage=0.55,
-                max_fiber_percentage=4.0
-            ),
-            ProductionStage.GROWER: NutritionalRequirement(
-                min_protein_percentage=15.0,
-                max_protein_percentage=17.0,
-                min_energy_kcal_per_kg=2750,
-                max_energy_kcal_per_kg=2950,
-                min_calcium_percentage=0.9,
-                max_calcium_percentage=1.1,
-                min_phosphorus_percentage=0.4,
-                max_phosphorus_percentage=0.5,
-                max_fiber_percentage=5.0
-            ),
-            ProductionStage.LAYER: NutritionalRequirement(
-                min_protein_percentage=16.0,
-                max_protein_percentage=18.0,
-                min_energy_kcal_per_kg=2800,
-                max_energy_kcal_per_kg=3000,
-                min_calcium_percentage=3.0,
-                max_calcium_percentage=3.8,
-                min_phosphorus_percentage=0.35,
-                max_phosphorus_percentage=0.45,
-                max_fiber_percentage=5.0
-            ),
-        }
-    }
+    with stage("requirements"):
+        return resolve_requirements(bird_type, production_stage, age_bucket(bird_age), target_nutrition).model_copy()
+
+
+@lru_cache(maxsize=512)
+def resolve_requirements(
+    bird_type: BirdType,
+    production_stage: ProductionStage,
+    bucket: int,
+    target_nutrition: TargetNutrition
+) -> NutritionalRequirement:
+    """
+    Adjusted requirements for one age bucket; shared, so never modify the result
     
+    Args:
+        bird_type: Type of poultry
+        production_stage: Current production stage
+        bucket: Age bucket from age_bucket()
+        target_nutrition: Target nutritional profile
+        
+    Returns:
+        NutritionalRequirement object with default values
+    """
     # Check if the specified combination exists
-    if bird_type not in requirements or production_stage not in requirements[bird_type]:
+    stages = DEFAULT_REQUIREMENTS.get(bird_type, {})
+    if production_stage not in stages:
         logger.warning(f"No default requirements found for {bird_type} in {production_stage} stage")
         # Return a generic requirement
-        return NutritionalRequirement(
-            min_protein_percentage=18.0,
-            max_protein_percentage=22.0,
-            min_energy_kcal_per_kg=2800,
-            max_energy_kcal_per_kg=3200,
-            min_calcium_percentage=1.0,
-            max_calcium_percentage=1.5,
-            min_phosphorus_percentage=0.4,
-            max_phosphorus_percentage=0.5,
-            max_fiber_percentage=5.0
-        )
-    
-    # Get base requirements
-    base_requirements = requirements[bird_type][production_stage]
+        return GENERIC_REQUIREMENTS
     
     # Apply age-specific adjustments
-    adjusted_requirements = adjust_for_age(base_requirements, bird_type, bird_age, production_stage)
+    adjusted_requirements = adjust_for_age(stages[production_stage], bird_type, _BUCKET_AGES[bucket], production_stage)
     
     # Apply target nutrition adjustments
     final_requirements = adjust_for_target_nutrition(adjusted_requirements, target_nutrition)
@@ -231,37 +336,27 @@ def adjust_for_age(
     Returns:
         Adjusted NutritionalRequirement object
     """
-    # Make a copy of the requirements
-    adjusted = NutritionalRequirement(
-        min_protein_percentage=requirements.min_protein_percentage,
-        max_protein_percentage=requirements.max_protein_percentage,
-        min_energy_kcal_per_kg=requirements.min_energy_kcal_per_kg,
-        max_energy_kcal_per_kg=requirements.max_energy_kcal_per_kg,
-        min_calcium_percentage=requirements.min_calcium_percentage,
-        max_calcium_percentage=requirements.max_calcium_percentage,
-        min_phosphorus_percentage=requirements.min_phosphorus_percentage,
-        max_phosphorus_percentage=requirements.max_phosphorus_percentage,
-        max_fiber_percentage=requirements.max_fiber_percentage
-    )
+    # Make a copy of the requirements (already validated, so no re-validation)
+    adjusted = requirements.model_copy()
     
     # Apply age-specific adjustments
     if bird_type == BirdType.LAYER:
         if production_stage == ProductionStage.LAYER:
             # Laying hens need more calcium as they get older
-            if bird_age > 365:  # Older than 1 year
+            if bird_age > LAYER_OLD_AGE:  # Older than 1 year
                 adjusted.min_calcium_percentage = max(adjusted.min_calcium_percentage, 3.8)
                 if adjusted.max_calcium_percentage:
                     adjusted.max_calcium_percentage = max(adjusted.max_calcium_percentage, 4.5)
             
             # Adjust protein for older layers
-            if bird_age > 500:  # Very old layers
+            if bird_age > LAYER_VERY_OLD_AGE:  # Very old layers
                 adjusted.min_protein_percentage = max(adjusted.min_protein_percentage - 0.5, 15.0)
                 if adjusted.max_protein_percentage:
                     adjusted.max_protein_percentage = max(adjusted.max_protein_percentage - 0.5, 17.0)
     
     elif bird_type == BirdType.BROILER:
         # Broilers need higher energy as they grow
-        if production_stage == ProductionStage.FINISHER and bird_age > 35:
+        if production_stage == ProductionStage.FINISHER and bird_age > BROILER_FINISHER_LATE_AGE:
             adjusted.min_energy_kcal_per_kg = max(adjusted.min_energy_kcal_per_kg, 3200)
             if adjusted.max_energy_kcal_per_kg:
                 adjusted.max_energy_kcal_per_kg = max(adjusted.max_energy_kcal_per_kg, 3400)
@@ -284,18 +379,8 @@ def adjust_for_target_nutrition(
     Returns:
         Adjusted NutritionalRequirement object
     """
-    # Make a copy of the requirements
-    adjusted = NutritionalRequirement(
-        min_protein_percentage=requirements.min_protein_percentage,
-        max_protein_percentage=requirements.max_protein_percentage,
-        min_energy_kcal_per_kg=requirements.min_energy_kcal_per_kg,
-        max_energy_kcal_per_kg=requirements.max_energy_kcal_per_kg,
-        min_calcium_percentage=requirements.min_calcium_percentage,
-        max_calcium_percentage=requirements.max_calcium_percentage,
-        min_phosphorus_percentage=requirements.min_phosphorus_percentage,
-        max_phosphorus_percentage=requirements.max_phosphorus_percentage,
-        max_fiber_percentage=requirements.max_fiber_percentage
-    )
+    # Make a copy of the requirements (already validated, so no re-validation)
+    adjusted = requirements.model_copy()
     
     # Apply adjustments based on target nutrition
     if target_nutrition == TargetNutrition.HIGH_PROTEIN: